@@ -0,0 +1,488 @@
+"""
+假锁屏工具的基准测试，不随程序打包。用法: python bench.py <名称> [参数]，不带名称时列出全部基准测试。
+"""
+import asyncio
+import heapq
+import json
+import multiprocessing
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+import tkinter as tk
+from types import SimpleNamespace
+
+import keyboard
+
+import fake_lock_screen
+from fake_lock_screen import (
+    HC_ACTION, WM_MOUSEMOVE, AuditLog, BackgroundLoop, FakeHookBackend, FleetAgent, FleetController,
+    HookWatchdog, InputFilterProcess, KeyPolicy, LockScheduler, Metrics, MouseBlocker, PassphraseMatcher,
+    ScreenBlur, SoftwareDimmer, UICommandChannel, UnlockChord, _serve_filter_events, hash_passphrase,
+    make_block_handler, print_fleet_result, shared_memory, summarize_audit,
+)
+
+
+def benchmark_blur(runs=10):
+    """比较不同分辨率下模糊背景各步骤的耗时（用合成图像代替真实抓屏）"""
+    from PIL import Image
+    layouts = [
+        ("1080p", [(0, 0, 1920, 1080, True)]),
+        ("4K", [(0, 0, 3840, 2160, True)]),
+        ("4K + 2×1080p", [(0, 0, 3840, 2160, True), (3840, 0, 1920, 1080, False), (-1920, 0, 1920, 1080, False)]),
+    ]
+    blur = ScreenBlur()
+    try:
+        master = tk.Tk()
+        master.withdraw()
+    except tk.TclError:
+        master = None
+    print(f"🌫️ 模糊遮罩基准测试 (缩小 {blur.SCALE} 倍, 每项取 {runs} 次中位数, ms)")
+    print(f"  {'布局':<14}{'全尺寸reduce':>14}{'模糊小图':>10}{'放大到各屏':>12}{'写入PhotoImage':>16}")
+    for name, monitors in layouts:
+        left = min(m[0] for m in monitors)
+        bounds = (left, 0, max(m[0] + m[2] for m in monitors) - left, max(m[3] for m in monitors))
+        # 模拟ImageGrab的全尺寸截图；Windows上StretchBlt直接得到小图，不需要这一步
+        full = Image.effect_noise((bounds[2], bounds[3]), 64).convert('RGB')
+        timings = {'reduce': [], 'blur': [], 'scale': [], 'photo': []}
+        for _ in range(runs):
+            start = time.perf_counter()
+            small = full.reduce(blur.SCALE)
+            timings['reduce'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            small = blur.blur_small(small)
+            timings['blur'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            images = blur.scale_to_monitors(small, bounds, monitors)
+            timings['scale'].append(time.perf_counter() - start)
+            if master is not None:
+                start = time.perf_counter()
+                for image in images:
+                    blur.photo_for(image, master)
+                timings['photo'].append(time.perf_counter() - start)
+        medians = {key: sorted(values)[len(values) // 2] * 1000 if values else None for key, values in timings.items()}
+        photo = f"{medians['photo']:.1f}" if medians['photo'] is not None else "-"
+        print(f"  {name:<14}{medians['reduce']:>14.1f}{medians['blur']:>10.1f}{medians['scale']:>12.1f}{photo:>16}")
+    if master is None:
+        print("  (没有可用的显示，未测量PhotoImage写入)")
+    else:
+        master.destroy()
+
+def benchmark_dimmer(duration_ms=1000, runs=3):
+    """测量软件调暗淡入的帧间隔、属性更新次数和CPU占用，以及中途取消的耗时；Linux上可在Xvfb中运行"""
+    try:
+        master = tk.Tk()
+        master.withdraw()
+    except tk.TclError:
+        print("❌ 没有可用的显示，请在Xvfb中运行: xvfb-run python bench.py dimmer")
+        return
+    layouts = [
+        ("1 屏", [(0, 0, 1920, 1080, True)]),
+        ("3 屏", [(0, 0, 1920, 1080, True), (1920, 0, 1920, 1080, False), (-1920, 0, 1920, 1080, False)]),
+    ]
+    dimmer = SoftwareDimmer()
+    print(f"🌑 软件调暗基准测试 (淡入 {duration_ms} ms, 帧间隔 {SoftwareDimmer.FRAME_MS} ms, "
+          f"每秒最多 {SoftwareDimmer.MAX_UPDATES_PER_SECOND} 次属性更新)")
+    for name, monitors in layouts:
+        for _ in range(runs):
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+            if not dimmer.start(master, monitors, duration_ms=duration_ms):
+                print("❌ 窗口透明度不生效（X11需要合成管理器）")
+                master.destroy()
+                return
+            while dimmer.ramping:
+                master.update()
+                time.sleep(0.001)
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            frames, p50, p99, worst = dimmer.pacing()
+            print(f"  {name}: {frames} 帧, 间隔 p50 {p50:.1f} ms / p99 {p99:.1f} ms / 最大 {worst:.1f} ms, "
+                  f"属性更新 {dimmer.updates} 次 (跳过 {dimmer.skipped_frames} 帧), "
+                  f"CPU {cpu * 1000:.0f} ms ({cpu / wall * 100:.1f}%)")
+            dimmer.cancel()
+    # 淡入到一半时解锁
+    dimmer.start(master, layouts[1][1], duration_ms=duration_ms)
+    halfway = time.perf_counter() + duration_ms / 2000
+    while time.perf_counter() < halfway:
+        master.update()
+        time.sleep(0.001)
+    start = time.perf_counter()
+    alpha = dimmer.alpha
+    dimmer.cancel()
+    master.update()
+    cancel_ms = (time.perf_counter() - start) * 1000
+    frames = len(dimmer.frame_times)
+    end = time.perf_counter() + 0.2
+    while time.perf_counter() < end:
+        master.update()
+        time.sleep(0.001)
+    print(f"  中途取消 (不透明度 {alpha:.2f}): {cancel_ms:.1f} ms 内移除窗口, 之后新增帧 {len(dimmer.frame_times) - frames}")
+    master.destroy()
+
+def benchmark_mouse_flood(rates=(1000, 8000), seconds=2.0):
+    """合成鼠标事件洪流，测量钩子模式每秒的CPU开销（clip模式不回调Python，开销为0，但也不拦截点击和滚轮）"""
+    blocker = MouseBlocker(mode='hook')
+    blocker.active = True
+    proc = blocker._proc_ptr
+    print("🖱️ 鼠标屏蔽基准测试（通过ctypes回调入口调用，包含跨语言开销）")
+    for rate in rates:
+        events = int(rate * seconds)
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        for _ in range(events):
+            proc(HC_ACTION, WM_MOUSEMOVE, 0)
+        cpu_used = time.process_time() - cpu_start
+        wall_used = time.perf_counter() - wall_start
+        per_event_us = wall_used / events * 1e6
+        print(f"  {rate:>5} Hz: {per_event_us:.2f} µs/事件, "
+              f"CPU {cpu_used / seconds * 100:.2f}% 单核 (hook 模式), 0% (clip 模式)")
+    print(f"  共丢弃 {blocker.suppressed} 个合成事件")
+
+def benchmark_key_policy(events=200000):
+    """比较全部屏蔽与启用放行策略时键盘钩子回调的每事件耗时"""
+    chord = UnlockChord.compile("ctrl+alt+u")
+    sample_keys = ['a', 's', 'd', 'f', 'space', 'enter', 'volume up', 'f5']
+    sample = []
+    for name in sample_keys:
+        codes = keyboard.key_to_scan_codes(name, error_if_missing=False)
+        if codes:
+            sample.append(SimpleNamespace(event_type='down', scan_code=codes[0], name=name))
+            sample.append(SimpleNamespace(event_type='up', scan_code=codes[0], name=name))
+    stream = (sample * (events // len(sample) + 1))[:events]
+
+    print(f"⌨️ 按键放行策略基准测试 ({events} 个合成事件)")
+    for label, policy in [
+        ("全部屏蔽", KeyPolicy.compile((), include_media=False)),
+        ("媒体键+自定义放行", KeyPolicy.compile(['f5', 'print screen'], include_media=True)),
+    ]:
+        state = SimpleNamespace(is_locked=True, key_policy=policy)
+        handler = make_block_handler(state, chord, lambda source: None)
+        start_time = time.perf_counter()
+        passed = 0
+        for event in stream:
+            if handler(event):
+                passed += 1
+        elapsed = time.perf_counter() - start_time
+        print(f"  {label:<12}: {elapsed / events * 1e9:.0f} ns/事件, 放行 {passed} 个")
+
+def benchmark_passphrases(events=100000):
+    """测量口令输入每个按键事件的耗时，以及口令数量从1到上限时按回车后的scrypt校验耗时"""
+    import random
+    rng = random.Random(1)
+    alphabet = 'abcdefghijklmnopqrstuvwxyz0123456789'
+    stream = [rng.choice(alphabet) for _ in range(events)]
+    print(f"🔑 口令匹配基准测试 ({events} 个按键, 口令长度 8-16, 上限 {PassphraseMatcher.MAX_ENTRIES} 个)")
+    cases = [(f"{count} 个口令", [rng.randint(8, 16) for _ in range(count)])
+             for count in (1, 4, PassphraseMatcher.MAX_ENTRIES)]
+    cases.append((f"{PassphraseMatcher.MAX_ENTRIES} 个同长度", [12] * PassphraseMatcher.MAX_ENTRIES))
+    for label, lengths in cases:
+        passphrases = [''.join(rng.choice(alphabet) for _ in range(length)) for length in lengths]
+        matcher = PassphraseMatcher([hash_passphrase(passphrase) for passphrase in passphrases])
+        on_match = lambda: None
+        start_time = time.perf_counter()
+        for name in stream:
+            matcher.feed(name, on_match)
+        elapsed = time.perf_counter() - start_time
+        matcher.clear()
+        matched = threading.Event()
+        for char in passphrases[-1]:
+            matcher.feed(char, matched.set)
+        verify_start = time.perf_counter()
+        matcher.feed('enter', matched.set)
+        matcher.join()
+        verify_ms = (time.perf_counter() - verify_start) * 1000
+        print(f"  {label:<10}: 按键 {elapsed / events * 1e9:.0f} ns/事件, 回车校验 {verify_ms:.0f} ms"
+              f"{'' if matched.is_set() else ' (未匹配!)'}")
+
+def benchmark_hook_watchdog(events=100000, interval=0.05):
+    """用模拟后端测量监视层的每事件开销，以及从钩子丢失到检测并重新安装的时间"""
+    import tempfile
+    state = SimpleNamespace(is_locked=True, key_policy=KeyPolicy.compile((), include_media=False))
+    handler = make_block_handler(state, UnlockChord.compile("ctrl+alt+u"), lambda source: None)
+    event = SimpleNamespace(event_type='down', scan_code=30, name='a')
+
+    background = BackgroundLoop()
+    background.start()
+    metrics = Metrics(os.path.join(tempfile.mkdtemp(prefix="fakelockscreen-hook-"), "metrics.json"), background)
+    backend = FakeHookBackend()
+    watchdog = HookWatchdog(backend, background, metrics, interval=interval)
+    watchdog.start(handler)
+
+    print(f"🐕 键盘钩子监视基准测试 (模拟后端, 探测间隔 {interval * 1000:.0f} ms)")
+    start_time = time.perf_counter()
+    for _ in range(events):
+        handler(event)
+    raw = (time.perf_counter() - start_time) / events * 1e9
+    watched_handler = watchdog.handler
+    start_time = time.perf_counter()
+    for _ in range(events):
+        watched_handler(event)
+    watched = (time.perf_counter() - start_time) / events * 1e9
+    print(f"  回调开销: 直接 {raw:.0f} ns/事件, 经监视层 {watched:.0f} ns/事件")
+
+    time.sleep(interval * 3)
+    backend.drop = True
+    dropped_at = time.perf_counter()
+    deadline = dropped_at + interval * (HookWatchdog.MISSED_LIMIT + 2) * 4
+    while watchdog.reinstalls == 0 and time.perf_counter() < deadline:
+        time.sleep(interval / 10)
+    if watchdog.reinstalls:
+        detected = (time.perf_counter() - dropped_at) * 1000
+        print(f"  钩子丢失后 {detected:.0f} ms 检测到并重新安装 (连续 {HookWatchdog.MISSED_LIMIT} 次探测丢失)")
+    else:
+        print("  ❌ 未检测到钩子丢失")
+    print(f"  重新安装后事件{'已恢复' if backend.deliver(event) is not None else '仍未恢复'}; "
+          f"告警 hook_lost = {metrics.values.get('hook_lost', 0)}")
+    if watchdog.probe_rtt:
+        print(f"  探测往返: 中位数 {sorted(watchdog.probe_rtt)[len(watchdog.probe_rtt) // 2]:.3f} ms")
+    watchdog.stop()
+    background.stop()
+
+def _input_event_source(conn, result_conn, events, interval):
+    """基准测试的事件源进程：逐个发送合成按键事件并等待判定，记录每个事件的往返时间"""
+    codes = keyboard.key_to_scan_codes('a', error_if_missing=False) or (30,)
+    latencies = []
+    for index in range(events):
+        start = time.perf_counter()
+        conn.send((codes[0], 'down' if index % 2 == 0 else 'up', 'a'))
+        conn.recv()
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(interval)
+    result_conn.send(latencies)
+
+def benchmark_input_filter(events=500, interval=0.002):
+    """比较进程内钩子回调和独立过滤进程在主线程空闲/繁忙时的每事件延迟"""
+    if shared_memory is None:
+        print("❌ 需要 Python 3.8+ (multiprocessing.shared_memory)")
+        return
+    context = multiprocessing.get_context('spawn')
+    chord = UnlockChord.compile("ctrl+alt+u")
+    policy = KeyPolicy.compile((), include_media=True)
+
+    def in_process_consumer(event_conn):
+        state = SimpleNamespace(is_locked=True, key_policy=policy)
+        handler = make_block_handler(state, chord, lambda source: None)
+        threading.Thread(target=_serve_filter_events, args=(handler, event_conn), daemon=True).start()
+        return None
+
+    def out_of_process_consumer(event_conn):
+        filter_process = InputFilterProcess(lambda source: None, event_conn)
+        filter_process.start()
+        filter_process.ready.wait(30)
+        filter_process.lock(chord, policy)
+        return filter_process
+
+    print(f"🛡️ 输入过滤基准测试 ({events} 个事件, 间隔 {interval * 1000:.0f} ms；繁忙 = 主线程持续执行Python代码)")
+    for label, consumer in (("进程内钩子", in_process_consumer), ("独立过滤进程", out_of_process_consumer)):
+        for busy in (False, True):
+            source_conn, event_conn = context.Pipe()
+            result_receiver, result_sender = context.Pipe(duplex=False)
+            filter_process = consumer(event_conn)
+            source = context.Process(target=_input_event_source, args=(source_conn, result_sender, events, interval), daemon=True)
+            source.start()
+            counter = 0
+            while not result_receiver.poll(0 if busy else 0.1):
+                if busy:
+                    # 模拟繁忙的UI线程：纯Python循环，只在解释器的线程切换间隔时让出GIL
+                    for _ in range(1000000):
+                        counter += 1
+            latencies = sorted(result_receiver.recv())
+            source.join()
+            if filter_process:
+                filter_process.stop()
+            p50 = latencies[len(latencies) // 2]
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f"  {label:<8} ({'繁忙' if busy else '空闲'}): p50 {p50:.3f} ms, p99 {p99:.3f} ms, 最大 {latencies[-1]:.3f} ms")
+
+def benchmark_ui_channel(commands=2000, busy_ms=5):
+    """主线程持续忙碌时，测量命令通道从入队到执行的p99延迟"""
+    root = tk.Tk()
+    root.withdraw()
+    channel = UICommandChannel(history=commands)
+    channel.attach(root)
+    done = threading.Event()
+    executed = [0]
+
+    def command():
+        executed[0] += 1
+        if executed[0] == commands:
+            done.set()
+            root.quit()
+
+    def busy():
+        # 模拟繁忙的UI：每次占用主线程busy_ms毫秒
+        end = time.perf_counter() + busy_ms / 1000
+        while time.perf_counter() < end:
+            pass
+        if not done.is_set():
+            root.after(1, busy)
+
+    def producer():
+        for _ in range(commands):
+            channel.post(command)
+            time.sleep(0.001)
+
+    root.after(0, busy)
+    threading.Thread(target=producer, daemon=True).start()
+    root.mainloop()
+    root.destroy()
+    count, p50, p99, worst = channel.summary()
+    print(f"📨 命令通道基准测试 (主线程每次忙碌 {busy_ms} ms)")
+    print(f"  {count} 条命令: p50 {p50:.2f} ms, p99 {p99:.2f} ms, 最大 {worst:.2f} ms")
+
+def raise_fd_limit(needed):
+    """提高Linux/macOS上的文件描述符上限，模拟大量连接时需要"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        limit = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+
+def benchmark_fleet(agent_count=1000):
+    """在本机模拟大量代理，测量控制端下发锁屏到全部确认锁定所需的时间"""
+    raise_fd_limit(agent_count * 2 + 64)
+
+    async def bench():
+        token = secrets.token_hex(16)
+        controller = FleetController('127.0.0.1', 0, token)
+        await controller.start()
+        states = {}
+
+        def make_handler(index):
+            async def handler(cmd):
+                if cmd == 'lock':
+                    states[index] = True
+                elif cmd == 'unlock':
+                    states[index] = False
+                return states.get(index, False)
+            return handler
+
+        agents = [FleetAgent('127.0.0.1', controller.port, make_handler(i), token, name=f"sim-{i}") for i in range(agent_count)]
+        tasks = [asyncio.ensure_future(agent.run()) for agent in agents]
+        connect_start = time.perf_counter()
+        connected = await controller.wait_for_agents(agent_count)
+        print(f"🧪 集中锁屏基准测试: {connected}/{agent_count} 个模拟代理已连接 "
+              f"({(time.perf_counter() - connect_start) * 1000:.0f} ms)")
+        for cmd in ('lock', 'status', 'unlock'):
+            print_fleet_result(await controller.broadcast(cmd))
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await controller.close()
+
+    asyncio.run(bench())
+
+def benchmark_scheduler(rule_count=5000):
+    """展开大量定时规则的耗时，以及处理一次到期事件的耗时"""
+    import random
+    rng = random.Random(1)
+    entries = []
+    for i in range(rule_count):
+        start = rng.randrange(24 * 60)
+        end = (start + rng.randrange(5, 120)) % (24 * 60)
+        entries.append({'name': f"rule-{i}", 'days': rng.choice(['mon-fri', 'sat,sun', 'daily']),
+                        'start': f"{start // 60:02d}:{start % 60:02d}", 'end': f"{end // 60:02d}:{end % 60:02d}"})
+    background = BackgroundLoop()
+    background.start()
+    scheduler = LockScheduler(background, lambda: None, lambda: None)
+
+    async def run():
+        start = time.perf_counter()
+        scheduler._rebuild(entries)
+        rebuild_ms = (time.perf_counter() - start) * 1000
+        # 把堆顶事件提前到现在，测量单次到期处理（弹出并推入下一个事件）
+        events = 1000
+        start = time.perf_counter()
+        for _ in range(events):
+            when, kind, index, end = scheduler._heap[0]
+            heapq.heapreplace(scheduler._heap, (time.time() - 1, kind, index, end))
+            scheduler._expected_wall = time.time()
+            scheduler._on_timer()
+        per_event_us = (time.perf_counter() - start) / events * 1e6
+        scheduler._cancel()
+        return rebuild_ms, per_event_us
+
+    rebuild_ms, per_event_us = background.submit(run()).result()
+    background.stop()
+    print(f"🗓️ 定时锁屏基准测试 ({rule_count} 条规则)")
+    print(f"  展开规则并建堆: {rebuild_ms:.1f} ms")
+    print(f"  处理一次到期事件并重新挂定时器: {per_event_us:.1f} µs")
+
+def benchmark_audit(days=365, sessions_per_day=200):
+    """生成一年的合成会话记录，测量写入和汇总耗时"""
+    import random
+    import tempfile
+    rng = random.Random(1)
+    directory = tempfile.mkdtemp(prefix="fakelockscreen-audit-")
+    log = AuditLog(directory)
+    now = time.time()
+    moment = now - days * 86400
+    step = 86400 / sessions_per_day
+    records = []
+    while moment < now - step:
+        duration = rng.uniform(10, step * 0.8)
+        records.append(log.RECORD.pack(moment, moment + duration, rng.randrange(1, 6), rng.randrange(1, 7)))
+        moment += step
+    start_time = time.perf_counter()
+    for offset in range(0, len(records), 4096):
+        # 每批与实际运行时一样经过flush：合并写入、轮转、fsync
+        log._pending = records[offset:offset + 4096]
+        log.flush()
+    print(f"🧪 审计日志基准测试: {days} 天 × {sessions_per_day} 次会话，写入 {(time.perf_counter() - start_time) * 1000:.0f} ms, "
+          f"{len(log.segments())} 个段")
+    summarize_audit(log, days=90)
+    summarize_audit(log, days=days)
+
+def benchmark_startup(runs=3):
+    """分别以完整界面和 --tray 模式启动子进程，比较托盘/主窗口就绪时间和启动后的内存占用"""
+    command = [sys.executable, os.path.abspath(fake_lock_screen.__file__)]
+    print(f"🚀 启动基准测试 (每种模式 {runs} 次，取中位数)")
+    for label, extra in (("完整界面", []), ("--tray", ["--tray"])):
+        reports = []
+        for _ in range(runs):
+            try:
+                result = subprocess.run(command + ["--startup-report"] + extra, capture_output=True, text=True, timeout=60)
+                reports.append(json.loads(result.stdout[result.stdout.index('{'):]))
+            except (subprocess.TimeoutExpired, ValueError) as e:
+                print(f"  ⚠ {label} 启动失败: {e}")
+                break
+        if not reports:
+            continue
+
+        def median(key):
+            values = sorted(r[key] for r in reports if r.get(key) is not None)
+            return f"{values[len(values) // 2]:.1f}" if values else "-"
+        print(f"  {label:<8}: 快捷键 {median('hotkey_ready_ms')} ms, 托盘 {median('tray_ready_ms')} ms, "
+              f"主窗口 {median('window_ready_ms')} ms, 内存 {median('rss_mb')} MB")
+
+
+BENCHMARKS = {
+    'mouse': benchmark_mouse_flood,
+    'key-policy': benchmark_key_policy,
+    'dimmer': benchmark_dimmer,
+    'input-filter': benchmark_input_filter,
+    'hook-watchdog': benchmark_hook_watchdog,
+    'ui-channel': benchmark_ui_channel,
+    'startup': benchmark_startup,
+    'blur': benchmark_blur,
+    'audit': benchmark_audit,
+    'passphrase': benchmark_passphrases,
+    'scheduler': benchmark_scheduler,
+    'fleet': benchmark_fleet,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print("用法: python bench.py <名称> [参数]")
+        for name, function in BENCHMARKS.items():
+            print(f"  {name:<14}{function.__doc__.strip().splitlines()[0]}")
+        sys.exit(0 if len(sys.argv) < 2 else 2)
+    # 数值参数按位置传给基准测试函数，例如 python bench.py fleet 5000
+    BENCHMARKS[sys.argv[1]](*(int(arg) for arg in sys.argv[2:]))
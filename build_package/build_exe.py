@@ -10,23 +10,137 @@ import sys
 import shutil
 import subprocess
 import time
+import json
+import ast
+import hashlib
+import importlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from modulefinder import ModuleFinder
+
+try:
+    from importlib import metadata
+except ImportError:  # Python 3.7
+    import importlib_metadata as metadata
+
+try:
+    from packaging.requirements import Requirement
+except ImportError:
+    from pip._vendor.packaging.requirements import Requirement
+
+# 现有spec中固定排除的模块
+DEFAULT_EXCLUDES = [
+    'matplotlib',
+    'numpy',
+    'scipy',
+    'pandas',
+    'PyQt5',
+    'PyQt6',
+    'tkinter.test',
+]
+
+# 运行时按平台动态导入的后端：(Windows下需要的隐式导入, 其他平台的后端)
+# 静态导入分析会沿所有分支追踪，因此需要在这里补充/排除
+PLATFORM_BACKENDS = {
+    'pystray': (['pystray._win32'], ['pystray._xorg', 'pystray._gtk', 'pystray._appindicator', 'pystray._darwin']),
+    'keyboard': (['keyboard._winkeyboard'], ['keyboard._nixkeyboard', 'keyboard._nixcommon', 'keyboard._darwinkeyboard']),
+    'mouse': (['mouse._winmouse'], ['mouse._nixmouse', 'mouse._nixcommon', 'mouse._darwinmouse']),
+    'PIL.ImageTk': (['PIL._tkinter_finder'], []),
+}
+
+# 未被导入图触及时可以安全排除的大型标准库/第三方模块
+EXCLUDE_CANDIDATES = [
+    'unittest', 'doctest', 'pydoc', 'pdb', 'lib2to3', 'distutils', 'setuptools', 'pip',
+    'xmlrpc', 'http.server', 'email', 'sqlite3', 'ftplib', 'tkinter.test', 'test',
+    'PyQt5', 'PyQt6', 'numpy', 'scipy', 'pandas', 'matplotlib',
+]
+
+# 支持的打包布局
+LAYOUTS = ('onefile', 'onedir')
+
+# 冷启动基准测试的布局组合：(名称, 布局, 是否UPX)
+BENCH_LAYOUTS = [
+    ('onefile-upx', 'onefile', True),
+    ('onefile-noupx', 'onefile', False),
+    ('onedir-upx', 'onedir', True),
+    ('onedir-noupx', 'onedir', False),
+]
+
+# PyInstaller TOC中的条目类型
+TOC_MODULE_TYPES = {'PYMODULE', 'PYSOURCE', 'EXTENSION'}
+TOC_BINARY_TYPES = {'BINARY'}
 
 class ExeBuilder:
     def __init__(self):
         self.script_dir = Path(__file__).parent
         self.project_root = self.script_dir.parent
         self.source_file = self.project_root / "fake_lock_screen.py"
-        self.dist_dir = self.project_root / "dist"
-        self.build_dir = self.project_root / "build"
         self.spec_file = self.script_dir / "fake_lock_screen.spec"
         
+        # 产物预算（上次通过预算检查的产物清单随构建缓存保存在build目录中）
+        self.budgets_file = self.script_dir / "build_budgets.json"
+        
+        # 打包布局：onefile/onedir、是否UPX压缩、onefile的固定解压目录
+        layout_arg = [arg for arg in sys.argv if arg.startswith('--layout=')]
+        tmpdir_arg = [arg for arg in sys.argv if arg.startswith('--runtime-tmpdir=')]
+        self.configure_layout(
+            layout_arg[0].split('=', 1)[1] if layout_arg else 'onefile',
+            use_upx="--no-upx" not in sys.argv,
+            runtime_tmpdir=tmpdir_arg[0].split('=', 1)[1].strip('"') if tmpdir_arg else None,
+        )
+        
+        # 增量构建缓存：以源文件、依赖文件、spec内容和解释器版本的哈希为键
+        self.use_cache = "--no-cache" not in sys.argv
+        self.cache_key = None
+        self.cache_hit = False
+        self.missing_requirements = []
+        self.phase_times = {}
+        if not self.use_cache:
+            print("🧹 检测到 --no-cache 参数，将执行完整重新构建")
+        
+        # 导入图分析：--analyze-imports 仅输出报告，--minimal-imports 使用分析结果打包
+        self.analyze_only = "--analyze-imports" in sys.argv
+        self.minimal_imports = "--minimal-imports" in sys.argv
+        self.import_plan = None
+        self.import_report_file = self.build_dir / "import_analysis.json"
+        if self.minimal_imports:
+            print("🔬 检测到 --minimal-imports 参数，将按导入图生成最小依赖集合")
+        
         # 检查是否启用依赖收集
         self.collect_dependencies = "--collect-all" in sys.argv
         if self.collect_dependencies:
             print("🔧 检测到 --collect-all 参数，将完整打包所有依赖")
         else:
             print("📦 默认模式：不打包依赖（需要目标机器有Python环境）")
+        print(f"🧱 打包布局: {self.describe_layout()}")
+        
+        # 冷启动基准测试：依次构建各布局并测量启动到退出的时间
+        self.bench_layouts = "--bench-layouts" in sys.argv
+        runs_arg = [arg for arg in sys.argv if arg.startswith('--bench-runs=')]
+        self.bench_runs = int(runs_arg[0].split('=', 1)[1]) if runs_arg else 5
+    
+    def configure_layout(self, layout, use_upx=True, runtime_tmpdir=None, dist_dir=None, build_dir=None):
+        """设置打包布局并更新对应的输出路径"""
+        if layout not in LAYOUTS:
+            raise ValueError(f"未知的打包布局: {layout}（可选: {', '.join(LAYOUTS)}）")
+        self.layout = layout
+        self.use_upx = use_upx
+        self.runtime_tmpdir = runtime_tmpdir if layout == 'onefile' else None
+        self.dist_dir = dist_dir or self.project_root / "dist"
+        self.build_dir = build_dir or self.project_root / "build"
+        self.cache_file = self.build_dir / ".build_cache.json"
+        self.manifest_file = self.build_dir / "build_manifest.json"
+        if layout == 'onedir':
+            self.exe_file = self.dist_dir / "FakeLockScreen" / "FakeLockScreen.exe"
+        else:
+            self.exe_file = self.dist_dir / "FakeLockScreen.exe"
+    
+    def describe_layout(self):
+        """返回当前打包布局的描述"""
+        parts = [self.layout, "UPX" if self.use_upx else "无UPX"]
+        if self.runtime_tmpdir:
+            parts.append(f"解压目录={self.runtime_tmpdir}")
+        return " / ".join(parts)
     
     def print_step(self, step_num, description):
         """打印步骤信息"""
@@ -34,9 +148,37 @@ class ExeBuilder:
         print(f"步骤 {step_num}: {description}")
         print('='*60)
     
+    def read_requirement_lines(self):
+        """读取打包依赖列表，PyInstaller总是需要"""
+        lines = []
+        requirements_file = self.script_dir / "requirements_build.txt"
+        if requirements_file.exists():
+            with open(requirements_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.split('#', 1)[0].strip()
+                    if line:
+                        lines.append(line)
+        else:
+            print("⚠ requirements_build.txt不存在，仅检查PyInstaller")
+        if not any(Requirement(line).name.lower() == 'pyinstaller' for line in lines):
+            lines.append("pyinstaller>=5.0")
+        return lines
+    
+    def check_requirement(self, line):
+        """在进程内检查单个依赖是否已安装且版本满足要求，返回 (依赖, 已安装版本, 是否满足)"""
+        requirement = Requirement(line)
+        if requirement.marker and not requirement.marker.evaluate():
+            return requirement, None, True
+        try:
+            installed = metadata.version(requirement.name)
+        except metadata.PackageNotFoundError:
+            return requirement, None, False
+        return requirement, installed, requirement.specifier.contains(installed, prereleases=True)
+    
     def check_requirements(self):
         """检查环境要求"""
         self.print_step(1, "检查环境要求")
+        phase_start = time.perf_counter()
         
         # 检查Python版本
         python_version = sys.version_info
@@ -49,50 +191,99 @@ class ExeBuilder:
             raise Exception(f"源文件不存在: {self.source_file}")
         print(f"✓ 源文件存在: {self.source_file}")
         
-        # 检查PyInstaller
+        # 在进程内并行解析所有依赖，不再为每个包启动pip子进程
         try:
-            result = subprocess.run([sys.executable, "-m", "pip", "show", "pyinstaller"], 
-                                  capture_output=True, text=True)
-            if result.returncode != 0:
-                print("⚠ PyInstaller未安装，正在安装...")
-                subprocess.run([sys.executable, "-m", "pip", "install", "pyinstaller>=5.0"], check=True)
-            print("✓ PyInstaller已准备就绪")
+            requirement_lines = self.read_requirement_lines()
+            with ThreadPoolExecutor(max_workers=min(8, len(requirement_lines))) as executor:
+                results = list(executor.map(self.check_requirement, requirement_lines))
         except Exception as e:
-            raise Exception(f"PyInstaller检查失败: {e}")
+            raise Exception(f"依赖检查失败: {e}")
+        
+        self.missing_requirements = []
+        for requirement, installed, satisfied in results:
+            if satisfied:
+                print(f"✓ {requirement.name} {installed or '(当前平台不需要)'}")
+            elif installed:
+                print(f"⚠ {requirement.name} {installed} 不满足 {requirement.specifier}")
+                self.missing_requirements.append(str(requirement))
+            else:
+                print(f"⚠ {requirement.name} 未安装")
+                self.missing_requirements.append(str(requirement))
+        
+        self.phase_times['检查依赖'] = time.perf_counter() - phase_start
     
     def install_dependencies(self):
-        """安装打包依赖"""
+        """安装打包依赖（仅安装缺失或版本不满足的包，一次pip调用完成）"""
         self.print_step(2, "安装打包依赖")
+        phase_start = time.perf_counter()
         
-        requirements_file = self.script_dir / "requirements_build.txt"
-        if requirements_file.exists():
+        if not self.missing_requirements:
+            print("✓ 所有依赖已满足，跳过安装")
+        else:
             try:
-                print("正在安装依赖包...")
+                print(f"正在安装 {len(self.missing_requirements)} 个依赖包: {', '.join(self.missing_requirements)}")
                 subprocess.run([
-                    sys.executable, "-m", "pip", "install", "-r", str(requirements_file)
+                    sys.executable, "-m", "pip", "install", *self.missing_requirements
                 ], check=True)
                 print("✓ 依赖包安装完成")
             except subprocess.CalledProcessError as e:
                 print(f"⚠ 依赖安装失败: {e}")
                 print("继续执行打包过程...")
-        else:
-            print("⚠ requirements_build.txt不存在，跳过依赖安装")
+            
+            # PyInstaller是打包的硬性要求，安装后重新确认
+            pyinstaller_lines = [line for line in self.missing_requirements if Requirement(line).name.lower() == 'pyinstaller']
+            if pyinstaller_lines:
+                importlib.invalidate_caches()
+                _, _, satisfied = self.check_requirement(pyinstaller_lines[0])
+                if not satisfied:
+                    raise Exception("PyInstaller检查失败: 安装后仍不可用")
+        print("✓ PyInstaller已准备就绪")
+        
+        self.phase_times['安装依赖'] = time.perf_counter() - phase_start
+        self.print_phase_times()
+    
+    def print_phase_times(self):
+        """打印预检各阶段耗时"""
+        summary = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phase_times.items())
+        print(f"⏱ 预检耗时: {summary}")
     
     def clean_build_dirs(self):
         """清理构建目录"""
-        self.print_step(3, "清理构建目录")
+        self.print_step(4, "清理构建目录")
+        
+        if self.cache_hit:
+            print("♻️ 构建缓存命中，保留现有 dist 输出")
+            return
         
-        dirs_to_clean = [self.dist_dir, self.build_dir]
+        # 启用缓存时保留PyInstaller工作目录，使其可以复用上次的分析结果
+        dirs_to_clean = [self.dist_dir]
+        if not self.use_cache:
+            dirs_to_clean.append(self.build_dir)
+        else:
+            print(f"♻️ 保留PyInstaller工作目录: {self.build_dir}")
         for dir_path in dirs_to_clean:
-            if dir_path.exists():
+            if dir_path == self.build_dir:
+                self.remove_build_dir()
+            elif dir_path.exists():
                 print(f"删除目录: {dir_path}")
                 shutil.rmtree(dir_path)
             print(f"✓ 已清理: {dir_path}")
     
-    def create_spec_file(self):
-        """创建PyInstaller配置文件"""
-        self.print_step(4, "创建打包配置")
-        
+    def remove_build_dir(self):
+        """删除build目录中的PyInstaller工作文件和构建缓存，保留产物基线清单"""
+        if not self.build_dir.exists():
+            return
+        print(f"删除目录: {self.build_dir}（保留 {self.manifest_file.name}）")
+        for item in self.build_dir.iterdir():
+            if item == self.manifest_file:
+                continue
+            if item.is_dir():
+                shutil.rmtree(item)
+            else:
+                item.unlink()
+    
+    def default_import_plan(self):
+        """按现有规则生成隐式导入列表和需要collect_all的包"""
         # 基础隐式导入（总是包含的核心模块）
         base_hiddenimports = [
             'pystray._win32',
@@ -117,7 +308,6 @@ class ExeBuilder:
         
         additional_imports = []
         collect_data_packages = []
-        collect_data_str = ""
         
         # 只有在启用依赖收集时才处理requirements.txt
         if self.collect_dependencies:
@@ -183,7 +373,182 @@ class ExeBuilder:
                     print(f"⚠ 读取requirements.txt失败: {e}")
             
             print(f"✓ 从requirements.txt解析出 {len(additional_imports)} 个模块")
-            
+        
+        # 组合所有隐式导入（排序以保证spec内容稳定，否则构建缓存键每次都会变化）
+        all_hiddenimports = sorted(set(base_hiddenimports + additional_imports))
+        return all_hiddenimports, collect_data_packages
+    
+    def trace_imports(self, extra_roots=(), collect_packages=()):
+        """追踪源文件的导入图，返回 {模块名: 字节数}"""
+        finder = ModuleFinder(path=[str(self.project_root)] + sys.path, excludes=list(DEFAULT_EXCLUDES))
+        finder.run_script(str(self.source_file))
+        for name in extra_roots:
+            try:
+                finder.import_hook(name)
+            except ImportError:
+                pass
+        
+        modules = {}
+        for name, module in finder.modules.items():
+            file_path = module.__file__
+            modules[name] = os.path.getsize(file_path) if file_path and os.path.isfile(file_path) else 0
+        
+        # collect_all会收集包目录下的全部文件
+        for package in collect_packages:
+            package_module = finder.modules.get(package)
+            package_paths = getattr(package_module, '__path__', None) if package_module else None
+            for package_dir in package_paths or []:
+                for file_path in Path(package_dir).rglob('*'):
+                    if file_path.is_file() and '__pycache__' not in file_path.parts:
+                        key = f"{package}:{file_path.relative_to(package_dir).as_posix()}"
+                        modules.setdefault(key, file_path.stat().st_size)
+        
+        return modules, sorted(finder.badmodules)
+    
+    def analyze_imports(self):
+        """分析实际导入图，生成最小hiddenimports/excludes并与当前spec对比"""
+        self.print_step(3, "分析导入图")
+        
+        minimal_modules, missing = self.trace_imports()
+        
+        hiddenimports = []
+        excludes = []
+        for package, (windows_backends, other_backends) in PLATFORM_BACKENDS.items():
+            if package in minimal_modules:
+                hiddenimports.extend(windows_backends)
+                excludes.extend(m for m in other_backends if m in minimal_modules)
+        for candidate in EXCLUDE_CANDIDATES:
+            if not any(m == candidate or m.startswith(candidate + '.') for m in minimal_modules):
+                excludes.append(candidate)
+        
+        # 从最小集合中去掉被排除的其他平台后端，再把Windows后端追踪进来
+        minimal_modules, _ = self.trace_imports(extra_roots=hiddenimports)
+        for name in list(minimal_modules):
+            if any(name == m or name.startswith(m + '.') for m in excludes):
+                del minimal_modules[name]
+        
+        current_hiddenimports, collect_packages = self.default_import_plan()
+        current_modules, _ = self.trace_imports(extra_roots=current_hiddenimports, collect_packages=collect_packages)
+        
+        self.import_plan = {
+            'hiddenimports': sorted(set(hiddenimports)),
+            'excludes': sorted(set(excludes)),
+        }
+        
+        def summarize(modules):
+            return len(modules), sum(modules.values()) / (1024 * 1024)
+        
+        current_count, current_mb = summarize(current_modules)
+        minimal_count, minimal_mb = summarize(minimal_modules)
+        last_sizes = self.load_build_cache().get('exe_sizes', {})
+        
+        print(f"{'方案':<12}{'模块数':>8}{'模块字节(估算)':>18}{'上次exe大小':>16}")
+        for label, mode, count, size_mb in [
+            ("当前spec", 'default', current_count, current_mb),
+            ("最小导入", 'minimal', minimal_count, minimal_mb),
+        ]:
+            exe_size = last_sizes.get(mode)
+            exe_str = f"{exe_size / (1024 * 1024):.2f} MB" if exe_size else "未构建"
+            print(f"{label:<12}{count:>8}{size_mb:>15.2f} MB{exe_str:>16}")
+        
+        # 按顶层包汇总字节贡献
+        by_package = {}
+        for name, size in minimal_modules.items():
+            top = name.split('.')[0]
+            by_package[top] = by_package.get(top, 0) + size
+        print("\n📦 最小方案按顶层包的字节贡献（前15）:")
+        for top, size in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:15]:
+            print(f"  {top:<30}{size:>12,} bytes")
+        
+        print("\n📄 最小方案中最大的模块（前15）:")
+        for name, size in sorted(minimal_modules.items(), key=lambda kv: kv[1], reverse=True)[:15]:
+            print(f"  {name:<40}{size:>12,} bytes")
+        
+        print(f"\n✓ 生成 hiddenimports ({len(self.import_plan['hiddenimports'])}): {', '.join(self.import_plan['hiddenimports'])}")
+        print(f"✓ 生成 excludes ({len(self.import_plan['excludes'])}): {', '.join(self.import_plan['excludes'])}")
+        if missing:
+            print(f"⚠ 当前环境中无法解析 {len(missing)} 个模块（可能是其他平台专用），例如: {', '.join(missing[:8])}")
+        
+        try:
+            self.import_report_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.import_report_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'plan': self.import_plan,
+                    'minimal_modules': minimal_modules,
+                    'current_modules': current_modules,
+                    'unresolved': missing,
+                }, f, ensure_ascii=False, indent=2)
+            print(f"✓ 分析报告已写入: {self.import_report_file}")
+        except Exception as e:
+            print(f"⚠ 写入分析报告失败: {e}")
+    
+    def layout_spec_section(self):
+        """根据打包布局生成spec中的EXE/COLLECT部分"""
+        runtime_tmpdir = repr(self.runtime_tmpdir) if self.runtime_tmpdir else None
+        exe_common = f"""    name='FakeLockScreen',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx={self.use_upx},
+    upx_exclude=[],
+    console=False,  # 无控制台窗口
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+    icon=None,  # 可以添加图标文件路径
+    version_file=None,"""
+        
+        if self.layout == 'onedir':
+            # 目录模式：启动时无需解压，直接从磁盘加载
+            return f"""exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+{exe_common}
+)
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx={self.use_upx},
+    upx_exclude=[],
+    name='FakeLockScreen',
+)
+"""
+        
+        return f"""exe = EXE(
+    pyz,
+    a.scripts,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    [],
+    runtime_tmpdir={runtime_tmpdir},
+{exe_common}
+)
+"""
+    
+    def create_spec_file(self):
+        """创建PyInstaller配置文件"""
+        self.print_step(3, "创建打包配置")
+        
+        excludes = list(DEFAULT_EXCLUDES)
+        collect_data_packages = []
+        if self.minimal_imports and self.import_plan:
+            print("🔬 使用导入图分析生成的最小隐式导入/排除列表")
+            all_hiddenimports = self.import_plan['hiddenimports']
+            excludes = self.import_plan['excludes']
+        else:
+            all_hiddenimports, collect_data_packages = self.default_import_plan()
+        
+        collect_data_str = ""
+        if self.collect_dependencies and not self.minimal_imports:
             # 为requirements包生成collect_data配置
             if collect_data_packages:
                 collect_data_str = f"""
@@ -210,14 +575,11 @@ collected_binaries = []
 collected_hiddenimports = []
 """
         
-        # 组合所有隐式导入
-        all_hiddenimports = base_hiddenimports + additional_imports
-        
-        # 去重
-        all_hiddenimports = list(set(all_hiddenimports))
-        
-        # 生成hiddenimports字符串
+        # 生成hiddenimports/excludes字符串
         hiddenimports_str = ',\n        '.join([f"'{imp}'" for imp in all_hiddenimports])
+        excludes_str = ',\n        '.join([f"'{mod}'" for mod in excludes])
+        
+        exe_str = self.layout_spec_section()
         
         spec_content = f'''# -*- mode: python ; coding: utf-8 -*-
 {collect_data_str}
@@ -235,13 +597,7 @@ a = Analysis(
     hooksconfig={{}},
     runtime_hooks=[],
     excludes=[
-        'matplotlib',
-        'numpy',
-        'scipy',
-        'pandas',
-        'PyQt5',
-        'PyQt6',
-        'tkinter.test',
+        {excludes_str},
     ],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
@@ -251,62 +607,142 @@ a = Analysis(
 
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.zipfiles,
-    a.datas,
-    [],
-    name='FakeLockScreen',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=False,  # 无控制台窗口
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-    icon=None,  # 可以添加图标文件路径
-    version_file=None,
-)
-'''
+{exe_str}'''
         
         with open(self.spec_file, 'w', encoding='utf-8') as f:
             f.write(spec_content)
         
         print(f"✓ 配置文件已创建: {self.spec_file}")
         print(f"✓ 包含 {len(all_hiddenimports)} 个隐式导入模块")
-        if self.collect_dependencies:
+        print(f"✓ 排除 {len(excludes)} 个模块")
+        if self.collect_dependencies and not self.minimal_imports:
             print(f"✓ 配置完整收集 {len(collect_data_packages)} 个依赖包")
         else:
             print("ℹ️ 未收集额外依赖包")
 
+    def compute_cache_key(self):
+        """计算构建缓存键（源文件、依赖文件、spec内容和解释器版本的哈希）"""
+        digest = hashlib.sha256()
+        
+        inputs = [
+            self.source_file,
+            self.project_root / "requirements.txt",
+            self.script_dir / "requirements_build.txt",
+            self.spec_file,
+        ]
+        for path in inputs:
+            digest.update(path.name.encode('utf-8'))
+            if path.exists():
+                digest.update(path.read_bytes())
+            else:
+                digest.update(b"<missing>")
+        
+        digest.update(sys.version.encode('utf-8'))
+        digest.update(sys.platform.encode('utf-8'))
+        try:
+            digest.update(metadata.version("pyinstaller").encode('utf-8'))
+        except Exception:
+            digest.update(b"<pyinstaller-unknown>")
+        
+        return digest.hexdigest()
+    
+    def load_build_cache(self):
+        """读取构建缓存记录，不存在或损坏时返回空记录"""
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+    
+    def check_build_cache(self):
+        """检查构建缓存是否命中"""
+        if not self.use_cache:
+            return False
+        
+        self.cache_key = self.compute_cache_key()
+        cache = self.load_build_cache()
+        artifact = cache.get('artifact', {})
+        
+        self.cache_hit = (
+            cache.get('key') == self.cache_key
+            and self.exe_file.exists()
+            and self.exe_file.stat().st_size == artifact.get('size')
+            and int(self.exe_file.stat().st_mtime) == artifact.get('mtime')
+        )
+        
+        hits = cache.get('hits', 0) + (1 if self.cache_hit else 0)
+        misses = cache.get('misses', 0) + (0 if self.cache_hit else 1)
+        if self.cache_hit:
+            print(f"♻️ 构建缓存命中 (键: {self.cache_key[:12]})")
+            print(f"   上次完整构建耗时 {cache.get('build_seconds', 0):.1f} 秒，本次跳过")
+        else:
+            print(f"🔨 构建缓存未命中 (键: {self.cache_key[:12]})，需要重新打包")
+        print(f"📊 缓存统计: 命中 {hits} 次 / 未命中 {misses} 次")
+        
+        cache.update({'hits': hits, 'misses': misses})
+        self.save_build_cache(cache)
+        return self.cache_hit
+    
+    def save_build_cache(self, cache):
+        """写入构建缓存记录"""
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"⚠ 写入构建缓存失败: {e}")
+    
+    def record_build_cache(self, build_seconds):
+        """打包成功后记录缓存键和产物信息"""
+        if not self.use_cache or not self.exe_file.exists():
+            return
+        
+        cache = self.load_build_cache()
+        import_mode = 'minimal' if self.minimal_imports else 'default'
+        cache.setdefault('exe_sizes', {})[import_mode] = self.exe_file.stat().st_size
+        cache.update({
+            'key': self.cache_key,
+            'build_seconds': build_seconds,
+            'built_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'artifact': {
+                'size': self.exe_file.stat().st_size,
+                'mtime': int(self.exe_file.stat().st_mtime),
+            },
+        })
+        self.save_build_cache(cache)
+        print(f"✓ 构建缓存已更新 (键: {self.cache_key[:12]})")
+
     def build_exe(self):
         """执行打包"""
         self.print_step(5, "开始打包")
         
+        if self.cache_hit:
+            print("♻️ 构建缓存命中，跳过PyInstaller打包")
+            return
+        
         try:
-            # 使用spec文件打包，不添加额外参数
-            cmd = [
-                sys.executable, "-m", "PyInstaller",
-                "--clean",
+            # 使用spec文件打包；启用缓存时不使用--clean，让PyInstaller复用工作目录
+            cmd = [sys.executable, "-m", "PyInstaller"]
+            if not self.use_cache:
+                cmd.append("--clean")
+            cmd += [
                 "--noconfirm",
-                str(self.spec_file)
+                "--distpath", str(self.dist_dir),
+                "--workpath", str(self.build_dir),
+                str(self.spec_file),
             ]
             
             print(f"执行命令: {' '.join(cmd)}")
             print("打包中，请稍候...")
             
             # 执行打包命令
+            start_time = time.perf_counter()
             result = subprocess.run(cmd, cwd=self.project_root, capture_output=True, text=True)
+            build_seconds = time.perf_counter() - start_time
             
             if result.returncode == 0:
-                print("✓ 打包成功完成")
+                print(f"✓ 打包成功完成 (耗时 {build_seconds:.1f} 秒)")
+                self.record_build_cache(build_seconds)
                 if result.stdout:
                     print("构建输出:")
                     print(result.stdout[-1000:])  # 显示最后1000字符
@@ -322,6 +758,73 @@ exe = EXE(
         except Exception as e:
             raise Exception(f"打包过程出错: {e}")
     
+    def measure_cold_start(self, runs):
+        """以 --selftest-exit 启动产物，测量从启动到首个窗口出现后退出的时间"""
+        timings = []
+        for _ in range(runs):
+            start_time = time.perf_counter()
+            try:
+                result = subprocess.run([str(self.exe_file), "--selftest-exit"], timeout=60)
+            except subprocess.TimeoutExpired:
+                print(f"⚠ 自检超时: {self.exe_file}")
+                break
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            if result.returncode != 0:
+                print(f"⚠ 自检退出码异常 ({result.returncode}): {self.exe_file}")
+                break
+            timings.append(elapsed_ms)
+        return timings
+    
+    def measure_idle_rss(self):
+        """以 --footprint-report 启动产物，读取托盘驻留稳定后的常驻内存（MB）"""
+        report_file = self.build_dir / "footprint_report.json"
+        try:
+            subprocess.run([str(self.exe_file), f"--footprint-report={report_file}"], timeout=60)
+        except subprocess.TimeoutExpired:
+            print(f"⚠ 内存自检超时: {self.exe_file}")
+            return None
+        report = self.load_json_file(report_file)
+        return report.get('rss_mb') if report else None
+    
+    def benchmark_layouts(self):
+        """构建每种布局并比较冷启动时间"""
+        if sys.platform != 'win32':
+            print("⚠ 冷启动基准测试需要在Windows上运行打包产物，当前平台仅构建不测量")
+        
+        results = []
+        bench_root = self.project_root / "dist_bench"
+        for name, layout, use_upx in BENCH_LAYOUTS:
+            print(f"\n🧪 基准布局: {name}")
+            self.configure_layout(
+                layout,
+                use_upx=use_upx,
+                runtime_tmpdir=self.runtime_tmpdir,
+                dist_dir=bench_root / name,
+                build_dir=self.project_root / "build" / "bench" / name,
+            )
+            self.create_spec_file()
+            self.check_build_cache()
+            self.clean_build_dirs()
+            self.build_exe()
+            
+            timings = self.measure_cold_start(self.bench_runs) if sys.platform == 'win32' else []
+            size = self.exe_file.stat().st_size if self.exe_file.exists() else 0
+            results.append((name, size, timings))
+        
+        self.print_step(6, "冷启动基准结果")
+        print(f"{'布局':<16}{'exe大小':>12}{'首次(ms)':>12}{'中位数(ms)':>12}{'最快(ms)':>12}")
+        measured = []
+        for name, size, timings in results:
+            if timings:
+                median = sorted(timings)[len(timings) // 2]
+                measured.append((median, name))
+                print(f"{name:<16}{size / (1024 * 1024):>9.2f} MB{timings[0]:>12.0f}{median:>12.0f}{min(timings):>12.0f}")
+            else:
+                print(f"{name:<16}{size / (1024 * 1024):>9.2f} MB{'-':>12}{'-':>12}{'-':>12}")
+        if measured:
+            print(f"\n🏁 冷启动最快的布局: {min(measured)[1]}（可用 --layout/--no-upx 参数选择）")
+        return bool(measured) or sys.platform != 'win32'
+    
     def copy_additional_files(self):
         """复制附加文件"""
         self.print_step(6, "复制附加文件")
@@ -372,6 +875,7 @@ exe = EXE(
 - Python版本: {sys.version}
 - 构建平台: {sys.platform}
 - 打包模式: 依赖内置（--collect-all）
+- 打包布局: {self.describe_layout()}
 
 ## 文件说明
 - `FakeLockScreen.exe` - 主程序文件（单文件，包含所有依赖）
@@ -419,6 +923,7 @@ exe = EXE(
 - Python版本: {sys.version}
 - 构建平台: {sys.platform}
 - 打包模式: 标准模式（需要Python环境）
+- 打包布局: {self.describe_layout()}
 
 ## 文件说明
 - `FakeLockScreen.exe` - 主程序文件
@@ -474,10 +979,12 @@ exe = EXE(
         """清理构建完成后的临时文件"""
         print("\n🧹 清理构建临时文件...")
         
-        # 清理build目录
-        if self.build_dir.exists():
+        # 清理build目录（启用缓存时保留，供下次增量构建复用）
+        if self.use_cache:
+            print(f"♻️ 保留构建目录以供增量构建: {self.build_dir}")
+        elif self.build_dir.exists():
             try:
-                shutil.rmtree(self.build_dir)
+                self.remove_build_dir()
                 print(f"✓ 已清理构建目录: {self.build_dir}")
             except Exception as e:
                 print(f"⚠ 清理构建目录失败: {e}")
@@ -496,7 +1003,7 @@ exe = EXE(
         """验证构建结果"""
         self.print_step(9, "验证构建结果")
         
-        exe_file = self.dist_dir / "FakeLockScreen.exe"
+        exe_file = self.exe_file
         
         if exe_file.exists():
             file_size = exe_file.stat().st_size
@@ -513,11 +1020,122 @@ exe = EXE(
                 elif item.is_dir():
                     print(f"  📁 {item.name}/")
             
-            return True
+            return self.check_budgets()
         else:
             print("❌ EXE文件未生成")
             return False
     
+    def load_json_file(self, path):
+        """读取JSON文件，不存在或损坏时返回None"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return None
+    
+    def collect_bundle_manifest(self):
+        """从PyInstaller工作目录的TOC文件中收集打包的模块和二进制文件及其大小"""
+        manifest = {'modules': {}, 'binaries': {}}
+        work_dir = self.build_dir / self.spec_file.stem
+        
+        def walk(node):
+            if isinstance(node, (list, tuple)):
+                if (len(node) == 3 and all(isinstance(item, str) for item in node)
+                        and node[2] in TOC_MODULE_TYPES | TOC_BINARY_TYPES):
+                    name, path, typecode = node
+                    size = os.path.getsize(path) if os.path.isfile(path) else 0
+                    target = 'modules' if typecode in TOC_MODULE_TYPES else 'binaries'
+                    manifest[target][name] = size
+                    return
+                for item in node:
+                    walk(item)
+        
+        for toc_file in sorted(work_dir.glob('*.toc')):
+            try:
+                walk(ast.literal_eval(toc_file.read_text(encoding='utf-8')))
+            except Exception as e:
+                print(f"⚠ 无法解析 {toc_file.name}: {e}")
+        return manifest
+    
+    def print_manifest_diff(self, baseline, manifest):
+        """打印与基线相比增长最多的模块和二进制文件"""
+        for section, label in [('modules', '模块'), ('binaries', '二进制文件')]:
+            old_items = baseline.get(section, {})
+            new_items = manifest.get(section, {})
+            grown = []
+            for name, size in new_items.items():
+                delta = size - old_items.get(name, 0)
+                if delta > 0:
+                    grown.append((delta, name, name not in old_items))
+            removed = [name for name in old_items if name not in new_items]
+            
+            print(f"\n📈 {label}变化: {len(old_items)} → {len(new_items)} "
+                  f"(新增 {sum(1 for g in grown if g[2])}, 移除 {len(removed)})")
+            for delta, name, is_new in sorted(grown, reverse=True)[:20]:
+                print(f"  {'+ 新增' if is_new else '↑ 增长'} {name:<50}{delta:>+12,} bytes")
+    
+    def check_budgets(self):
+        """对照预算文件检查exe大小、模块数量、自检启动时间和驻留内存，超出预算则构建失败"""
+        budgets = self.load_json_file(self.budgets_file)
+        if budgets is None:
+            print(f"ℹ️ 未找到预算文件 {self.budgets_file.name}，跳过预算检查")
+            return True
+        
+        print(f"\n📏 预算检查 ({self.budgets_file.name}):")
+        manifest = self.collect_bundle_manifest()
+        manifest['exe_size'] = self.exe_file.stat().st_size
+        
+        # 启动时间和驻留内存需要运行产物，只能在Windows上测量
+        can_run = sys.platform == 'win32'
+        if 'max_startup_ms' in budgets and can_run:
+            timings = self.measure_cold_start(3)
+            manifest['startup_ms'] = sorted(timings)[len(timings) // 2] if timings else None
+        if 'max_idle_rss_mb' in budgets and can_run:
+            manifest['idle_rss_mb'] = self.measure_idle_rss()
+        
+        checks = [
+            ("exe大小 (MB)", manifest['exe_size'] / (1024 * 1024), budgets.get('max_exe_mb'), True),
+            ("打包模块数", len(manifest['modules']), budgets.get('max_modules'), True),
+            ("自检启动时间 (ms)", manifest.get('startup_ms'), budgets.get('max_startup_ms'), can_run),
+            ("托盘驻留内存 (MB)", manifest.get('idle_rss_mb'), budgets.get('max_idle_rss_mb'), can_run),
+        ]
+        passed = True
+        for label, value, limit, measurable in checks:
+            if limit is None:
+                continue
+            if not measurable:
+                print(f"  ℹ️ {label}: 当前平台无法运行产物，跳过（预算 {limit}）")
+                continue
+            if value is None:
+                # 产物无法启动或没有输出测量结果，按超出预算处理
+                print(f"  ❌ {label}: 无法测量（预算 {limit}）")
+                passed = False
+                continue
+            ok = value <= limit
+            passed = passed and ok
+            print(f"  {'✓' if ok else '❌'} {label}: {value:,.2f} / 预算 {limit:,}")
+        
+        baseline = self.load_json_file(self.manifest_file)
+        if baseline:
+            if not passed or "--show-bundle-diff" in sys.argv:
+                self.print_manifest_diff(baseline, manifest)
+            print(f"\nℹ️ 基线exe大小: {baseline.get('exe_size', 0) / (1024 * 1024):.2f} MB，"
+                  f"基线启动时间: {baseline.get('startup_ms') or '-'} ms")
+        
+        if not passed:
+            print("❌ 构建产物超出预算或无法测量，请检查上面的结果和增长明细")
+            return False
+        
+        # 通过预算检查后更新基线，下次构建与之对比
+        try:
+            self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.manifest_file, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+            print(f"✓ 已更新产物基线: {self.manifest_file.name}")
+        except Exception as e:
+            print(f"⚠ 写入产物基线失败: {e}")
+        return True
+    
     def run(self):
         """执行完整的打包流程"""
         print("🚀 假锁屏工具 - 自动化打包程序")
@@ -526,8 +1144,15 @@ exe = EXE(
         try:
             self.check_requirements()
             self.install_dependencies()
-            self.clean_build_dirs()
+            if self.analyze_only or self.minimal_imports:
+                self.analyze_imports()
+                if self.analyze_only:
+                    return True
+            if self.bench_layouts:
+                return self.benchmark_layouts()
             self.create_spec_file()
+            self.check_build_cache()
+            self.clean_build_dirs()
             self.build_exe()
             self.copy_additional_files()
             self.create_launcher_batch()
@@ -537,7 +1162,7 @@ exe = EXE(
                 self.print_step(10, "🎉 打包完成")
                 print(f"✅ 构建成功完成！")
                 print(f"📁 输出目录: {self.dist_dir}")
-                print(f"🚀 主程序: {self.dist_dir / 'FakeLockScreen.exe'}")
+                print(f"🚀 主程序: {self.exe_file}")
                 print(f"📋 发布说明: {self.dist_dir / '发布说明.txt'}")
                 
                 # 清理构建临时文件
@@ -558,6 +1183,7 @@ exe = EXE(
                     print("4. 确认无误后分发 dist 文件夹（目标机器需要Python环境）")
                     print("5. 调试模式：FakeLockScreen.exe --debug")
                     print("\n💡 提示：如需生成无依赖的独立exe，请运行：python build_exe.py --collect-all")
+                print("💡 提示：如需忽略构建缓存完整重建，请添加参数：--no-cache")
             else:
                 print("❌ 构建验证失败")
                 return False
@@ -574,7 +1200,12 @@ exe = EXE(
         return True
 
 if __name__ == "__main__":
-    builder = ExeBuilder()
+    try:
+        builder = ExeBuilder()
+    except ValueError as e:
+        # 命令行参数无效（例如未知的 --layout）
+        print(f"❌ {e}")
+        sys.exit(2)
     success = builder.run()
     
     print("\n" + "="*60)
@@ -1,109 +1,3084 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import pystray
-from PIL import Image, ImageDraw
 import threading
+import contextlib
+import asyncio
+from collections import deque
+from types import SimpleNamespace
+import concurrent.futures
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 import keyboard
 import json
 import os
 import sys
 import ctypes
+from ctypes import wintypes
 import subprocess
-import wmi
+import hashlib
+import hmac
+import secrets
+import marshal
+import struct
+import socket
+import time
+import re
+import datetime
+import functools
+import heapq
+import gc
+import tracemalloc
+
+try:
+    import wmi  # 仅Windows，用于亮度控制
+except ImportError:
+    wmi = None
+
+try:
+    from multiprocessing import shared_memory  # Python 3.8+，独立输入过滤进程需要
+except ImportError:
+    shared_memory = None
+
+try:
+    import psutil  # 可选依赖，仅用于线程/上下文切换统计
+except ImportError:
+    psutil = None
+
+# 启动计时的零点（模块加载时）
+PROCESS_START = time.perf_counter()
 
 # 调试模式开关
 DEBUG_MODE = False
 # 全局日志文件变量
 startup_log = None
+# 内存自检：隐藏到托盘并稳定后把内存占用报告写入指定文件再退出
+FOOTPRINT_REPORT = next((arg.split('=', 1)[1].strip('"') for arg in sys.argv if arg.startswith('--footprint-report=')), None)
+# 托盘启动：不创建主窗口控件，直到从托盘菜单选择“显示主窗口”（开机自启使用此模式）
+TRAY_START = "--tray" in sys.argv
+# 启动报告：快捷键、托盘和主窗口都就绪后输出各阶段耗时并退出
+STARTUP_REPORT = "--startup-report" in sys.argv
+# 自检模式：首个窗口显示后立即退出，用于打包产物的冷启动测量
+SELFTEST_EXIT = "--selftest-exit" in sys.argv or FOOTPRINT_REPORT is not None or STARTUP_REPORT
+# 托盘驻留状态的内存目标与打包预算共用一个文件
+BUILD_BUDGETS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build_package", "build_budgets.json")
+
+# 单例互斥量句柄，需在进程生命周期内保持引用
+mutex = None
+
+def ensure_single_instance():
+    """单例模式实现：已有实例运行时退出"""
+    global mutex
+    mutex_name = "FakeLockScreenSingletonMutex"
+    mutex = ctypes.windll.kernel32.CreateMutexW(None, False, mutex_name)
+    last_error = ctypes.windll.kernel32.GetLastError()
+
+    if last_error == 183:  # ERROR_ALREADY_EXISTS
+        if not SELFTEST_EXIT:
+            messagebox.showerror("错误", "程序已经在运行，不能同时运行多个实例。")
+        sys.exit(1)
+
+def hide_console():
+    """隐藏控制台窗口"""
+    try:
+        console_window = ctypes.windll.kernel32.GetConsoleWindow()
+        if console_window != 0:
+            ctypes.windll.user32.ShowWindow(console_window, 0)
+    except:
+        pass
+
+def show_console():
+    """显示控制台窗口"""
+    try:
+        console_window = ctypes.windll.kernel32.GetConsoleWindow()
+        if console_window != 0:
+            ctypes.windll.user32.ShowWindow(console_window, 1)
+    except:
+        pass
+
+def debug_print(message):
+    """调试输出，如果启用，则同时打印到控制台和日志文件"""
+    if DEBUG_MODE:
+        print(message)
+        # 只有在startup_log被设置后才写入文件
+        if startup_log:
+            try:
+                with open(startup_log, 'a', encoding='utf-8') as f:
+                    f.write(message + "\n")
+            except Exception as e:
+                # 在这种情况下，只打印到控制台，避免无限循环
+                print(f"!! 无法写入日志文件: {e}")
+
+@functools.lru_cache(maxsize=None)
+def is_admin():
+    """检查是否以管理员身份运行（进程运行期间不会改变，结果缓存）"""
+    try:
+        return ctypes.windll.shell32.IsUserAnAdmin()
+    except:
+        return False
+
+def run_as_admin():
+    """以管理员身份重新运行程序"""
+    try:
+        if is_admin():
+            return True
+        else:
+            debug_print("⚠ 需要管理员权限，正在重新启动...")
+            
+            # 准备参数
+            args_list = sys.argv
+            
+            # 如果已有日志文件，将其作为参数传递
+            if startup_log and os.path.exists(startup_log):
+                args_list.append(f'--log-file="{startup_log}"')
+
+            # 构建完整的命令行参数
+            script_path = args_list[0]
+            if ' ' in script_path:
+                script_path = f'"{script_path}"'
+            
+            other_args = args_list[1:]
+            args_str = ' '.join(other_args)
+            
+            full_cmd = f'{script_path} {args_str}'.strip()
+            debug_print(f"🔄 启动命令: {sys.executable} {full_cmd}")
+            
+            result = ctypes.windll.shell32.ShellExecuteW(
+                None, "runas", sys.executable, full_cmd, None, 1
+            )
+            
+            if result <= 32:
+                debug_print(f"❌ 权限请求失败，返回值: {result}")
+                messagebox.showerror("权限错误", "无法获取管理员权限，程序将继续运行但功能可能受限。")
+                return True  # 继续运行但功能受限
+            
+            debug_print("✅ 权限请求成功，程序将重新启动")
+            return False
+    except Exception as e:
+        debug_print(f"❌ 权限请求异常: {e}")
+        messagebox.showerror("权限错误", f"无法获取管理员权限：{e}\n程序将继续运行但功能可能受限。")
+        return True
+
+# 低级鼠标钩子相关常量
+WH_MOUSE_LL = 14
+HC_ACTION = 0
+WM_QUIT = 0x0012
+WM_MOUSEMOVE = 0x0200
+THREAD_QUERY_LIMITED_INFORMATION = 0x0800
+
+if os.name == 'nt':
+    LowLevelMouseProc = ctypes.WINFUNCTYPE(ctypes.c_ssize_t, ctypes.c_int, wintypes.WPARAM, wintypes.LPARAM)
+else:
+    LowLevelMouseProc = ctypes.CFUNCTYPE(ctypes.c_ssize_t, ctypes.c_int, ctypes.c_size_t, ctypes.c_ssize_t)
+
+# 显示器拓扑相关常量
+SM_XVIRTUALSCREEN = 76
+SM_CMONITORS = 80
+MONITORINFOF_PRIMARY = 1
+WM_DISPLAYCHANGE = 0x007E
+GWLP_WNDPROC = -4
+
+class MONITORINFO(ctypes.Structure):
+    _fields_ = [
+        ('cbSize', wintypes.DWORD),
+        ('rcMonitor', wintypes.RECT),
+        ('rcWork', wintypes.RECT),
+        ('dwFlags', wintypes.DWORD),
+    ]
+
+if os.name == 'nt':
+    MonitorEnumProc = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HMONITOR, wintypes.HDC, ctypes.POINTER(wintypes.RECT), wintypes.LPARAM)
+    WindowProc = ctypes.WINFUNCTYPE(ctypes.c_ssize_t, wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM)
+
+def enumerate_monitors_windows():
+    """用EnumDisplayMonitors列出各显示器的 (x, y, 宽, 高, 是否主显示器)"""
+    user32 = ctypes.windll.user32
+    monitors = []
+
+    def callback(hmonitor, hdc, rect, lparam):
+        info = MONITORINFO()
+        info.cbSize = ctypes.sizeof(info)
+        if user32.GetMonitorInfoW(hmonitor, ctypes.byref(info)):
+            r = info.rcMonitor
+            monitors.append((r.left, r.top, r.right - r.left, r.bottom - r.top, bool(info.dwFlags & MONITORINFOF_PRIMARY)))
+        return True
+
+    user32.EnumDisplayMonitors(None, None, MonitorEnumProc(callback), 0)
+    return monitors
+
+DISPLAY_DEVICE_ATTACHED_TO_DESKTOP = 0x1
+
+class DISPLAY_DEVICEW(ctypes.Structure):
+    _fields_ = [
+        ('cb', wintypes.DWORD),
+        ('DeviceName', wintypes.WCHAR * 32),
+        ('DeviceString', wintypes.WCHAR * 128),
+        ('StateFlags', wintypes.DWORD),
+        ('DeviceID', wintypes.WCHAR * 128),
+        ('DeviceKey', wintypes.WCHAR * 128),
+    ]
+
+def display_identity():
+    """
+    返回标识当前显示配置的字符串列表，不依赖Tk，可在任意线程调用。
+    Windows上为所有已连接到桌面的显示器的设备ID（更换显示器或外接/拔出时变化），
+    其他平台只有平台名和DISPLAY。
+    """
+    if os.name != 'nt':
+        return [sys.platform, os.environ.get('DISPLAY', '')]
+    user32 = ctypes.windll.user32
+    identity = []
+    adapter = DISPLAY_DEVICEW()
+    adapter.cb = ctypes.sizeof(adapter)
+    adapter_index = 0
+    while user32.EnumDisplayDevicesW(None, adapter_index, ctypes.byref(adapter), 0):
+        if adapter.StateFlags & DISPLAY_DEVICE_ATTACHED_TO_DESKTOP:
+            monitor = DISPLAY_DEVICEW()
+            monitor.cb = ctypes.sizeof(monitor)
+            monitor_index = 0
+            while user32.EnumDisplayDevicesW(adapter.DeviceName, monitor_index, ctypes.byref(monitor), 0):
+                identity.append(monitor.DeviceID)
+                monitor_index += 1
+        adapter_index += 1
+    return sorted(identity)
+
+def parse_xrandr_monitors(output):
+    """解析 `xrandr --listmonitors` 的输出，例如 " 0: +*DP-1 1920/527x1080/296+0+0  DP-1" """
+    monitors = []
+    pattern = re.compile(r'^\s*\d+:\s+\+?(\*?)\S+\s+(\d+)/\d+x(\d+)/\d+\+(-?\d+)\+(-?\d+)')
+    for line in output.splitlines():
+        match = pattern.match(line)
+        if match:
+            primary, width, height, x, y = match.groups()
+            monitors.append((int(x), int(y), int(width), int(height), primary == '*'))
+    return monitors
+
+def enumerate_monitors_x11():
+    result = subprocess.run(['xrandr', '--listmonitors'], capture_output=True, text=True, timeout=2)
+    return parse_xrandr_monitors(result.stdout)
+
+class DisplayTopology:
+    """
+    显示器拓扑缓存。完整枚举只在首次使用、收到显示设置变更通知（WM_DISPLAYCHANGE）后，
+    或廉价签名（虚拟桌面范围和显示器数量）变化时进行；锁屏时通常直接使用缓存。
+    """
+
+    def __init__(self):
+        self.monitors = None
+        self._signature = None
+        self.enumerations = 0
+
+    def signature(self, widget):
+        if os.name == 'nt':
+            metrics = ctypes.windll.user32.GetSystemMetrics
+            return tuple(metrics(index) for index in range(SM_XVIRTUALSCREEN, SM_CMONITORS + 1))
+        return (widget.winfo_screenwidth(), widget.winfo_screenheight(),
+                widget.winfo_vrootwidth(), widget.winfo_vrootheight())
+
+    def invalidate(self):
+        """显示设置变更时调用，下次使用时重新枚举"""
+        self.monitors = None
+
+    def get(self, widget):
+        """返回显示器列表，主显示器排在第一个"""
+        signature = self.signature(widget)
+        if self.monitors is None or signature != self._signature:
+            self.monitors = self.enumerate(widget)
+            self._signature = signature
+            self.enumerations += 1
+            debug_print(f"🖥️ 显示器拓扑: {self.monitors}")
+        return self.monitors
+
+    def enumerate(self, widget):
+        monitors = []
+        try:
+            if os.name == 'nt':
+                monitors = enumerate_monitors_windows()
+            elif os.environ.get('DISPLAY'):
+                monitors = enumerate_monitors_x11()
+        except Exception as e:
+            debug_print(f"⚠ 枚举显示器失败: {e}")
+        if not monitors:
+            # 退回到Tk报告的单个屏幕
+            monitors = [(0, 0, widget.winfo_screenwidth(), widget.winfo_screenheight(), True)]
+        if not any(monitor[4] for monitor in monitors):
+            monitors[0] = monitors[0][:4] + (True,)
+        return sorted(monitors, key=lambda monitor: not monitor[4])
+
+def install_display_change_listener(widget, callback):
+    """
+    子类化Tk顶层窗口的窗口过程，收到WM_DISPLAYCHANGE时在Tk主线程中调用callback。
+    返回需要保持引用的窗口过程对象，非Windows平台返回None。
+    """
+    if os.name != 'nt':
+        return None
+    user32 = ctypes.windll.user32
+    set_window_long = getattr(user32, 'SetWindowLongPtrW', user32.SetWindowLongW)
+    set_window_long.argtypes = [wintypes.HWND, ctypes.c_int, ctypes.c_void_p]
+    set_window_long.restype = ctypes.c_void_p
+    user32.CallWindowProcW.argtypes = [ctypes.c_void_p, wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM]
+    user32.CallWindowProcW.restype = ctypes.c_ssize_t
+    hwnd = int(widget.wm_frame(), 16)
+    previous = None
+
+    def window_proc(hwnd, msg, w_param, l_param):
+        if msg == WM_DISPLAYCHANGE:
+            try:
+                callback()
+            except Exception as e:
+                debug_print(f"⚠ 处理显示设置变更失败: {e}")
+        return user32.CallWindowProcW(previous, hwnd, msg, w_param, l_param)
+
+    proc = WindowProc(window_proc)
+    previous = set_window_long(hwnd, GWLP_WNDPROC, ctypes.cast(proc, ctypes.c_void_p))
+    return proc
+
+# 屏幕抓取相关常量
+BI_RGB = 0
+DIB_RGB_COLORS = 0
+HALFTONE = 4
+SRCCOPY = 0x00CC0020
+CAPTUREBLT = 0x40000000
+
+class BITMAPINFOHEADER(ctypes.Structure):
+    _fields_ = [
+        ('biSize', wintypes.DWORD),
+        ('biWidth', wintypes.LONG),
+        ('biHeight', wintypes.LONG),
+        ('biPlanes', wintypes.WORD),
+        ('biBitCount', wintypes.WORD),
+        ('biCompression', wintypes.DWORD),
+        ('biSizeImage', wintypes.DWORD),
+        ('biXPelsPerMeter', wintypes.LONG),
+        ('biYPelsPerMeter', wintypes.LONG),
+        ('biClrUsed', wintypes.DWORD),
+        ('biClrImportant', wintypes.DWORD),
+    ]
+
+class ScreenBlur:
+    """
+    锁屏遮罩的模糊桌面背景。锁屏时把整个虚拟桌面一次缩小抓取（Windows用StretchBlt直接抓到小图，
+    其他平台ImageGrab后reduce），只在小图上做一次小半径模糊并压暗，再按各显示器的区域放大。
+    放大时先双线性放大到目标的1/UPSCALE_STEP，再最近邻放大到全尺寸；模糊后的图像没有细节，
+    块状不可见，而耗时约为直接双线性放大全尺寸的三分之一。
+    缩小抓取用的DIB和各显示器尺寸的PhotoImage在多次锁屏之间复用，不重复分配。
+    """
+
+    SCALE = 16
+    UPSCALE_STEP = 4
+    BLUR_RADIUS = 1.5
+    BRIGHTNESS = 0.6
+
+    def __init__(self):
+        self._dib = None  # (宽, 高, 内存DC, 位图, 像素指针)
+        self._photos = {}  # {(宽, 高): PhotoImage}
+        self._darken = [int(value * self.BRIGHTNESS) for value in range(256)] * 3
+        if os.name == 'nt':
+            self._user32 = ctypes.WinDLL('user32')
+            self._gdi32 = ctypes.WinDLL('gdi32')
+            self._user32.GetDC.restype = ctypes.c_void_p
+            self._user32.ReleaseDC.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+            self._gdi32.CreateCompatibleDC.argtypes = [ctypes.c_void_p]
+            self._gdi32.CreateCompatibleDC.restype = ctypes.c_void_p
+            self._gdi32.CreateDIBSection.argtypes = [ctypes.c_void_p, ctypes.c_void_p, wintypes.UINT,
+                                                     ctypes.POINTER(ctypes.c_void_p), ctypes.c_void_p, wintypes.DWORD]
+            self._gdi32.CreateDIBSection.restype = ctypes.c_void_p
+            self._gdi32.SelectObject.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+            self._gdi32.SelectObject.restype = ctypes.c_void_p
+            self._gdi32.SetStretchBltMode.argtypes = [ctypes.c_void_p, ctypes.c_int]
+            self._gdi32.SetBrushOrgEx.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+            self._gdi32.StretchBlt.argtypes = [ctypes.c_void_p] + [ctypes.c_int] * 4 + [ctypes.c_void_p] + [ctypes.c_int] * 4 + [wintypes.DWORD]
+            self._gdi32.DeleteObject.argtypes = [ctypes.c_void_p]
+            self._gdi32.DeleteDC.argtypes = [ctypes.c_void_p]
+
+    def _capture_gdi(self, bounds, width, height):
+        """用StretchBlt把虚拟桌面直接缩小复制到复用的DIB中"""
+        x, y, full_width, full_height = bounds
+        user32, gdi32 = self._user32, self._gdi32
+        if self._dib is None or self._dib[:2] != (width, height):
+            self._free_dib()
+            header = BITMAPINFOHEADER()
+            header.biSize = ctypes.sizeof(header)
+            header.biWidth = width
+            header.biHeight = -height  # 负高度表示自上而下的行顺序
+            header.biPlanes = 1
+            header.biBitCount = 32
+            header.biCompression = BI_RGB
+            bits = ctypes.c_void_p()
+            screen_dc = user32.GetDC(None)
+            memory_dc = gdi32.CreateCompatibleDC(screen_dc)
+            bitmap = gdi32.CreateDIBSection(screen_dc, ctypes.byref(header), DIB_RGB_COLORS, ctypes.byref(bits), None, 0)
+            user32.ReleaseDC(None, screen_dc)
+            gdi32.SelectObject(memory_dc, bitmap)
+            gdi32.SetStretchBltMode(memory_dc, HALFTONE)
+            gdi32.SetBrushOrgEx(memory_dc, 0, 0, None)
+            self._dib = (width, height, memory_dc, bitmap, bits)
+        _, _, memory_dc, _, bits = self._dib
+        screen_dc = user32.GetDC(None)
+        gdi32.StretchBlt(memory_dc, 0, 0, width, height, screen_dc, x, y, full_width, full_height, SRCCOPY | CAPTUREBLT)
+        user32.ReleaseDC(None, screen_dc)
+        from PIL import Image
+        pixels = ctypes.string_at(bits.value, width * height * 4)
+        return Image.frombuffer('RGB', (width, height), pixels, 'raw', 'BGRX', 0, 1)
+
+    def capture_small(self, bounds):
+        """抓取虚拟桌面区域 (x, y, 宽, 高)，返回缩小SCALE倍的图像"""
+        x, y, full_width, full_height = bounds
+        width = max(1, full_width // self.SCALE)
+        height = max(1, full_height // self.SCALE)
+        if os.name == 'nt':
+            return self._capture_gdi(bounds, width, height)
+        from PIL import ImageGrab
+        image = ImageGrab.grab(bbox=(x, y, x + full_width, y + full_height), all_screens=True)
+        return image.convert('RGB').reduce(self.SCALE)
+
+    def blur_small(self, small):
+        from PIL import ImageFilter
+        return small.filter(ImageFilter.GaussianBlur(self.BLUR_RADIUS)).point(self._darken)
+
+    def scale_to_monitors(self, small, bounds, monitors):
+        """从模糊后的小图中按各显示器的区域放大，返回PIL图像列表"""
+        from PIL import Image
+        origin_x, origin_y = bounds[0], bounds[1]
+        scale_x = small.width / bounds[2]
+        scale_y = small.height / bounds[3]
+        images = []
+        for x, y, width, height, _ in monitors:
+            box = ((x - origin_x) * scale_x, (y - origin_y) * scale_y,
+                   (x - origin_x + width) * scale_x, (y - origin_y + height) * scale_y)
+            step = self.UPSCALE_STEP
+            smooth = small.resize((max(1, width // step), max(1, height // step)), Image.BILINEAR, box=box)
+            images.append(smooth.resize((width, height), Image.NEAREST))
+        return images
+
+    def photo_for(self, image, master):
+        """把图像写入对应尺寸的复用PhotoImage"""
+        from PIL import ImageTk
+        photo = self._photos.get(image.size)
+        if photo is None:
+            photo = ImageTk.PhotoImage(image, master=master)
+            self._photos[image.size] = photo
+        else:
+            photo.paste(image)
+        return photo
+
+    def capture(self, monitors):
+        """抓取覆盖所有显示器的虚拟桌面，必须在遮罩映射之前调用；返回 (小图, 区域)"""
+        left = min(m[0] for m in monitors)
+        top = min(m[1] for m in monitors)
+        right = max(m[0] + m[2] for m in monitors)
+        bottom = max(m[1] + m[3] for m in monitors)
+        bounds = (left, top, right - left, bottom - top)
+        return self.capture_small(bounds), bounds
+
+    def render(self, snapshot, monitors, master):
+        """模糊抓取结果并放大，返回与monitors一一对应的PhotoImage"""
+        small, bounds = snapshot
+        images = self.scale_to_monitors(self.blur_small(small), bounds, monitors)
+        return [self.photo_for(image, master) for image in images]
+
+    def _free_dib(self):
+        if self._dib is not None:
+            _, _, memory_dc, bitmap, _ = self._dib
+            self._gdi32.DeleteDC(memory_dc)
+            self._gdi32.DeleteObject(bitmap)
+            self._dib = None
+
+    def release(self):
+        """释放复用的缓冲区（切换回黑色遮罩时）"""
+        self._photos.clear()
+        if os.name == 'nt':
+            self._free_dib()
+
+@functools.lru_cache(maxsize=None)
+def _x11_compositor_running(display_name):
+    """X11上是否有合成管理器：EWMH规定合成管理器持有 _NET_WM_CM_S<屏幕号> 选择"""
+    from ctypes import util
+    try:
+        xlib = ctypes.CDLL(util.find_library('X11') or 'libX11.so.6')
+    except OSError:
+        return False
+    xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+    xlib.XOpenDisplay.restype = ctypes.c_void_p
+    xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+    xlib.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+    xlib.XInternAtom.restype = ctypes.c_ulong
+    xlib.XGetSelectionOwner.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+    xlib.XGetSelectionOwner.restype = ctypes.c_ulong
+    xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+    display = xlib.XOpenDisplay(display_name.encode())
+    if not display:
+        return False
+    try:
+        atom = xlib.XInternAtom(display, f"_NET_WM_CM_S{xlib.XDefaultScreen(display)}".encode(), 0)
+        return xlib.XGetSelectionOwner(display, atom) != 0
+    finally:
+        xlib.XCloseDisplay(display)
+
+def translucency_supported(widget):
+    """
+    窗口的 -alpha 属性是否真正生效。Windows（分层窗口）和macOS总是生效；
+    X11上Tk只设置 _NET_WM_WINDOW_OPACITY 属性，没有合成管理器时属性被忽略，窗口仍完全不透明。
+    """
+    if widget.tk.call('tk', 'windowingsystem') != 'x11':
+        return True
+    return _x11_compositor_running(widget.winfo_screen())
+
+class SoftwareDimmer:
+    """
+    软件调暗，作为WMI硬件调光的替代：在各显示器上叠加半透明黑色窗口，不透明度从0按固定帧间隔升到目标值。
+    所有窗口共用一个Tk定时器，每帧的截止时间按起点计算，不随处理耗时累积漂移；
+    不透明度变化小于MIN_STEP的帧不更新，并且每秒的窗口属性更新次数不超过MAX_UPDATES_PER_SECOND，
+    超出时跳过该帧。到达目标后定时器停止，锁屏期间不再唤醒。cancel() 可在淡入中途立即停止并移除窗口。
+    窗口透明度不生效时（X11没有合成管理器）不创建窗口，start() 返回False。
+    """
+
+    TARGET_ALPHA = 0.6
+    DURATION_MS = 600
+    FRAME_MS = 33
+    MIN_STEP = 0.02
+    MAX_UPDATES_PER_SECOND = 120
+
+    def __init__(self):
+        self.master = None
+        self.windows = []
+        self.alpha = 0.0
+        self.target = self.TARGET_ALPHA
+        self.duration = self.DURATION_MS / 1000
+        self._timer = None
+        self._start = None
+        self._frame_index = 0
+        self._budget_window = 0.0
+        self._budget_used = 0
+        self.frame_times = []
+        self.updates = 0
+        self.skipped_frames = 0
+
+    @property
+    def ramping(self):
+        return self._timer is not None
+
+    def start(self, master, monitors, target=None, duration_ms=None):
+        """在各显示器上创建调暗窗口并开始淡入，窗口系统不支持透明度时返回False"""
+        self.cancel()
+        if not translucency_supported(master):
+            return False
+        self.master = master
+        self.target = self.TARGET_ALPHA if target is None else target
+        self.duration = (self.DURATION_MS if duration_ms is None else duration_ms) / 1000
+        for x, y, width, height, primary in monitors:
+            window = tk.Toplevel(master)
+            window.overrideredirect(True)
+            window.geometry(f"{width}x{height}+{x}+{y}")
+            window.configure(bg='black', cursor="none")
+            try:
+                window.attributes('-alpha', 0.0)
+            except tk.TclError:
+                window.destroy()
+                self.cancel()
+                return False
+            window.attributes('-topmost', True)
+            self.windows.append(window)
+        self.alpha = 0.0
+        self.frame_times = []
+        self.updates = 0
+        self.skipped_frames = 0
+        self._frame_index = 0
+        self._budget_used = 0
+        self._start = self._budget_window = time.perf_counter()
+        self._frame()
+        return True
+
+    def _frame(self):
+        now = time.perf_counter()
+        self.frame_times.append(now)
+        progress = min(1.0, (now - self._start) / self.duration) if self.duration > 0 else 1.0
+        alpha = self.target * progress
+        if progress >= 1.0 or alpha - self.alpha >= self.MIN_STEP:
+            if now - self._budget_window >= 1.0:
+                self._budget_window = now
+                self._budget_used = 0
+            if self._budget_used + len(self.windows) <= self.MAX_UPDATES_PER_SECOND:
+                for window in self.windows:
+                    window.attributes('-alpha', alpha)
+                self._budget_used += len(self.windows)
+                self.updates += len(self.windows)
+                self.alpha = alpha
+            else:
+                self.skipped_frames += 1
+        if self.alpha >= self.target:
+            self._timer = None
+            return
+        self._frame_index += 1
+        deadline = self._start + self._frame_index * self.FRAME_MS / 1000
+        delay = max(1, int((deadline - time.perf_counter()) * 1000))
+        self._timer = self.master.after(delay, self._frame)
+
+    def cancel(self):
+        """停止淡入（包括进行中的）并移除调暗窗口"""
+        if self._timer is not None:
+            try:
+                self.master.after_cancel(self._timer)
+            except tk.TclError:
+                pass
+            self._timer = None
+        for window in self.windows:
+            try:
+                window.destroy()
+            except tk.TclError:
+                pass
+        self.windows = []
+        self.alpha = 0.0
+
+    def pacing(self):
+        """返回帧间隔统计: (帧数, p50, p99, 最大值)，单位毫秒"""
+        intervals = sorted((b - a) * 1000 for a, b in zip(self.frame_times, self.frame_times[1:]))
+        if not intervals:
+            return len(self.frame_times), 0.0, 0.0, 0.0
+        return (len(self.frame_times), intervals[len(intervals) // 2],
+                intervals[min(len(intervals) - 1, int(len(intervals) * 0.99))], intervals[-1])
+
+class MouseBlocker:
+    """
+    锁屏期间的鼠标屏蔽层。
+    - hook 模式（默认）：安装 WH_MOUSE_LL 钩子丢弃所有鼠标事件（移动、按键、滚轮）并计数，
+      每个事件只做一次判断和一次加法。
+    - clip 模式：只用 ClipCursor 把指针限制在1x1区域内，移动由系统直接丢弃，不会为每次移动回调Python。
+      点击和滚轮不被拦截，仍会送到指针下的置顶锁屏窗口；不经过Python，因此不计数（suppressed始终为0）。
+    """
+
+    MODES = ('hook', 'clip', 'off')
+
+    def __init__(self, mode='hook'):
+        self.mode = mode if mode in self.MODES else 'hook'
+        self.active = False
+        self.suppressed = 0
+        self._hook = None
+        self._thread = None
+        self._thread_id = None
+        self._ready = threading.Event()
+        # 回调对象必须在钩子存在期间保持引用
+        self._proc_ptr = LowLevelMouseProc(self._low_level_proc)
+        if os.name == 'nt':
+            self._user32 = ctypes.WinDLL('user32', use_last_error=True)
+            self._kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+            self._user32.CallNextHookEx.argtypes = [wintypes.HHOOK, ctypes.c_int, wintypes.WPARAM, wintypes.LPARAM]
+            self._user32.CallNextHookEx.restype = ctypes.c_ssize_t
+            self._user32.SetWindowsHookExW.argtypes = [ctypes.c_int, LowLevelMouseProc, wintypes.HINSTANCE, wintypes.DWORD]
+            self._user32.SetWindowsHookExW.restype = wintypes.HHOOK
+            self._user32.UnhookWindowsHookEx.argtypes = [wintypes.HHOOK]
+            self._user32.UnhookWindowsHookEx.restype = wintypes.BOOL
+            self._user32.GetMessageW.argtypes = [ctypes.POINTER(wintypes.MSG), wintypes.HWND, wintypes.UINT, wintypes.UINT]
+            self._user32.GetMessageW.restype = wintypes.BOOL
+            self._user32.PostThreadMessageW.argtypes = [wintypes.DWORD, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM]
+            self._user32.PostThreadMessageW.restype = wintypes.BOOL
+            self._user32.GetCursorPos.argtypes = [ctypes.POINTER(wintypes.POINT)]
+            self._user32.GetCursorPos.restype = wintypes.BOOL
+            self._user32.ClipCursor.argtypes = [ctypes.POINTER(wintypes.RECT)]
+            self._user32.ClipCursor.restype = wintypes.BOOL
+            self._kernel32.GetModuleHandleW.argtypes = [wintypes.LPCWSTR]
+            self._kernel32.GetModuleHandleW.restype = wintypes.HMODULE
+            self._call_next = self._user32.CallNextHookEx
+        else:
+            self._call_next = lambda hook, n_code, w_param, l_param: 0
+
+    def set_mode(self, mode):
+        """切换屏蔽方式，屏蔽生效期间不切换"""
+        if not self.active and mode in self.MODES:
+            self.mode = mode
+
+    def _low_level_proc(self, n_code, w_param, l_param):
+        """低级鼠标钩子回调：锁定时直接丢弃事件"""
+        if n_code == HC_ACTION and self.active:
+            self.suppressed += 1
+            return 1
+        return self._call_next(None, n_code, w_param, l_param)
+
+    def _hook_thread(self):
+        """安装钩子并运行消息循环，低级钩子必须由有消息循环的线程安装"""
+        self._thread_id = self._kernel32.GetCurrentThreadId()
+        self._hook = self._user32.SetWindowsHookExW(WH_MOUSE_LL, self._proc_ptr, self._kernel32.GetModuleHandleW(None), 0)
+        self._ready.set()
+        if not self._hook:
+            debug_print(f"⚠ 安装鼠标钩子失败: {ctypes.get_last_error()}")
+            return
+        msg = wintypes.MSG()
+        while self._user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+            pass
+        if not self._user32.UnhookWindowsHookEx(self._hook):
+            debug_print(f"⚠ 卸载鼠标钩子失败: {ctypes.get_last_error()}")
+        self._hook = None
+
+    def install(self):
+        """开始屏蔽鼠标"""
+        if self.active or self.mode == 'off' or os.name != 'nt':
+            return
+        self.suppressed = 0
+        self.active = True
+        try:
+            if self.mode == 'clip':
+                point = wintypes.POINT()
+                self._user32.GetCursorPos(ctypes.byref(point))
+                rect = wintypes.RECT(point.x, point.y, point.x + 1, point.y + 1)
+                self._user32.ClipCursor(ctypes.byref(rect))
+            else:
+                self._ready.clear()
+                self._thread = threading.Thread(target=self._hook_thread, daemon=True)
+                self._thread.start()
+                self._ready.wait(1.0)
+            debug_print(f"🖱️ 鼠标屏蔽已启用 (模式: {self.mode})")
+        except Exception as e:
+            debug_print(f"⚠ 启用鼠标屏蔽失败: {e}")
+
+    def uninstall(self):
+        """停止屏蔽鼠标"""
+        if not self.active:
+            return
+        self.active = False
+        try:
+            if self.mode == 'clip':
+                self._user32.ClipCursor(None)
+            elif self._thread:
+                if not self._user32.PostThreadMessageW(self._thread_id, WM_QUIT, 0, 0):
+                    debug_print(f"⚠ 通知鼠标钩子线程退出失败: {ctypes.get_last_error()}")
+                self._thread.join(1.0)
+                self._thread = None
+            if self.mode == 'hook':
+                debug_print(f"🖱️ 鼠标屏蔽已停止，共丢弃 {self.suppressed} 个鼠标事件")
+            else:
+                debug_print("🖱️ 鼠标屏蔽已停止 (clip 模式只限制指针，不统计事件)")
+        except Exception as e:
+            debug_print(f"⚠ 停止鼠标屏蔽失败: {e}")
+
+# 锁屏期间默认放行的媒体和音量键
+MEDIA_KEYS = (
+    'volume up', 'volume down', 'volume mute',
+    'play/pause media', 'next track', 'previous track', 'stop media',
+)
+
+def scan_code_index(scan_code):
+    """把扫描码映射为位图下标；keyboard库对没有扫描码的按键使用负的虚拟键码"""
+    return scan_code if scan_code >= 0 else 512 - scan_code
+
+class KeyPolicy:
+    """
+    锁屏期间的按键放行策略，在锁屏开始时编译为扫描码位图。
+    被屏蔽的按键只需一次位查询即可判定；命中位图的按键再核对一次按键名，
+    因为部分扩展键（如音量键）与普通键共用扫描码。
+    """
+
+    BITSET_BITS = 1024
+
+    def __init__(self, bits, names, code_count):
+        self.bits = bits
+        self.names = names
+        self.code_count = code_count
+
+    @classmethod
+    def compile(cls, key_names=(), include_media=True):
+        bits = bytearray(cls.BITSET_BITS // 8)
+        names = set()
+        code_count = 0
+        for name in tuple(key_names) + (MEDIA_KEYS if include_media else ()):
+            name = name.lower()
+            try:
+                scan_codes = keyboard.key_to_scan_codes(name, error_if_missing=False)
+            except Exception as e:
+                debug_print(f"⚠ 无法解析放行按键 '{name}': {e}")
+                continue
+            for scan_code in scan_codes:
+                index = scan_code_index(scan_code)
+                if 0 <= index < cls.BITSET_BITS:
+                    bits[index >> 3] |= 1 << (index & 7)
+                    code_count += 1
+            if scan_codes:
+                names.add(name)
+        return cls(bytes(bits), frozenset(names), code_count)
+
+class UnlockChord:
+    """解锁快捷键，编译为修饰键位掩码和主键扫描码集合"""
+
+    MODIFIERS = ('ctrl', 'alt', 'shift')
+
+    def __init__(self, modifier_bits, required_mask, main_codes):
+        self.modifier_bits = modifier_bits  # {修饰键扫描码: 所属修饰键的位}
+        self.required_mask = required_mask
+        self.main_codes = main_codes
+
+    @classmethod
+    def compile(cls, hotkey):
+        keys = hotkey.lower().split('+')
+        modifier_bits = {}
+        required_mask = 0
+        for bit_index, modifier in enumerate(cls.MODIFIERS):
+            bit = 1 << bit_index
+            for scan_code in keyboard.key_to_scan_codes(modifier, error_if_missing=False):
+                modifier_bits[scan_code] = bit
+            if modifier in keys:
+                required_mask |= bit
+        main_keys = [k for k in keys if k not in cls.MODIFIERS]
+        main_codes = frozenset(keyboard.key_to_scan_codes(main_keys[0], error_if_missing=False)) if main_keys else frozenset()
+        return cls(modifier_bits, required_mask, main_codes)
+
+# 口令存储使用的scrypt参数（约16 MB内存，每次校验数十毫秒），写入每个条目以便日后调高
+PASSPHRASE_KDF = {'n': 1 << 14, 'r': 8, 'p': 1}
+
+def hash_passphrase(passphrase, salt=None, **params):
+    """
+    生成口令的存储条目：每个口令独立随机盐，用scrypt派生。口令不区分大小写。
+    返回 {'kdf', 'salt', 'n', 'r', 'p', 'length', 'hash'}，params可覆盖默认scrypt参数。
+    """
+    params = {**PASSPHRASE_KDF, **params}
+    salt = salt if salt is not None else secrets.token_bytes(16)
+    digest = _scrypt(passphrase.lower(), salt, params)
+    return {'kdf': 'scrypt', 'salt': salt.hex(), **params, 'length': len(passphrase), 'hash': digest.hex()}
+
+def _scrypt(text, salt, params):
+    n, r, p = params['n'], params['r'], params['p']
+    return hashlib.scrypt(text.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                          maxmem=2 * 128 * r * n, dklen=32)
+
+def verify_passphrase(entry, candidate):
+    """用条目自身的盐和参数重新派生并比较，candidate应已转为小写"""
+    salt = bytes.fromhex(entry['salt'])
+    params = {'n': int(entry['n']), 'r': int(entry['r']), 'p': int(entry['p'])}
+    return hmac.compare_digest(_scrypt(candidate, salt, params), bytes.fromhex(entry['hash']))
+
+class PassphraseMatcher:
+    """
+    锁屏期间输入口令后按回车解锁。配置中只保存每个口令的独立加盐scrypt哈希和长度，
+    单次校验需要数十毫秒，不能在钩子回调里逐键计算：回调只记录上次回车以来输入的字符，按下回车时
+    把整段输入交给校验线程，只对长度相同的口令派生比较，匹配时调用on_match。通常只需一次scrypt；
+    口令数量上限为MAX_ENTRIES，最坏情况（所有口令长度相同）每次回车也不超过MAX_ENTRIES次。
+    同一时间只有一个校验线程，校验期间再次按回车只保留最新的一次，连续尝试因此受KDF耗时限速。
+    """
+
+    MIN_LENGTH = 8
+    MAX_ENTRIES = 8
+    KEY_CHARS = {'space': ' '}
+    SUBMIT_KEYS = ('enter',)
+
+    def __init__(self, entries):
+        if len(entries) > self.MAX_ENTRIES:
+            debug_print(f"⚠ 解锁口令超过 {self.MAX_ENTRIES} 个，只使用前 {self.MAX_ENTRIES} 个")
+        self.by_length = {}
+        for entry in entries[:self.MAX_ENTRIES]:
+            # 提前解析，格式错误时在锁屏前抛出
+            bytes.fromhex(entry['salt'])
+            bytes.fromhex(entry['hash'])
+            self.by_length.setdefault(int(entry['length']), []).append(entry)
+        self.max_length = max(self.by_length, default=0)
+        self.buffer = []
+        self.overflow = 0  # 超出max_length后继续输入的字符数，此时整段输入不可能匹配
+        self._lock = threading.Lock()
+        self._pending = None  # (候选字符串, on_match)
+        self._worker = None
+
+    def __bool__(self):
+        return bool(self.by_length)
+
+    def clear(self):
+        self.buffer.clear()
+        self.overflow = 0
+
+    def feed(self, name, on_match):
+        """处理一次按下事件的按键名；回车时把输入交给校验线程，匹配时由该线程调用on_match()"""
+        if name == 'backspace':
+            if self.overflow:
+                self.overflow -= 1
+            elif self.buffer:
+                self.buffer.pop()
+            return
+        if name in self.SUBMIT_KEYS:
+            candidate = ''.join(self.buffer)
+            overflow = self.overflow
+            self.clear()
+            if not overflow and len(candidate) in self.by_length:
+                self._submit(candidate, on_match)
+            return
+        char = name if len(name) == 1 else self.KEY_CHARS.get(name)
+        if char is None:
+            return
+        if len(self.buffer) < self.max_length:
+            self.buffer.append(char.lower())
+        else:
+            self.overflow += 1
+
+    def _submit(self, candidate, on_match):
+        with self._lock:
+            self._pending = (candidate, on_match)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._verify_pending, name="FakeLockScreen-passphrase", daemon=True)
+                self._worker.start()
+
+    def _verify_pending(self):
+        while True:
+            with self._lock:
+                if self._pending is None:
+                    self._worker = None
+                    return
+                candidate, on_match = self._pending
+                self._pending = None
+            if any(verify_passphrase(entry, candidate) for entry in self.by_length.get(len(candidate), ())):
+                on_match()
+
+    def join(self, timeout=None):
+        """等待当前的校验线程结束"""
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+
+def add_passphrase(settings_file, name, passphrase):
+    """把口令的存储条目追加到配置文件，口令已达上限时抛出ValueError"""
+    settings = {}
+    if os.path.exists(settings_file):
+        with open(settings_file, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+    entries = settings.setdefault('unlock_passphrases', [])
+    if len(entries) >= PassphraseMatcher.MAX_ENTRIES:
+        raise ValueError(f"最多只能配置 {PassphraseMatcher.MAX_ENTRIES} 个解锁口令")
+    entries.append({'name': name, **hash_passphrase(passphrase)})
+    os.makedirs(os.path.dirname(settings_file), exist_ok=True)
+    with open(settings_file, 'w', encoding='utf-8') as f:
+        json.dump(settings, f, ensure_ascii=False, indent=2)
+
+def prompt_add_passphrase(name):
+    """命令行交互：输入两次口令后保存"""
+    import getpass
+    settings_file = os.path.join(os.path.expanduser("~"), ".fakelockscreen", "lock_settings.json")
+    passphrase = getpass.getpass("输入解锁口令: ")
+    if len(passphrase) < PassphraseMatcher.MIN_LENGTH:
+        print(f"❌ 口令至少需要 {PassphraseMatcher.MIN_LENGTH} 个字符")
+        return False
+    if getpass.getpass("再次输入: ") != passphrase:
+        print("❌ 两次输入不一致")
+        return False
+    try:
+        add_passphrase(settings_file, name, passphrase)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return False
+    print(f"✓ 已添加解锁口令 '{name}' 到 {settings_file}，重新启动程序后生效")
+    return True
+
+def make_block_handler(state, chord, on_unlock, passphrases=None):
+    """
+    生成锁屏期间的键盘钩子回调。返回False表示屏蔽该事件，True表示放行。
+    被屏蔽的修饰键不会进入keyboard库的按键状态表，因此修饰键状态在这里自行跟踪。
+    state需提供is_locked和key_policy属性，放行策略可随时替换。
+    passphrases为PassphraseMatcher时，按下事件还会依次送入口令匹配，口令校验在其校验线程中完成。
+    on_unlock以解锁来源（'hotkey' 或 'passphrase'）调用。
+    """
+    modifier_bits = chord.modifier_bits
+    required_mask = chord.required_mask
+    main_codes = chord.main_codes
+    held = {}  # {修饰键扫描码: 位}
+    if passphrases is not None and not passphrases:
+        passphrases = None
+
+    def unlock_by_passphrase():
+        on_unlock('passphrase')
+
+    def block_handler(event):
+        if not state.is_locked:
+            return True
+        
+        scan_code = event.scan_code
+        is_down = event.event_type == 'down'
+        
+        bit = modifier_bits.get(scan_code)
+        if bit is not None:
+            if is_down:
+                held[scan_code] = bit
+            else:
+                held.pop(scan_code, None)
+        elif is_down and scan_code in main_codes:
+            mask = 0
+            for held_bit in held.values():
+                mask |= held_bit
+            if mask == required_mask:
+                on_unlock('hotkey')
+                return False
+        
+        if passphrases is not None and is_down:
+            passphrases.feed(event.name, unlock_by_passphrase)
+        
+        policy = state.key_policy
+        index = scan_code if scan_code >= 0 else 512 - scan_code
+        if index < 1024 and policy.bits[index >> 3] & (1 << (index & 7)):
+            return event.name in policy.names
+        return False
+
+    return block_handler
+
+# 低级键盘钩子相关常量
+WH_KEYBOARD_LL = 13
+WM_KEYDOWN = 0x0100
+WM_SYSKEYDOWN = 0x0104
+TOUNICODE_NO_STATE_CHANGE = 0x4
+SHIFT_KEYS = (0x10, 0xA0, 0xA1)
+
+# 与 LowLevelMouseProc 相同的 HOOKPROC 原型
+LowLevelKeyboardProc = LowLevelMouseProc
+
+class KBDLLHOOKSTRUCT(ctypes.Structure):
+    _fields_ = [
+        ('vkCode', wintypes.DWORD),
+        ('scanCode', wintypes.DWORD),
+        ('flags', wintypes.DWORD),
+        ('time', wintypes.DWORD),
+        ('dwExtraInfo', ctypes.c_size_t),
+    ]
+
+# 非字符键的虚拟键码到keyboard库按键名的映射；字符键按当前键盘布局转换
+VIRTUAL_KEY_NAMES = {
+    0x08: 'backspace', 0x09: 'tab', 0x0D: 'enter', 0x1B: 'esc', 0x20: 'space',
+    0x21: 'page up', 0x22: 'page down', 0x23: 'end', 0x24: 'home',
+    0x25: 'left', 0x26: 'up', 0x27: 'right', 0x28: 'down',
+    0x2C: 'print screen', 0x2D: 'insert', 0x2E: 'delete',
+    0x10: 'shift', 0xA0: 'shift', 0xA1: 'right shift', 0x11: 'ctrl', 0xA2: 'ctrl', 0xA3: 'right ctrl',
+    0x12: 'alt', 0xA4: 'alt', 0xA5: 'alt gr', 0x5B: 'left windows', 0x5C: 'right windows',
+    0xAD: 'volume mute', 0xAE: 'volume down', 0xAF: 'volume up',
+    0xB0: 'next track', 0xB1: 'previous track', 0xB2: 'stop media', 0xB3: 'play/pause media',
+}
+VIRTUAL_KEY_NAMES.update({0x70 + index: f'f{index + 1}' for index in range(24)})
+
+class KeyEvent:
+    """钩子事件，字段与keyboard库的KeyboardEvent一致"""
+
+    __slots__ = ('event_type', 'scan_code', 'name')
+
+    def __init__(self, event_type, scan_code, name):
+        self.event_type = event_type
+        self.scan_code = scan_code
+        self.name = name
+
+class KeyboardHookBackend:
+    """
+    锁屏键盘钩子。Windows上自行用SetWindowsHookExW安装WH_KEYBOARD_LL钩子，并在专用线程中运行消息循环，
+    保留钩子句柄和线程：重新安装时先退出旧线程并卸载旧钩子，确认旧钩子已卸载后才安装新钩子，
+    不会出现两个钩子同时回调同一个处理函数。回调返回假值时屏蔽该事件。
+    其他平台使用keyboard库。探测按键由keyboard库用SendInput注入。
+    """
+
+    def __init__(self):
+        self.handler = None
+        self._hook = None
+        self._thread = None
+        self._thread_id = None
+        self._ready = threading.Event()
+        self._shift = set()
+        # 回调对象必须在钩子存在期间保持引用
+        self._proc_ptr = LowLevelKeyboardProc(self._low_level_proc)
+        if os.name == 'nt':
+            self._user32 = ctypes.WinDLL('user32', use_last_error=True)
+            self._kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+            self._user32.CallNextHookEx.argtypes = [wintypes.HHOOK, ctypes.c_int, wintypes.WPARAM, wintypes.LPARAM]
+            self._user32.CallNextHookEx.restype = ctypes.c_ssize_t
+            self._user32.SetWindowsHookExW.argtypes = [ctypes.c_int, LowLevelKeyboardProc, wintypes.HINSTANCE, wintypes.DWORD]
+            self._user32.SetWindowsHookExW.restype = wintypes.HHOOK
+            self._user32.UnhookWindowsHookEx.argtypes = [wintypes.HHOOK]
+            self._user32.GetKeyboardLayout.restype = ctypes.c_void_p
+            self._user32.ToUnicodeEx.argtypes = [wintypes.UINT, wintypes.UINT, ctypes.POINTER(ctypes.c_ubyte),
+                                                 wintypes.LPWSTR, ctypes.c_int, wintypes.UINT, ctypes.c_void_p]
+            self._key_state = (ctypes.c_ubyte * 256)()
+            self._chars = ctypes.create_unicode_buffer(8)
+
+    def _event_name(self, info):
+        name = VIRTUAL_KEY_NAMES.get(info.vkCode)
+        if name is not None:
+            return name
+        # 字符键：按Shift状态和键盘布局转换，不改变系统的死键状态
+        self._key_state[0x10] = 0x80 if self._shift else 0
+        count = self._user32.ToUnicodeEx(info.vkCode, info.scanCode, self._key_state, self._chars, 8,
+                                         TOUNICODE_NO_STATE_CHANGE, self._user32.GetKeyboardLayout(0))
+        return self._chars.value[:count].lower() if count == 1 else None
+
+    def _low_level_proc(self, n_code, w_param, l_param):
+        handler = self.handler
+        if n_code == HC_ACTION and handler is not None:
+            info = ctypes.cast(l_param, ctypes.POINTER(KBDLLHOOKSTRUCT)).contents
+            is_down = w_param in (WM_KEYDOWN, WM_SYSKEYDOWN)
+            if info.vkCode in SHIFT_KEYS:
+                if is_down:
+                    self._shift.add(info.vkCode)
+                else:
+                    self._shift.discard(info.vkCode)
+            # 与keyboard库一致：没有扫描码的按键使用负的虚拟键码
+            event = KeyEvent('down' if is_down else 'up', info.scanCode or -info.vkCode, self._event_name(info))
+            try:
+                allow = handler(event)
+            except Exception as e:
+                debug_print(f"⚠ 键盘钩子回调失败: {e}")
+                allow = False  # 锁屏期间出错时宁可屏蔽
+            if not allow:
+                return 1
+        return self._user32.CallNextHookEx(None, n_code, w_param, l_param)
+
+    def _hook_thread(self):
+        """安装钩子并运行消息循环，低级钩子必须由有消息循环的线程安装"""
+        self._thread_id = self._kernel32.GetCurrentThreadId()
+        hook = self._user32.SetWindowsHookExW(WH_KEYBOARD_LL, self._proc_ptr, self._kernel32.GetModuleHandleW(None), 0)
+        self._hook = hook
+        self._ready.set()
+        if not hook:
+            debug_print(f"⚠ 安装键盘钩子失败: {ctypes.get_last_error()}")
+            return
+        msg = wintypes.MSG()
+        while self._user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+            pass
+        # 超时后可能已由uninstall卸载
+        if self._hook == hook:
+            self._user32.UnhookWindowsHookEx(hook)
+            self._hook = None
+
+    def install(self, handler):
+        """安装钩子，返回钩子句柄"""
+        self.handler = handler
+        if os.name != 'nt':
+            return keyboard.hook(handler, suppress=True)
+        self._shift.clear()
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._hook_thread, name="FakeLockScreen-keyboard-hook", daemon=True)
+        self._thread.start()
+        self._ready.wait(1.0)
+        return self._hook
+
+    def uninstall(self):
+        """退出钩子线程并卸载钩子；线程没有及时退出时直接卸载钩子句柄"""
+        self.handler = None
+        if os.name != 'nt':
+            keyboard.unhook_all()
+            return
+        thread = self._thread
+        if thread is None:
+            return
+        self._thread = None
+        self._user32.PostThreadMessageW(self._thread_id, WM_QUIT, 0, 0)
+        thread.join(1.0)
+        hook = self._hook
+        if hook:
+            self._hook = None
+            if not self._user32.UnhookWindowsHookEx(hook):
+                debug_print(f"⚠ 卸载键盘钩子失败: {ctypes.get_last_error()}")
+
+    def reinstall(self, handler):
+        """卸载旧钩子（系统可能已移除）后重新安装，同一时间只有一个钩子"""
+        self.uninstall()
+        return self.install(handler)
+
+    def send_probe(self, key):
+        keyboard.send(key)
+
+class FakeHookBackend:
+    """
+    测试用钩子后端，不需要Windows：探测按键直接同步送入回调。
+    drop=True 模拟系统因回调超时静默移除钩子，此后所有回调（包括探测）都不再到达，直到重新安装。
+    """
+
+    def __init__(self):
+        self.handler = None
+        self.drop = False
+        self.installs = 0
+
+    def install(self, handler):
+        self.handler = handler
+        self.drop = False
+        self.installs += 1
+        return handler
+
+    def uninstall(self):
+        self.handler = None
+
+    def reinstall(self, handler):
+        return self.install(handler)
+
+    def send_probe(self, key):
+        self.deliver(SimpleNamespace(event_type='down', scan_code=-1, name=key))
+        self.deliver(SimpleNamespace(event_type='up', scan_code=-1, name=key))
+
+    def deliver(self, event):
+        """模拟一次键盘事件，返回回调结果；钩子已丢失时返回None"""
+        if self.handler is None or self.drop:
+            return None
+        return self.handler(event)
+
+class HookWatchdog:
+    """
+    锁屏键盘钩子的健康监视。
+    - 记录每次回调的执行耗时，超过SLOW_MS的计入慢回调（接近系统的LowLevelHooksTimeout时钩子会被移除）；
+    - 锁屏期间每PROBE_INTERVAL秒注入一次F24探测按键，PROBE_TIMEOUT内没有到达回调即记为丢失，
+      连续MISSED_LIMIT次丢失判定钩子已被系统移除：重新安装钩子，并在指标中记录告警 hook_lost。
+    探测按键由回调直接屏蔽，不会进入按键策略和口令匹配。
+    """
+
+    PROBE_KEY = 'f24'
+    PROBE_INTERVAL = 5.0
+    PROBE_TIMEOUT = 1.0
+    MISSED_LIMIT = 2
+    SLOW_MS = 100
+
+    def __init__(self, backend, background, metrics, interval=None):
+        self.backend = backend
+        self.background = background
+        self.metrics = metrics
+        self.interval = interval or self.PROBE_INTERVAL
+        self.timeout = min(self.PROBE_TIMEOUT, self.interval / 2)
+        self.handler = None
+        self.active = False
+        self.latencies = deque(maxlen=4096)  # 回调耗时，毫秒
+        self.slow_events = 0
+        self.probes = 0
+        self.missed = 0
+        self.reinstalls = 0
+        self._consecutive_missed = 0
+        self._probe_sent_at = None
+        self._probe_seen = False
+        self.probe_rtt = deque(maxlen=256)  # 探测从注入到到达回调的时间，毫秒
+
+    def wrap(self, handler):
+        """给钩子回调加上计时和探测识别"""
+        probe_key = self.PROBE_KEY
+        latencies = self.latencies
+        slow_ms = self.SLOW_MS
+        perf_counter = time.perf_counter
+
+        def watched_handler(event):
+            if event.name == probe_key:
+                if not self._probe_seen and self._probe_sent_at is not None:
+                    self._probe_seen = True
+                    self.probe_rtt.append((perf_counter() - self._probe_sent_at) * 1000)
+                return False
+            start = perf_counter()
+            result = handler(event)
+            elapsed = (perf_counter() - start) * 1000
+            latencies.append(elapsed)
+            if elapsed > slow_ms:
+                self.slow_events += 1
+            return result
+
+        return watched_handler
+
+    def start(self, handler):
+        """安装钩子并开始探测，返回后端的钩子句柄"""
+        self.latencies.clear()
+        self.probe_rtt.clear()
+        self.slow_events = self.probes = self.missed = self.reinstalls = 0
+        self._consecutive_missed = 0
+        self._probe_sent_at = None
+        self.handler = self.wrap(handler)
+        self.active = True
+        hook = self.backend.install(self.handler)
+        # 锁屏低唤醒模式下也要继续探测
+        self.background.add_periodic('hook-watchdog', self.interval, self._probe, keep_when_locked=True)
+        return hook
+
+    def stop(self):
+        """停止探测并移除钩子"""
+        if self.active:
+            self.active = False
+            self.background.remove_periodic('hook-watchdog')
+            count, p50, p99, worst = self.summary()
+            if count:
+                self.metrics.set('hook_handler_p99_ms', round(p99, 3))
+            debug_print(f"🐕 钩子回调 {count} 次: p50 {p50:.3f} ms, p99 {p99:.3f} ms, 最大 {worst:.3f} ms, "
+                        f"慢回调 {self.slow_events} 次; 探测 {self.probes} 次, 丢失 {self.missed} 次, 重新安装 {self.reinstalls} 次")
+        self.backend.uninstall()
+
+    def _probe(self):
+        """事件循环线程：注入一次探测按键，超时后检查是否到达"""
+        if not self.active:
+            return
+        self.probes += 1
+        self._probe_seen = False
+        self._probe_sent_at = time.perf_counter()
+        try:
+            self.backend.send_probe(self.PROBE_KEY)
+        except Exception as e:
+            debug_print(f"⚠ 发送钩子探测失败: {e}")
+            return
+        self.background.loop.call_later(self.timeout, self._check_probe)
+
+    def _check_probe(self):
+        if not self.active:
+            return
+        if self._probe_seen:
+            self._consecutive_missed = 0
+            return
+        self.missed += 1
+        self._consecutive_missed += 1
+        debug_print(f"⚠ 键盘钩子探测未到达 (连续 {self._consecutive_missed} 次)")
+        if self._consecutive_missed >= self.MISSED_LIMIT:
+            self._reinstall()
+
+    def _reinstall(self):
+        debug_print("🚨 键盘钩子已被系统移除，重新安装")
+        self.metrics.incr('hook_lost')
+        self._consecutive_missed = 0
+        try:
+            self.backend.reinstall(self.handler)
+            self.reinstalls += 1
+        except Exception as e:
+            debug_print(f"❌ 重新安装键盘钩子失败: {e}")
+
+    def summary(self):
+        """返回回调耗时统计: (次数, p50, p99, 最大值)，单位毫秒"""
+        values = sorted(self.latencies)
+        if not values:
+            return 0, 0.0, 0.0, 0.0
+        return (len(values), values[len(values) // 2],
+                values[min(len(values) - 1, int(len(values) * 0.99))], values[-1])
+
+class SharedLockState:
+    """
+    输入过滤进程与主进程共享的锁屏状态，放在一小块共享内存中：
+    头部（版本号、是否锁定、必需修饰键掩码、修饰键数、主键数、按键名长度、扫描码数）之后
+    依次是按键放行位图、修饰键扫描码及其位、主键扫描码和放行按键名（换行分隔）。
+    只有主进程写入。更新组合键和策略时版本号先变为奇数、写完再变为偶数（顺序锁），
+    过滤进程读到奇数或前后版本号不一致时重读；是否锁定是单个字节，直接读写。
+    """
+
+    HEADER = struct.Struct('<IBBBBHH')
+    LOCKED_OFFSET = 4
+    POLICY_OFFSET = 16
+    MODIFIERS = struct.Struct('<16h16B')
+    MODIFIERS_OFFSET = POLICY_OFFSET + KeyPolicy.BITSET_BITS // 8
+    MAIN = struct.Struct('<8h')
+    MAIN_OFFSET = MODIFIERS_OFFSET + MODIFIERS.size
+    NAMES_OFFSET = MAIN_OFFSET + MAIN.size
+    NAMES_LIMIT = 1024
+    SIZE = 2048
+
+    def __init__(self, shm):
+        self.shm = shm
+        self.name = shm.name
+        self.buf = shm.buf
+        self.key_policy = None
+
+    @classmethod
+    def create(cls):
+        return cls(shared_memory.SharedMemory(create=True, size=cls.SIZE))
+
+    @classmethod
+    def attach(cls, name):
+        return cls(shared_memory.SharedMemory(name=name))
+
+    @property
+    def is_locked(self):
+        return self.buf[self.LOCKED_OFFSET] != 0
+
+    def set_locked(self, locked):
+        self.buf[self.LOCKED_OFFSET] = 1 if locked else 0
+
+    def generation(self):
+        return struct.unpack_from('<I', self.buf, 0)[0]
+
+    def publish(self, chord, policy):
+        """写入解锁组合键和按键放行策略"""
+        modifiers = list(chord.modifier_bits.items())[:16]
+        main_codes = sorted(chord.main_codes)[:8]
+        names = '\n'.join(sorted(policy.names)).encode('utf-8')
+        if len(names) > self.NAMES_LIMIT:
+            names = names[:names.rfind(b'\n', 0, self.NAMES_LIMIT + 1)]
+            debug_print("⚠ 放行按键过多，部分按键名未写入共享内存")
+        codes = [code for code, _ in modifiers]
+        bits = [bit for _, bit in modifiers]
+        generation = self.generation() | 1  # 奇数：写入中
+        struct.pack_into('<I', self.buf, 0, generation)
+        self.buf[self.POLICY_OFFSET:self.POLICY_OFFSET + len(policy.bits)] = policy.bits
+        self.MODIFIERS.pack_into(self.buf, self.MODIFIERS_OFFSET,
+                                 *(codes + [0] * (16 - len(codes))), *(bits + [0] * (16 - len(bits))))
+        self.MAIN.pack_into(self.buf, self.MAIN_OFFSET, *(main_codes + [0] * (8 - len(main_codes))))
+        self.buf[self.NAMES_OFFSET:self.NAMES_OFFSET + len(names)] = names
+        self.HEADER.pack_into(self.buf, 0, generation + 1, self.buf[self.LOCKED_OFFSET], chord.required_mask,
+                              len(modifiers), len(main_codes), len(names), policy.code_count)
+
+    def read(self):
+        """读取一致的组合键和策略，返回 (版本号, UnlockChord)，策略放在key_policy属性中"""
+        while True:
+            generation = self.generation()
+            if generation & 1:
+                time.sleep(0)
+                continue
+            _, _, required_mask, modifier_count, main_count, names_length, code_count = self.HEADER.unpack_from(self.buf, 0)
+            bits = bytes(self.buf[self.POLICY_OFFSET:self.MODIFIERS_OFFSET])
+            modifiers = self.MODIFIERS.unpack_from(self.buf, self.MODIFIERS_OFFSET)
+            main_codes = self.MAIN.unpack_from(self.buf, self.MAIN_OFFSET)
+            names = bytes(self.buf[self.NAMES_OFFSET:self.NAMES_OFFSET + names_length]).decode('utf-8')
+            if self.generation() == generation:
+                break
+        chord = UnlockChord(dict(zip(modifiers[:modifier_count], modifiers[16:16 + modifier_count])),
+                            required_mask, frozenset(main_codes[:main_count]))
+        self.key_policy = KeyPolicy(bits, frozenset(names.split('\n')) if names else frozenset(), code_count)
+        return generation, chord
+
+    def close(self, unlink=False):
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+class SharedLockFilter:
+    """
+    输入过滤进程中的钩子回调：按共享内存中的状态屏蔽按键，解锁组合键或口令匹配时通过管道通知主进程。
+    未锁定时只读一个字节即放行；版本号变化（每次锁屏或策略更新）时重新生成回调。
+    锁屏期间收到主进程注入的探测按键时屏蔽并回报，由主进程的HookWatchdog判断钩子是否丢失。
+    钩子线程和口令校验线程都会发送消息，管道的发送由_send_lock串行化。
+    """
+
+    def __init__(self, shared, conn):
+        self.shared = shared
+        self.conn = conn
+        self._send_lock = threading.Lock()
+        self.passphrases = None
+        self._generation = None
+        self._handler = None
+
+    def set_passphrases(self, entries):
+        try:
+            self.passphrases = PassphraseMatcher(entries) if entries else None
+        except (KeyError, ValueError, TypeError):
+            self.passphrases = None
+        self._generation = None
+
+    def send(self, message):
+        with self._send_lock:
+            try:
+                self.conn.send(message)
+            except (OSError, EOFError):
+                pass  # 主进程已退出
+
+    def on_unlock(self, source):
+        self.send(('unlock', source))
+
+    def __call__(self, event):
+        shared = self.shared
+        if not shared.is_locked:
+            return True
+        if event.name == HookWatchdog.PROBE_KEY:
+            if event.event_type == 'down':
+                self.send(('probe',))
+            return False
+        if shared.generation() != self._generation:
+            self._generation, chord = shared.read()
+            if self.passphrases is not None:
+                self.passphrases.clear()
+            self._handler = make_block_handler(shared, chord, self.on_unlock, self.passphrases)
+        return self._handler(event)
+
+def run_input_filter(shm_name, conn, event_conn=None):
+    """
+    输入过滤进程入口。在管道上等待主进程的消息，管道关闭（主进程退出）时结束。
+    抑制型键盘钩子只在锁屏期间安装：主进程锁屏时发来 ('hook', True)，解锁时发来 ('hook', False)；
+    主进程的探测连续丢失时会发来reinstall，在本进程中重新安装钩子。
+    event_conn用于基准测试：从管道读取合成事件并回复判定结果，代替真实的键盘钩子。
+    """
+    shared = SharedLockState.attach(shm_name)
+    lock_filter = SharedLockFilter(shared, conn)
+    backend = KeyboardHookBackend()
+    use_hook = event_conn is None
+    hooked = False
+    if not use_hook:
+        threading.Thread(target=_serve_filter_events, args=(lock_filter, event_conn), daemon=True).start()
+    lock_filter.send(('ready', os.getpid()))
+    try:
+        while True:
+            message = conn.recv()
+            if message[0] == 'stop':
+                break
+            if message[0] == 'passphrases':
+                lock_filter.set_passphrases(message[1])
+            elif message[0] == 'hook' and use_hook and message[1] != hooked:
+                if message[1]:
+                    backend.install(lock_filter)
+                else:
+                    backend.uninstall()
+                hooked = message[1]
+            elif message[0] == 'reinstall' and hooked:
+                backend.reinstall(lock_filter)
+                debug_print("🐕 输入过滤进程已重新安装键盘钩子")
+    except (EOFError, OSError):
+        pass
+    if hooked:
+        backend.uninstall()
+    shared.close()
+
+def _serve_filter_events(handler, event_conn):
+    try:
+        while True:
+            scan_code, event_type, name = event_conn.recv()
+            event_conn.send(handler(SimpleNamespace(event_type=event_type, scan_code=scan_code, name=name)))
+    except (EOFError, OSError):
+        pass
+
+class InputFilterProcess:
+    """
+    独立的输入过滤进程（input_filter 设为 process 时使用）。锁屏期间的键盘钩子回调在该进程中执行，
+    不与本进程的Tk、pystray和WMI争抢GIL。本进程只写共享内存中的锁定状态和解锁组合键，
+    过滤进程匹配到解锁时通过管道回传，由读取线程调用on_unlock(来源)。
+    进程在启动时创建并常驻，但钩子只在锁屏期间安装：锁定状态写入共享内存后通知过滤进程安装钩子，
+    解锁时先清除锁定状态再通知卸载，未锁屏时系统不会为每次按键回调过滤进程。
+    同时实现HookWatchdog的钩子后端接口：探测按键由本进程注入，过滤进程的钩子收到后经管道回报，
+    读取线程把它作为探测事件送入监视层的回调；需要重新安装时通知过滤进程在其中重装钩子。
+    """
+
+    def __init__(self, on_unlock, event_conn=None):
+        self.on_unlock = on_unlock
+        self.shared = SharedLockState.create()
+        self.ready = threading.Event()
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=run_input_filter, args=(self.shared.name, child_conn, event_conn),
+                                       name="FakeLockScreen-filter", daemon=True)
+        self._child_conn = child_conn
+        self._reader = None
+        self._send_lock = threading.Lock()
+        self._probe_handler = None
+
+    def start(self):
+        self.process.start()
+        self._child_conn.close()
+        self._reader = threading.Thread(target=self._read_messages, name="FakeLockScreen-filter-reader", daemon=True)
+        self._reader.start()
+
+    def _read_messages(self):
+        try:
+            while True:
+                message = self.conn.recv()
+                if message[0] == 'ready':
+                    debug_print(f"🛡️ 输入过滤进程已就绪 (PID {message[1]})")
+                    self.ready.set()
+                elif message[0] == 'unlock':
+                    self.on_unlock(message[1])
+                elif message[0] == 'probe':
+                    handler = self._probe_handler
+                    if handler is not None:
+                        handler(KeyEvent('down', -1, HookWatchdog.PROBE_KEY))
+        except (EOFError, OSError):
+            self.ready.clear()
+
+    def _send(self, message):
+        # 锁屏在Tk线程、重新安装在后台事件循环线程发送
+        with self._send_lock:
+            self.conn.send(message)
+
+    def is_ready(self):
+        return self.ready.is_set() and self.process.is_alive()
+
+    def lock(self, chord, policy, passphrases=()):
+        if passphrases:
+            self._send(('passphrases', list(passphrases)))
+        self.shared.publish(chord, policy)
+        self.shared.set_locked(True)
+        self._send(('hook', True))
+
+    def update_policy(self, policy):
+        """锁屏期间替换按键放行策略"""
+        if self.shared.is_locked:
+            _, chord = self.shared.read()
+            self.shared.publish(chord, policy)
+
+    def unlock(self):
+        # 钩子卸载前的按键读到未锁定状态即放行
+        self.shared.set_locked(False)
+        try:
+            self._send(('hook', False))
+        except (OSError, ValueError):
+            pass  # 过滤进程已退出
+
+    def install(self, handler):
+        """HookWatchdog后端接口：钩子已在过滤进程中，这里只接收探测回报；回调只会收到探测事件"""
+        self._probe_handler = handler
+        return self.process.pid
+
+    def uninstall(self):
+        self._probe_handler = None
+
+    def reinstall(self, handler):
+        self._probe_handler = handler
+        self._send(('reinstall',))
+
+    def send_probe(self, key):
+        keyboard.send(key)
+
+    def stop(self):
+        self.shared.set_locked(False)
+        self._probe_handler = None
+        try:
+            self._send(('stop',))
+        except (OSError, ValueError):
+            pass
+        self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+        self.shared.close(unlink=True)
+
+class UICommandChannel:
+    """
+    从任意线程进入Tk主线程的命令通道：命令先放入双端队列，每批只用一次event_generate唤醒Tk，
+    由Tk主线程分批取出执行，并记录每条命令从入队到执行的延迟。
+    绑定Tk窗口之前提交的命令会暂存在队列中，绑定后立即执行。
+    唤醒事件发送失败时安排一次POLL_MS后的兜底轮询，排队的命令最迟届时执行；
+    轮询只在失败后安排、执行一次，平时（包括锁屏低唤醒模式）没有周期性的Tk定时器。
+    """
+
+    EVENT = '<<FakeLockScreenCommand>>'
+    BATCH_LIMIT = 64
+    POLL_MS = 1000
+
+    def __init__(self, history=2048):
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._wakeup_pending = False
+        self._poll_armed = False
+        self._widget = None
+        self.latencies = deque(maxlen=history)  # (命令名, 延迟毫秒)
+
+    def attach(self, widget):
+        """绑定Tk窗口，之后的命令在该窗口所在的主线程中执行"""
+        self._widget = widget
+        widget.bind(self.EVENT, self._drain)
+        if self._queue:
+            self._wakeup()
+
+    def post(self, callback, *args):
+        """从任意线程提交命令"""
+        self._queue.append((time.perf_counter(), callback, args))
+        self._wakeup()
+
+    def _wakeup(self):
+        with self._lock:
+            if self._wakeup_pending or self._widget is None:
+                return
+            self._wakeup_pending = True
+        try:
+            self._widget.event_generate(self.EVENT, when='tail')
+        except Exception as e:
+            # 窗口已销毁（程序退出中）或事件队列异常；清除标记，之后的提交会再次尝试唤醒
+            with self._lock:
+                self._wakeup_pending = False
+            debug_print(f"⚠ 唤醒Tk主线程失败: {e}")
+            self._arm_poll()
+
+    def _arm_poll(self):
+        """唤醒失败后安排一次兜底轮询，已安排时不重复"""
+        with self._lock:
+            if self._poll_armed:
+                return
+            self._poll_armed = True
+        try:
+            self._widget.after(self.POLL_MS, self._poll)
+        except Exception:
+            with self._lock:
+                self._poll_armed = False  # 窗口已销毁
+
+    def _poll(self):
+        """兜底轮询（Tk主线程）：执行唤醒失败后滞留的命令，不再重新安排"""
+        with self._lock:
+            self._poll_armed = False
+        if self._queue:
+            self._drain()
+
+    def _drain(self, event=None):
+        """在Tk主线程中分批执行排队的命令"""
+        with self._lock:
+            self._wakeup_pending = False
+        for _ in range(self.BATCH_LIMIT):
+            try:
+                enqueued_at, callback, args = self._queue.popleft()
+            except IndexError:
+                break
+            self.latencies.append((getattr(callback, '__name__', 'command'), (time.perf_counter() - enqueued_at) * 1000))
+            try:
+                callback(*args)
+            except SystemExit:
+                raise
+            except Exception as e:
+                debug_print(f"❌ 主线程命令执行失败 ({getattr(callback, '__name__', callback)}): {e}")
+        if self._queue:
+            self._wakeup()
+
+    def summary(self):
+        """返回延迟统计: (命令数, p50, p99, 最大值)，单位毫秒"""
+        values = sorted(latency for _, latency in self.latencies)
+        if not values:
+            return 0, 0.0, 0.0, 0.0
+        return (len(values), values[len(values) // 2],
+                values[min(len(values) - 1, int(len(values) * 0.99))], values[-1])
+
+def tcl_is_threaded(widget):
+    """线程版Tcl的主循环在没有事件时阻塞等待；非线程版会以20ms间隔轮询"""
+    try:
+        return bool(int(widget.tk.eval('set tcl_platform(threaded)')))
+    except Exception:
+        return False
+
+def _com_initialize():
+    """在I/O工作线程中初始化COM，WMI对象只能在创建它的线程中使用"""
+    try:
+        import pythoncom
+        pythoncom.CoInitialize()
+    except Exception as e:
+        debug_print(f"⚠ COM初始化失败: {e}")
+
+class BackgroundLoop:
+    """
+    后台协调线程：一个asyncio事件循环负责定时器、亮度I/O、IPC、开机自启变更和指标写入。
+    阻塞调用（WMI、PowerShell、文件写入）统一交给一个单线程执行器，按提交顺序执行。
+    线程预算：Tk主线程、本事件循环线程、I/O工作线程，以及pystray和keyboard库各自的消息循环线程。
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="FakeLockScreen-io", initializer=_com_initialize)
+        self.thread = threading.Thread(target=self._run, name="FakeLockScreen-loop", daemon=True)
+        self._periodic = {}  # {名称: [间隔, 回调, 锁屏时是否保留, 定时器句柄]}
+        self._suspended = False
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """从任意线程提交协程，返回concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, callback, *args):
+        """从任意线程把回调交给事件循环执行，不会阻塞调用方"""
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def call_later(self, delay, callback, *args):
+        """从任意线程安排定时器"""
+        self.loop.call_soon_threadsafe(self.loop.call_later, delay, callback, *args)
+
+    def add_periodic(self, name, interval, callback, keep_when_locked=False):
+        """注册周期任务（在事件循环线程中执行）；除非keep_when_locked，锁屏低唤醒模式下会暂停"""
+        def register():
+            self._periodic[name] = [interval, callback, keep_when_locked, None]
+            if not self._suspended or keep_when_locked:
+                self._arm_periodic(name)
+        self.loop.call_soon_threadsafe(register)
+
+    def remove_periodic(self, name):
+        def unregister():
+            entry = self._periodic.pop(name, None)
+            if entry and entry[3]:
+                entry[3].cancel()
+        self.loop.call_soon_threadsafe(unregister)
+
+    def _arm_periodic(self, name):
+        entry = self._periodic.get(name)
+        if entry:
+            entry[3] = self.loop.call_later(entry[0], self._run_periodic, name)
+
+    def _run_periodic(self, name):
+        entry = self._periodic.get(name)
+        if not entry:
+            return
+        try:
+            entry[1]()
+        except Exception as e:
+            debug_print(f"⚠ 周期任务 {name} 执行失败: {e}")
+        if name in self._periodic and (not self._suspended or entry[2]):
+            self._arm_periodic(name)
+
+    def suspend_periodic(self):
+        """暂停可暂停的周期任务，在事件循环线程中调用"""
+        self._suspended = True
+        for entry in self._periodic.values():
+            if not entry[2] and entry[3]:
+                entry[3].cancel()
+                entry[3] = None
+
+    def resume_periodic(self):
+        """恢复被暂停的周期任务，在事件循环线程中调用"""
+        self._suspended = False
+        for name, entry in self._periodic.items():
+            if entry[3] is None:
+                self._arm_periodic(name)
+
+    async def run_io(self, func, *args):
+        """在I/O工作线程中执行阻塞调用"""
+        return await self.loop.run_in_executor(self.io_executor, func, *args)
+
+    def submit_io(self, func, *args):
+        """从任意线程提交阻塞调用"""
+        return self.submit(self.run_io(func, *args))
+
+    async def _shutdown(self):
+        tasks = [t for t in asyncio.all_tasks(self.loop) if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.loop.stop()
+
+    def stop(self, timeout=2.0):
+        """执行完已提交的I/O（如恢复亮度），然后取消所有任务并停止事件循环"""
+        self.io_executor.shutdown(wait=True)
+        if not self.thread.is_alive():
+            return
+        try:
+            self.submit(self._shutdown())
+            self.thread.join(timeout)
+        except Exception as e:
+            debug_print(f"⚠ 停止后台事件循环失败: {e}")
+
+class Metrics:
+    """运行指标，修改后由后台事件循环合并延迟写入 ~/.fakelockscreen/metrics.json"""
+
+    FLUSH_DELAY = 5.0
+
+    def __init__(self, path, background):
+        self.path = path
+        self.background = background
+        self.values = {}
+        self._lock = threading.Lock()
+        self._flush_scheduled = False
+        self._paused = False
+        self._dirty = False
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + amount
+        self._schedule_flush()
+
+    def set(self, name, value):
+        with self._lock:
+            self.values[name] = value
+        self._schedule_flush()
+
+    def pause(self):
+        """暂停写入（锁屏低唤醒模式），期间的修改在恢复后一次写入"""
+        with self._lock:
+            self._paused = True
+
+    def resume(self):
+        with self._lock:
+            self._paused = False
+            dirty = self._dirty
+        if dirty:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        with self._lock:
+            self._dirty = True
+            if self._flush_scheduled or self._paused:
+                return
+            self._flush_scheduled = True
+        self.background.call_later(self.FLUSH_DELAY, self._flush_from_loop)
+
+    def _flush_from_loop(self):
+        try:
+            self.background.loop.run_in_executor(self.background.io_executor, self.flush)
+        except RuntimeError:
+            pass  # 退出时I/O线程已关闭，由quit_application直接写入
+
+    def flush(self):
+        """把指标写入文件"""
+        with self._lock:
+            self._flush_scheduled = False
+            self._dirty = False
+            snapshot = dict(self.values)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            debug_print(f"⚠ 写入指标失败: {e}")
+
+def thread_snapshot():
+    """
+    采集进程的线程数、CPU时间和上下文切换次数。
+    主动上下文切换次数近似于线程从阻塞等待中被唤醒的次数；Linux下按线程读取/proc，
+    其他平台需要可选依赖psutil（Windows只提供总次数）。
+    """
+    voluntary = switches = None
+    per_thread = {}
+    try:
+        if os.path.isdir('/proc/self/task'):
+            voluntary = switches = 0
+            for tid in os.listdir('/proc/self/task'):
+                fields = {}
+                with open(f'/proc/self/task/{tid}/status') as f:
+                    for line in f:
+                        key, _, value = line.partition(':')
+                        fields[key] = value.strip()
+                thread_voluntary = int(fields.get('voluntary_ctxt_switches', 0))
+                per_thread[f"{fields.get('Name', '?')}({tid})"] = thread_voluntary
+                voluntary += thread_voluntary
+                switches += thread_voluntary + int(fields.get('nonvoluntary_ctxt_switches', 0))
+        elif psutil:
+            counts = psutil.Process().num_ctx_switches()
+            voluntary = counts.voluntary
+            switches = counts.voluntary + counts.involuntary
+    except Exception:
+        voluntary = switches = None
+    return {
+        'time': time.monotonic(),
+        'cpu': time.process_time(),
+        'threads': threading.active_count(),
+        'voluntary': voluntary,
+        'switches': switches,
+        'per_thread': per_thread,
+    }
+
+def wakeup_report(before, after):
+    """根据两次采样计算唤醒次数/秒和CPU毫秒/分钟"""
+    seconds = max(after['time'] - before['time'], 1e-6)
+    report = {
+        'seconds': round(seconds, 1),
+        'threads': after['threads'],
+        'cpu_ms_per_min': round((after['cpu'] - before['cpu']) * 1000 / seconds * 60, 2),
+        'wakeups_per_s': None,
+        'ctx_switches': None,
+        'per_thread_wakeups_per_s': {},
+    }
+    if before['voluntary'] is not None and after['voluntary'] is not None:
+        report['wakeups_per_s'] = round((after['voluntary'] - before['voluntary']) / seconds, 2)
+        report['ctx_switches'] = after['switches'] - before['switches']
+        for name, count in after['per_thread'].items():
+            delta = count - before['per_thread'].get(name, 0)
+            if delta:
+                report['per_thread_wakeups_per_s'][name] = round(delta / seconds, 2)
+    return report
+
+def thread_cpu_times(native_ids):
+    """按原生线程ID读取各线程累计CPU时间（秒）：优先psutil，其次GetThreadTimes或/proc"""
+    times = {}
+    try:
+        if psutil:
+            for thread in psutil.Process().threads():
+                times[thread.id] = thread.user_time + thread.system_time
+            return times
+        if os.name == 'nt':
+            kernel32 = ctypes.windll.kernel32
+            creation, exit_time, kernel, user = (wintypes.FILETIME() for _ in range(4))
+            for native_id in native_ids:
+                handle = kernel32.OpenThread(THREAD_QUERY_LIMITED_INFORMATION, False, native_id)
+                if not handle:
+                    continue
+                if kernel32.GetThreadTimes(handle, ctypes.byref(creation), ctypes.byref(exit_time),
+                                           ctypes.byref(kernel), ctypes.byref(user)):
+                    ticks = sum((t.dwHighDateTime << 32) | t.dwLowDateTime for t in (kernel, user))
+                    times[native_id] = ticks / 1e7
+                kernel32.CloseHandle(handle)
+            return times
+        clock_ticks = os.sysconf('SC_CLK_TCK')
+        for native_id in native_ids:
+            with open(f'/proc/self/task/{native_id}/stat') as f:
+                fields = f.read().rpartition(')')[2].split()
+            times[native_id] = (int(fields[11]) + int(fields[12])) / clock_ticks
+    except Exception:
+        pass
+    return times
+
+class ProcessProfiler:
+    """
+    覆盖所有线程的采样分析器：后台线程定期用sys._current_frames()抓取每个线程的调用栈。
+    wall模式按经过时间计权；cpu模式按该线程两次采样之间实际消耗的CPU时间计权，阻塞等待的线程不计入。
+    结果写成collapsed stack（火焰图）和由采样合成的.pstats文件。
+    """
+
+    def __init__(self, mode='cpu', interval=0.005):
+        self.mode = mode
+        self.interval = interval
+        self.samples = {}  # {(线程名, 调用栈): 权重秒}
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="FakeLockScreen-profiler", daemon=True)
+        self.started_at = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        last_time = time.perf_counter()
+        last_cpu = {}
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed = now - last_time
+            last_time = now
+            frames = sys._current_frames()
+            threads = {t.ident: (t.name, t.native_id) for t in threading.enumerate()}
+            cpu = thread_cpu_times([native for _, native in threads.values()]) if self.mode == 'cpu' else None
+            for ident, frame in frames.items():
+                if ident == own_ident:
+                    continue
+                name, native_id = threads.get(ident, (f"thread-{ident}", None))
+                if cpu is not None:
+                    if native_id not in cpu:
+                        continue
+                    weight = cpu[native_id] - last_cpu.get(native_id, cpu[native_id])
+                    last_cpu[native_id] = cpu[native_id]
+                    if weight <= 0:
+                        continue
+                else:
+                    weight = elapsed
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                key = (name, tuple(reversed(stack)))
+                self.samples[key] = self.samples.get(key, 0.0) + weight
+            self.sample_count += 1
+            del frames
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(2.0)
+
+    def write_collapsed(self, path):
+        """每行 "线程;调用者;...;被调用者 权重(微秒)"，可直接交给flamegraph.pl或speedscope"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for (thread_name, stack), weight in sorted(self.samples.items()):
+                frames = [thread_name.replace(';', ':')]
+                frames.extend(f"{func} ({os.path.basename(filename)}:{line})".replace(';', ':')
+                              for filename, line, func in stack)
+                f.write(f"{';'.join(frames)} {max(1, int(weight * 1e6))}\n")
+
+    def write_pstats(self, path):
+        """把采样合成为pstats格式：调用次数为出现该函数的采样数，时间为采样权重"""
+        stats = {}
+
+        def entry(key):
+            if key not in stats:
+                stats[key] = [0, 0, 0.0, 0.0, {}]
+            return stats[key]
+
+        for (_, stack), weight in self.samples.items():
+            if not stack:
+                continue
+            seen = set()
+            for depth, key in enumerate(stack):
+                item = entry(key)
+                if key not in seen:
+                    seen.add(key)
+                    item[0] += 1
+                    item[1] += 1
+                    item[3] += weight
+                if depth:
+                    caller = stack[depth - 1]
+                    cc, nc, tt, ct = item[4].get(caller, (0, 0, 0.0, 0.0))
+                    self_time = weight if depth == len(stack) - 1 else 0.0
+                    item[4][caller] = (cc + 1, nc + 1, tt + self_time, ct + weight)
+            entry(stack[-1])[2] += weight
+        with open(path, 'wb') as f:
+            marshal.dump({key: (cc, nc, tt, ct, callers) for key, (cc, nc, tt, ct, callers) in stats.items()}, f)
+
+    def write(self, directory):
+        """写入 profile-<模式>-<时间>.pstats 和 .collapsed，返回两个路径"""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"profile-{self.mode}-{time.strftime('%Y%m%d-%H%M%S')}")
+        self.write_pstats(base + '.pstats')
+        self.write_collapsed(base + '.collapsed')
+        return base + '.pstats', base + '.collapsed'
+
+class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+    _fields_ = [
+        ('cb', wintypes.DWORD),
+        ('PageFaultCount', wintypes.DWORD),
+        ('PeakWorkingSetSize', ctypes.c_size_t),
+        ('WorkingSetSize', ctypes.c_size_t),
+        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+        ('QuotaPagedPoolUsage', ctypes.c_size_t),
+        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+        ('PagefileUsage', ctypes.c_size_t),
+        ('PeakPagefileUsage', ctypes.c_size_t),
+    ]
+
+def process_rss():
+    """当前进程的常驻内存（字节），无法获取时返回None"""
+    try:
+        if psutil:
+            return psutil.Process().memory_info().rss
+        if os.name == 'nt':
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except Exception:
+        pass
+    return None
+
+def footprint_report(top=15):
+    """内存占用报告：RSS、gc对象统计，以及调试模式下按模块汇总的tracemalloc分配"""
+    type_counts = {}
+    objects = gc.get_objects()
+    for obj in objects:
+        name = type(obj).__name__
+        type_counts[name] = type_counts.get(name, 0) + 1
+    rss = process_rss()
+    report = {
+        'rss_mb': round(rss / (1024 * 1024), 2) if rss else None,
+        'gc_counts': list(gc.get_count()),
+        'gc_tracked_objects': len(objects),
+        'gc_frozen_objects': gc.get_freeze_count() if hasattr(gc, 'get_freeze_count') else None,
+        'gc_top_types': dict(sorted(type_counts.items(), key=lambda kv: -kv[1])[:top]),
+        'tracemalloc_by_module_kb': {},
+    }
+    del objects
+
+    if tracemalloc.is_tracing():
+        # 把文件名映射回模块，再按顶层包汇总
+        file_to_module = {}
+        for name, module in list(sys.modules.items()):
+            file_path = getattr(module, '__file__', None)
+            if file_path:
+                file_to_module[os.path.normcase(os.path.abspath(file_path))] = name.split('.')[0]
+        by_module = {}
+        for stat in tracemalloc.take_snapshot().statistics('filename'):
+            file_path = os.path.normcase(os.path.abspath(stat.traceback[0].filename))
+            module = file_to_module.get(file_path, os.path.basename(file_path))
+            by_module[module] = by_module.get(module, 0) + stat.size
+        report['tracemalloc_by_module_kb'] = {
+            name: round(size / 1024, 1)
+            for name, size in sorted(by_module.items(), key=lambda kv: -kv[1])[:top]
+        }
+    return report
+
+def log_footprint(label):
+    """在调试日志中输出内存占用报告"""
+    report = footprint_report()
+    debug_print(f"📦 内存占用 ({label}): RSS {report['rss_mb']} MB, "
+                f"gc跟踪对象 {report['gc_tracked_objects']}, 冻结对象 {report['gc_frozen_objects']}")
+    debug_print(f"   对象类型: {report['gc_top_types']}")
+    if report['tracemalloc_by_module_kb']:
+        debug_print(f"   按模块分配(KB): {report['tracemalloc_by_module_kb']}")
+    return report
+
+def parse_host_port(value, default_host='127.0.0.1'):
+    """解析 host:port 或 port，省略主机时只监听/连接本机"""
+    host, _, port = value.rpartition(':')
+    return (host or default_host), int(port)
+
+def encode_message(message):
+    return (json.dumps(message, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+def fleet_mac(key, *parts):
+    """集中锁屏协议的消息认证码：HMAC-SHA256(key, 各字段以换行连接)"""
+    return hmac.new(key, '\n'.join(str(part) for part in parts).encode('utf-8'), hashlib.sha256).hexdigest()
+
+def fleet_session_key(token, agent_nonce, controller_nonce):
+    return bytes.fromhex(fleet_mac(token.encode('utf-8'), 'session', agent_nonce, controller_nonce))
+
+FLEET_TOKEN_ENV = 'FAKELOCKSCREEN_FLEET_TOKEN'
+
+def load_fleet_token(settings_file):
+    """
+    环境变量 FAKELOCKSCREEN_FLEET_TOKEN 优先，否则读取配置文件中的 fleet_token。
+    不接受命令行参数：命令行对本机其他用户在进程列表中可见。
+    """
+    token = os.environ.get(FLEET_TOKEN_ENV)
+    if token:
+        return token
+    try:
+        with open(settings_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('fleet_token', '')
+    except (OSError, ValueError):
+        return ''
+
+class FleetAgent:
+    """
+    集中锁屏代理：主动连接控制端并保持长连接，按顺序执行收到的 lock/unlock/status 命令，
+    每条命令执行完成后回复带相同id的确认。连接断开后按指数退避重连。
+    协议为每行一个JSON对象。双方共享 fleet_token，令牌本身不在网络上传输：
+    代理发送 hello（含随机数），控制端回复 welcome（含随机数和证明自己持有令牌的HMAC），
+    代理验证后发送 auth（自己的HMAC）。之后控制端发送 {"id", "cmd", "mac"}，代理回复 {"id", "ok", "locked", "mac"}，
+    mac用双方随机数派生的会话密钥计算；没有有效mac或id不递增的命令一律拒绝执行。
+    控制端每 PING_INTERVAL 秒发送一次 ping，READ_TIMEOUT 内收不到任何消息即断开重连。
+    """
+
+    RECONNECT_MIN = 1.0
+    RECONNECT_MAX = 30.0
+    HANDSHAKE_TIMEOUT = 10.0
+    READ_TIMEOUT = 90.0
+
+    def __init__(self, host, port, handler, token, name=None):
+        if not token:
+            raise ValueError("缺少 fleet_token")
+        self.host = host
+        self.port = port
+        self.handler = handler  # async handler(cmd) -> 锁定状态
+        self.token = token
+        self.name = name or os.environ.get('COMPUTERNAME') or socket.gethostname()
+        self.connected = False
+
+    async def run(self):
+        delay = self.RECONNECT_MIN
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                debug_print(f"⚠ 连接控制端 {self.host}:{self.port} 失败: {e}，{delay:.0f} 秒后重试")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.RECONNECT_MAX)
+                continue
+            delay = self.RECONNECT_MIN
+            sock = writer.get_extra_info('socket')
+            if sock is not None:
+                # 由TCP保活探测断线，空闲时不需要应用层心跳定时器
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            debug_print(f"🛰️ 已连接控制端 {self.host}:{self.port}")
+            self.connected = True
+            try:
+                await self._serve(reader, writer)
+            except asyncio.TimeoutError:
+                debug_print("⚠ 控制端长时间没有消息，重新连接")
+            except PermissionError as e:
+                debug_print(f"❌ {e}")
+                delay = self.RECONNECT_MAX
+            except (OSError, ValueError, KeyError, asyncio.IncompleteReadError) as e:
+                debug_print(f"⚠ 与控制端的连接中断: {e}")
+            finally:
+                self.connected = False
+                writer.close()
+            await asyncio.sleep(delay)
+
+    async def _handshake(self, reader, writer):
+        """双向验证共享令牌，返回会话密钥"""
+        nonce = secrets.token_hex(16)
+        writer.write(encode_message({'type': 'hello', 'name': self.name, 'pid': os.getpid(), 'nonce': nonce}))
+        await writer.drain()
+        welcome = json.loads(await asyncio.wait_for(reader.readline(), self.HANDSHAKE_TIMEOUT))
+        controller_nonce = str(welcome['nonce'])
+        expected = fleet_mac(self.token.encode('utf-8'), 'controller', nonce, controller_nonce)
+        if not hmac.compare_digest(str(welcome.get('proof', '')), expected):
+            raise PermissionError(f"控制端 {self.host}:{self.port} 未通过令牌验证，拒绝连接")
+        writer.write(encode_message({
+            'type': 'auth', 'proof': fleet_mac(self.token.encode('utf-8'), 'agent', nonce, controller_nonce)}))
+        await writer.drain()
+        return fleet_session_key(self.token, nonce, controller_nonce)
+
+    async def _serve(self, reader, writer):
+        key = await self._handshake(reader, writer)
+        last_id = 0
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.READ_TIMEOUT)
+            if not line:
+                return
+            message = json.loads(line)
+            if message.get('type') == 'ping':
+                continue
+            command_id, cmd = message.get('id'), message.get('cmd')
+            reply = {'id': command_id}
+            valid = (isinstance(command_id, int) and command_id > last_id
+                     and hmac.compare_digest(str(message.get('mac', '')), fleet_mac(key, command_id, cmd)))
+            if not valid:
+                debug_print(f"⚠ 拒绝未通过验证的集中锁屏命令: {cmd}")
+                reply['ok'] = False
+                reply['error'] = "命令验证失败"
+            else:
+                last_id = command_id
+                try:
+                    reply['locked'] = await self.handler(cmd)
+                    reply['ok'] = True
+                except Exception as e:
+                    reply['ok'] = False
+                    reply['error'] = str(e)
+            reply['mac'] = fleet_mac(key, command_id, reply['ok'], reply.get('locked'))
+            writer.write(encode_message(reply))
+            await writer.drain()
+
+class FleetController:
+    """
+    集中锁屏控制端：接受代理的长连接，向所有代理流水线式地下发命令（不等待上一条确认），
+    并汇总确认结果。只接受通过 fleet_token 验证的代理，协议见 FleetAgent。
+    """
+
+    PING_INTERVAL = 30.0
+
+    def __init__(self, host, port, token, timeout=10.0):
+        if not token:
+            raise ValueError("缺少 fleet_token")
+        self.host = host
+        self.port = port
+        self.token = token
+        self.timeout = timeout
+        self.agents = {}  # {连接编号: {'name', 'writer', 'key', 'pending': {命令id: future}}}
+        self.server = None
+        self.handlers = set()
+        self.rejected = 0
+        self.connected_event = asyncio.Event()
+        self._next_id = 0
+        self._ping_task = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._on_connect, self.host, self.port, backlog=1024)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._ping_task = asyncio.ensure_future(self._ping_loop())
+
+    async def _ping_loop(self):
+        """定期向所有代理发送ping，代理据此判断连接仍然有效"""
+        ping = encode_message({'type': 'ping'})
+        while True:
+            await asyncio.sleep(self.PING_INTERVAL)
+            for agent in list(self.agents.values()):
+                agent['writer'].write(ping)
+
+    async def close(self):
+        if self._ping_task:
+            self._ping_task.cancel()
+        self.server.close()
+        for agent in list(self.agents.values()):
+            agent['writer'].close()
+        # 关闭连接后各连接处理协程读到EOF自行结束
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def _handshake(self, reader, writer):
+        """验证代理持有令牌，返回 (hello消息, 会话密钥)，验证失败返回None"""
+        token = self.token.encode('utf-8')
+        try:
+            hello = json.loads(await asyncio.wait_for(reader.readline(), FleetAgent.HANDSHAKE_TIMEOUT))
+            agent_nonce = str(hello['nonce'])
+            nonce = secrets.token_hex(16)
+            writer.write(encode_message({'type': 'welcome', 'nonce': nonce,
+                                         'proof': fleet_mac(token, 'controller', agent_nonce, nonce)}))
+            await writer.drain()
+            auth = json.loads(await asyncio.wait_for(reader.readline(), FleetAgent.HANDSHAKE_TIMEOUT))
+        except (OSError, ValueError, KeyError, TypeError, asyncio.TimeoutError):
+            return None
+        if not hmac.compare_digest(str(auth.get('proof', '')), fleet_mac(token, 'agent', agent_nonce, nonce)):
+            return None
+        return hello, fleet_session_key(self.token, agent_nonce, nonce)
+
+    async def _on_connect(self, reader, writer):
+        result = await self._handshake(reader, writer)
+        if result is None:
+            self.rejected += 1
+            peer = writer.get_extra_info('peername')
+            print(f"⚠ 拒绝未通过令牌验证的连接: {peer}")
+            writer.close()
+            return
+        hello, session_key = result
+        key = id(writer)
+        self.handlers.add(asyncio.current_task())
+        agent = {'name': hello.get('name', '?'), 'writer': writer, 'key': session_key, 'pending': {}}
+        self.agents[key] = agent
+        self.connected_event.set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = json.loads(line)
+                expected = fleet_mac(session_key, reply.get('id'), reply.get('ok'), reply.get('locked'))
+                if not hmac.compare_digest(str(reply.get('mac', '')), expected):
+                    continue  # 伪造或损坏的确认按超时处理
+                future = agent['pending'].pop(reply.get('id'), None)
+                if future and not future.done():
+                    future.set_result((reply, time.perf_counter()))
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.handlers.discard(asyncio.current_task())
+            del self.agents[key]
+            for future in agent['pending'].values():
+                if not future.done():
+                    future.set_exception(ConnectionError("代理连接已断开"))
+            writer.close()
+
+    async def wait_for_agents(self, count, timeout=30.0):
+        """等待指定数量的代理连接"""
+        deadline = time.perf_counter() + timeout
+        while len(self.agents) < count and time.perf_counter() < deadline:
+            self.connected_event.clear()
+            try:
+                await asyncio.wait_for(self.connected_event.wait(), deadline - time.perf_counter())
+            except asyncio.TimeoutError:
+                break
+        return len(self.agents)
+
+    async def broadcast(self, cmd):
+        """向所有代理下发命令并汇总确认：数量、失败/超时的代理、确认延迟分布"""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        sent = []
+        for agent in list(self.agents.values()):
+            self._next_id += 1
+            future = loop.create_future()
+            agent['pending'][self._next_id] = future
+            agent['writer'].write(encode_message(
+                {'id': self._next_id, 'cmd': cmd, 'mac': fleet_mac(agent['key'], self._next_id, cmd)}))
+            sent.append((agent, future))
+        # 先把所有命令写入发送缓冲区，再统一等待发送完成
+        await asyncio.gather(*(agent['writer'].drain() for agent, _ in sent), return_exceptions=True)
+        if sent:
+            await asyncio.wait([future for _, future in sent], timeout=self.timeout)
+
+        latencies, failed, timed_out, locked = [], [], [], 0
+        for agent, future in sent:
+            if not future.done():
+                future.cancel()
+                timed_out.append(agent['name'])
+            elif future.exception() is not None:
+                failed.append(agent['name'])
+            else:
+                reply, acked_at = future.result()
+                if not reply.get('ok'):
+                    failed.append(agent['name'])
+                    continue
+                latencies.append((acked_at - start) * 1000)
+                locked += bool(reply.get('locked'))
+        latencies.sort()
+        return {
+            'command': cmd,
+            'agents': len(sent),
+            'acked': len(latencies),
+            'locked': locked,
+            'failed': failed,
+            'timed_out': timed_out,
+            'p50_ms': latencies[len(latencies) // 2] if latencies else None,
+            'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else None,
+            'all_acked_ms': latencies[-1] if len(latencies) == len(sent) and latencies else None,
+        }
+
+def print_fleet_result(result):
+    print(f"📡 {result['command']}: {result['acked']}/{result['agents']} 已确认，"
+          f"{result['locked']} 台处于锁定状态")
+    if result['p50_ms'] is not None:
+        print(f"  确认延迟 p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms"
+              + (f", 全部确认 {result['all_acked_ms']:.1f} ms" if result['all_acked_ms'] is not None else ""))
+    if result['failed']:
+        print(f"  ❌ 失败: {', '.join(result['failed'])}")
+    if result['timed_out']:
+        print(f"  ⏱ 超时: {', '.join(result['timed_out'])}")
+
+async def run_fleet_console(host, port, token):
+    """交互式控制端：从标准输入读取 lock / unlock / status / list / quit"""
+    controller = FleetController(host, port, token)
+    await controller.start()
+    print(f"🛰️ 控制端已在 {host}:{controller.port} 监听，输入 lock / unlock / status / list / quit")
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                break
+            cmd = line.strip().lower()
+            if cmd in ('lock', 'unlock', 'status'):
+                print_fleet_result(await controller.broadcast(cmd))
+            elif cmd == 'list':
+                names = sorted(agent['name'] for agent in controller.agents.values())
+                print(f"🖥️ 已连接 {len(names)} 台: {', '.join(names)}")
+            elif cmd in ('quit', 'exit'):
+                break
+            elif cmd:
+                print(f"⚠ 未知命令: {cmd}")
+    finally:
+        await controller.close()
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+@functools.lru_cache(maxsize=256)
+def parse_weekdays(value):
+    """解析星期设置：省略或"daily"表示每天，也可写 "mon-fri"、"mon,wed" 或列表"""
+    if value in (None, '', '*', 'daily'):
+        return frozenset(range(7))
+    parts = value.split(',') if isinstance(value, str) else value
+    days = set()
+    for part in parts:
+        first, _, last = str(part).strip().lower().partition('-')
+        start = WEEKDAYS.index(first[:3])
+        end = WEEKDAYS.index(last[:3]) if last else start
+        day = start
+        while True:
+            days.add(day)
+            if day == end:
+                break
+            day = (day + 1) % 7
+    return frozenset(days)
+
+class ScheduleRule:
+    """一条定时锁屏规则：在指定星期（或指定日期）的 start 到 end 之间锁屏，end 早于 start 表示跨过午夜"""
+
+    __slots__ = ('name', 'days', 'start', 'duration', 'date')
+
+    def __init__(self, name, days, start, duration, date=None):
+        self.name = name
+        self.days = days
+        self.start = start
+        self.duration = duration
+        self.date = date
+
+    @staticmethod
+    def _minutes(value):
+        hour, minute = value.split(':')
+        hour, minute = int(hour), int(minute)
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            raise ValueError(f"无效的时间: {value}")
+        return hour * 60 + minute
+
+    @classmethod
+    def parse(cls, entry):
+        # 规则可能有上千条，时间字段手工解析而不用strptime
+        start = cls._minutes(entry['start'])
+        duration = (cls._minutes(entry['end']) - start) % (24 * 60) or 24 * 60
+        date = datetime.date.fromisoformat(entry['date']) if entry.get('date') else None
+        days = entry.get('days')
+        return cls(entry.get('name', ''), parse_weekdays(tuple(days) if isinstance(days, list) else days),
+                   datetime.time(start // 60, start % 60), datetime.timedelta(minutes=duration), date)
+
+    def next_window(self, now):
+        """返回结束时间晚于now的最近一次锁屏窗口 (开始时间戳, 结束时间戳)，没有则返回None"""
+        if self.date is not None:
+            candidates = (self.date,)
+        else:
+            # 从前一天开始找，覆盖跨午夜仍在进行中的窗口
+            today = now.date()
+            candidates = (today + datetime.timedelta(days=offset) for offset in range(-1, 8))
+        for day in candidates:
+            if self.date is None and day.weekday() not in self.days:
+                continue
+            start = datetime.datetime.combine(day, self.start)
+            end = start + self.duration
+            if end > now:
+                return start.timestamp(), end.timestamp()
+        return None
+
+class LockScheduler:
+    """
+    定时锁屏调度器：每条规则只在最小堆中保留下一个事件（窗口开始或结束），
+    事件循环中始终只挂一个定时器，指向堆顶的截止时间。
+    只有规则变化或检测到系统时间跳变时才重新展开全部规则；多条规则的窗口重叠时按并集锁屏。
+    """
+
+    EVENT_START = 0
+    EVENT_END = 1
+    # 单次定时器的最长等待，到期时顺便检查系统时间是否被修改（休眠唤醒、手动调时）
+    MAX_SLEEP = 3600.0
+    CLOCK_JUMP_TOLERANCE = 30.0
+
+    def __init__(self, background, on_lock, on_unlock):
+        self.background = background
+        self.on_lock = on_lock
+        self.on_unlock = on_unlock
+        self.rules = []
+        self._heap = []  # (时间戳, 事件类型, 规则序号, 窗口结束时间戳)
+        self._active = set()
+        self._timer = None
+        self._expected_wall = None
+
+    def update(self, entries):
+        """从任意线程替换全部规则，在事件循环线程中重新展开"""
+        self.background.call_soon(self._rebuild, list(entries))
+
+    def _rebuild(self, entries=None):
+        if entries is not None:
+            rules = []
+            for entry in entries:
+                try:
+                    rules.append(ScheduleRule.parse(entry))
+                except (KeyError, ValueError, TypeError) as e:
+                    debug_print(f"⚠ 忽略无效的定时锁屏规则 {entry}: {e}")
+            self.rules = rules
+        now = time.time()
+        now_dt = datetime.datetime.fromtimestamp(now)
+        was_active = bool(self._active)
+        heap = []
+        active = set()
+        for index, rule in enumerate(self.rules):
+            window = rule.next_window(now_dt)
+            if window is None:
+                continue
+            start, end = window
+            if start <= now:
+                active.add(index)
+                heap.append((end, self.EVENT_END, index, end))
+            else:
+                heap.append((start, self.EVENT_START, index, end))
+        heapq.heapify(heap)
+        self._heap = heap
+        self._active = active
+        debug_print(f"🗓️ 定时锁屏: {len(self.rules)} 条规则，{len(active)} 个窗口进行中")
+        self._apply(was_active)
+        self._arm()
+
+    def _arm(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._heap:
+            return
+        now = time.time()
+        delay = min(max(0.0, self._heap[0][0] - now), self.MAX_SLEEP)
+        self._expected_wall = now + delay
+        self._timer = self.background.loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        now = time.time()
+        if abs(now - self._expected_wall) > self.CLOCK_JUMP_TOLERANCE:
+            debug_print(f"🕒 检测到系统时间跳变 {now - self._expected_wall:+.0f} 秒，重新计算定时锁屏")
+            self._rebuild()
+            return
+        was_active = bool(self._active)
+        heap = self._heap
+        # 同一时刻到期的事件一起处理，首尾相接的窗口不会先解锁再锁定
+        while heap and heap[0][0] <= now:
+            when, kind, index, end = heapq.heappop(heap)
+            if kind == self.EVENT_START:
+                self._active.add(index)
+                heapq.heappush(heap, (end, self.EVENT_END, index, end))
+            else:
+                self._active.discard(index)
+                window = self.rules[index].next_window(datetime.datetime.fromtimestamp(when))
+                if window is not None:
+                    heapq.heappush(heap, (window[0], self.EVENT_START, index, window[1]))
+        self._apply(was_active)
+        self._arm()
+
+    def _apply(self, was_active):
+        if self._active and not was_active:
+            names = ', '.join(self.rules[index].name for index in self._active if self.rules[index].name)
+            debug_print(f"🗓️ 定时锁屏开始 {names}")
+            self.on_lock()
+        elif was_active and not self._active:
+            debug_print("🗓️ 定时锁屏结束")
+            self.on_unlock()
+
+    def stop(self):
+        self.background.call_soon(self._cancel)
+
+    def _cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+# 文件变更通知相关常量
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+FILE_LIST_DIRECTORY = 0x0001
+FILE_SHARE_ALL = 0x00000007
+OPEN_EXISTING = 3
+FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+FILE_NOTIFY_CHANGE_FILE_NAME = 0x00000001
+FILE_NOTIFY_CHANGE_LAST_WRITE = 0x00000010
+INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+
+class SettingsWatcher:
+    """
+    监视配置文件的变化。Linux用inotify（文件描述符直接注册到后台事件循环），
+    Windows用ReadDirectoryChangesW（一个阻塞在内核中的监视线程，无变化时不会被唤醒），
+    都不可用时退回到低频stat检查。通知经过短暂去抖后在后台事件循环线程中调用on_change。
+    """
+
+    DEBOUNCE = 0.3
+    POLL_INTERVAL = 10.0
+
+    def __init__(self, path, background, on_change):
+        self.path = path
+        self.directory = os.path.dirname(path)
+        self.filename = os.path.basename(path)
+        self.background = background
+        self.on_change = on_change
+        self.backend = None
+        self._stat = None
+        self._pending = None
+        self._inotify_fd = None
+        self._dir_handle = None
+
+    def _stat_key(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._stat = self._stat_key()
+        for backend in (self._start_inotify, self._start_windows):
+            try:
+                if backend():
+                    debug_print(f"👀 配置文件监视: {self.backend}")
+                    return
+            except Exception as e:
+                debug_print(f"⚠ 无法使用文件变更通知: {e}")
+        self.backend = 'stat'
+        self.background.add_periodic('settings-watch', self.POLL_INTERVAL, self._poll)
+        debug_print(f"👀 配置文件监视: 每 {self.POLL_INTERVAL:.0f} 秒检查一次")
+
+    def _start_inotify(self):
+        if not sys.platform.startswith('linux'):
+            return False
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return False
+        if libc.inotify_add_watch(fd, os.fsencode(self.directory), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+            os.close(fd)
+            return False
+        self._inotify_fd = fd
+        self.background.call_soon(self.background.loop.add_reader, fd, self._read_inotify)
+        self.backend = 'inotify'
+        return True
+
+    def _read_inotify(self):
+        try:
+            data = os.read(self._inotify_fd, 4096)
+        except BlockingIOError:
+            return
+        filename = os.fsencode(self.filename)
+        offset = 0
+        matched = False
+        # struct inotify_event { int wd; uint32 mask; uint32 cookie; uint32 len; char name[]; }
+        while offset + 16 <= len(data):
+            _, _, _, length = struct.unpack_from('iIII', data, offset)
+            if data[offset + 16:offset + 16 + length].rstrip(b'\0') == filename:
+                matched = True
+            offset += 16 + length
+        if matched:
+            self._schedule()
+
+    def _start_windows(self):
+        if os.name != 'nt':
+            return False
+        kernel32 = ctypes.windll.kernel32
+        kernel32.CreateFileW.restype = ctypes.c_void_p
+        handle = kernel32.CreateFileW(self.directory, FILE_LIST_DIRECTORY, FILE_SHARE_ALL, None,
+                                      OPEN_EXISTING, FILE_FLAG_BACKUP_SEMANTICS, None)
+        if handle in (None, INVALID_HANDLE_VALUE):
+            return False
+        self._dir_handle = handle
+        threading.Thread(target=self._watch_windows, name="FakeLockScreen-watch", daemon=True).start()
+        self.backend = 'ReadDirectoryChangesW'
+        return True
+
+    def _watch_windows(self):
+        kernel32 = ctypes.windll.kernel32
+        kernel32.ReadDirectoryChangesW.argtypes = [ctypes.c_void_p, ctypes.c_void_p, wintypes.DWORD, wintypes.BOOL,
+                                                   wintypes.DWORD, ctypes.POINTER(wintypes.DWORD), ctypes.c_void_p, ctypes.c_void_p]
+        buffer = ctypes.create_string_buffer(4096)
+        returned = wintypes.DWORD()
+        filename = self.filename.lower()
+        while self._dir_handle:
+            if not kernel32.ReadDirectoryChangesW(self._dir_handle, buffer, len(buffer), False,
+                                                  FILE_NOTIFY_CHANGE_FILE_NAME | FILE_NOTIFY_CHANGE_LAST_WRITE,
+                                                  ctypes.byref(returned), None, None):
+                break
+            # 返回0字节表示缓冲区溢出，无法得知具体文件，按已变化处理
+            matched = returned.value == 0
+            raw = buffer.raw
+            offset = 0
+            while returned.value:
+                # FILE_NOTIFY_INFORMATION { DWORD NextEntryOffset; DWORD Action; DWORD FileNameLength; WCHAR FileName[]; }
+                next_offset, _, length = struct.unpack_from('III', raw, offset)
+                if raw[offset + 12:offset + 12 + length].decode('utf-16-le').lower() == filename:
+                    matched = True
+                if not next_offset:
+                    break
+                offset += next_offset
+            if matched:
+                self.background.call_soon(self._schedule)
+
+    def _schedule(self):
+        """在事件循环线程中去抖，编辑器保存时的多次通知合并为一次"""
+        if self._pending is not None:
+            self._pending.cancel()
+        self._pending = self.background.loop.call_later(self.DEBOUNCE, self._fire)
+
+    def _fire(self):
+        self._pending = None
+        self._stat = self._stat_key()
+        self.on_change()
+
+    def _poll(self):
+        stat = self._stat_key()
+        if stat != self._stat:
+            self._stat = stat
+            self.on_change()
+
+    def stop(self):
+        if self._inotify_fd is not None:
+            fd, self._inotify_fd = self._inotify_fd, None
+
+            def close():
+                self.background.loop.remove_reader(fd)
+                os.close(fd)
+            self.background.call_soon(close)
+        if self._dir_handle:
+            handle, self._dir_handle = self._dir_handle, None
+            # 取消监视线程中阻塞的ReadDirectoryChangesW
+            ctypes.windll.kernel32.CancelIoEx(ctypes.c_void_p(handle), None)
+            ctypes.windll.kernel32.CloseHandle(ctypes.c_void_p(handle))
+        if self.backend == 'stat':
+            self.background.remove_periodic('settings-watch')
+
+# 锁屏/解锁来源，审计记录中以下标存储
+AUDIT_SOURCES = ('unknown', 'hotkey', 'window', 'tray', 'fleet', 'schedule', 'passphrase', 'script', 'quit')
+
+class AuditLog:
+    """
+    锁屏会话审计日志：每次解锁追加一条定长二进制记录（锁定时间、解锁时间、锁定来源、解锁来源）。
+    记录先缓存在内存中，由后台事件循环合并后一次写入并fsync；当前段超过SEGMENT_BYTES时轮转，
+    index.json记录每个已轮转段的时间范围，按时间查询时跳过无关的段，段内按锁定时间二分查找。
+    """
+
+    MAGIC = b'FLSA'
+    HEADER = struct.Struct('<4sHH')  # 魔数, 版本, 记录长度
+    RECORD = struct.Struct('<ddBB6x')
+    VERSION = 1
+    SEGMENT_BYTES = 1 << 20
+    MAX_SEGMENTS = 24
+    FSYNC_DELAY = 2.0
+    FSYNC_BATCH = 32
+
+    def __init__(self, directory, background=None):
+        self.directory = directory
+        self.current_path = os.path.join(directory, 'current.bin')
+        self.index_path = os.path.join(directory, 'index.json')
+        self.background = background
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_scheduled = False
+
+    def append(self, locked_at, unlocked_at, lock_source, unlock_source):
+        record = self.RECORD.pack(locked_at, unlocked_at, self.source_code(lock_source), self.source_code(unlock_source))
+        with self._lock:
+            self._pending.append(record)
+            full = len(self._pending) >= self.FSYNC_BATCH
+            schedule = not self._flush_scheduled
+            self._flush_scheduled = True
+        if self.background is None or full:
+            if self.background is None:
+                self.flush()
+            else:
+                self.background.submit_io(self.flush)
+        elif schedule:
+            self.background.call_later(self.FSYNC_DELAY, self._flush_from_loop)
+
+    @staticmethod
+    def source_code(source):
+        return AUDIT_SOURCES.index(source) if source in AUDIT_SOURCES else 0
 
-# 单例模式实现
-mutex_name = "FakeLockScreenSingletonMutex"
-mutex = ctypes.windll.kernel32.CreateMutexW(None, False, mutex_name)
-last_error = ctypes.windll.kernel32.GetLastError()
+    def _flush_from_loop(self):
+        try:
+            self.background.loop.run_in_executor(self.background.io_executor, self.flush)
+        except RuntimeError:
+            pass  # 退出时I/O线程已关闭，由quit_application直接写入
 
-if last_error == 183:  # ERROR_ALREADY_EXISTS
-    messagebox.showerror("错误", "程序已经在运行，不能同时运行多个实例。")
-    sys.exit(1)
+    def flush(self):
+        """把缓存的记录一次写入当前段并fsync"""
+        with self._lock:
+            records, self._pending = self._pending, []
+            self._flush_scheduled = False
+        if not records:
+            return
+        data = b''.join(records)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._rotate_if_needed(len(data))
+            with open(self.current_path, 'ab') as f:
+                if f.tell() == 0:
+                    f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.RECORD.size))
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            debug_print(f"⚠ 写入审计日志失败: {e}")
 
-def hide_console():
-    """隐藏控制台窗口"""
-    try:
-        console_window = ctypes.windll.kernel32.GetConsoleWindow()
-        if console_window != 0:
-            ctypes.windll.user32.ShowWindow(console_window, 0)
-    except:
-        pass
+    def _read_segment(self, path):
+        """读取一个段，返回记录部分的memoryview；文件头不符时返回空"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < self.HEADER.size:
+            return memoryview(b'')
+        magic, version, record_size = self.HEADER.unpack_from(data)
+        if magic != self.MAGIC or record_size != self.RECORD.size:
+            debug_print(f"⚠ 无法识别的审计日志段: {path}")
+            return memoryview(b'')
+        body = memoryview(data)[self.HEADER.size:]
+        return body[:len(body) - len(body) % self.RECORD.size]
 
-def show_console():
-    """显示控制台窗口"""
-    try:
-        console_window = ctypes.windll.kernel32.GetConsoleWindow()
-        if console_window != 0:
-            ctypes.windll.user32.ShowWindow(console_window, 1)
-    except:
-        pass
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
 
-def debug_print(message):
-    """调试输出，如果启用，则同时打印到控制台和日志文件"""
-    if DEBUG_MODE:
-        print(message)
-        # 只有在startup_log被设置后才写入文件
-        if startup_log:
+    def _rotate_if_needed(self, incoming):
+        try:
+            size = os.path.getsize(self.current_path)
+        except OSError:
+            return
+        if size + incoming <= self.SEGMENT_BYTES:
+            return
+        body = self._read_segment(self.current_path)
+        if not body:
+            return
+        first = self.RECORD.unpack_from(body, 0)[0]
+        last = self.RECORD.unpack_from(body, len(body) - self.RECORD.size)[0]
+        name = f"segment-{int(first)}.bin"
+        os.replace(self.current_path, os.path.join(self.directory, name))
+        index = self._load_index()
+        index.append({'file': name, 'first': first, 'last': last, 'count': len(body) // self.RECORD.size})
+        while len(index) > self.MAX_SEGMENTS:
             try:
-                with open(startup_log, 'a', encoding='utf-8') as f:
-                    f.write(message + "\n")
-            except Exception as e:
-                # 在这种情况下，只打印到控制台，避免无限循环
-                print(f"!! 无法写入日志文件: {e}")
+                os.remove(os.path.join(self.directory, index.pop(0)['file']))
+            except OSError:
+                pass
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=1)
+        os.replace(temp_path, self.index_path)
+        debug_print(f"🗂️ 审计日志已轮转: {name}")
 
-def is_admin():
-    """检查是否以管理员身份运行"""
-    try:
-        return ctypes.windll.shell32.IsUserAnAdmin()
-    except:
-        return False
+    def segments(self):
+        """按时间顺序返回 (路径, 第一条锁定时间, 最后一条锁定时间)，当前段的时间范围为None"""
+        entries = [(os.path.join(self.directory, entry['file']), entry['first'], entry['last'])
+                   for entry in self._load_index()]
+        if os.path.exists(self.current_path):
+            entries.append((self.current_path, None, None))
+        return entries
 
-def run_as_admin():
-    """以管理员身份重新运行程序"""
-    try:
-        if is_admin():
-            return True
-        else:
-            debug_print("⚠ 需要管理员权限，正在重新启动...")
-            
-            # 准备参数
-            args_list = sys.argv
-            
-            # 如果已有日志文件，将其作为参数传递
-            if startup_log and os.path.exists(startup_log):
-                args_list.append(f'--log-file="{startup_log}"')
+    def _search(self, body, count, value):
+        """返回第一条锁定时间不早于value的记录序号"""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self.RECORD.unpack_from(body, middle * self.RECORD.size)[0] < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
 
-            # 构建完整的命令行参数
-            script_path = args_list[0]
-            if ' ' in script_path:
-                script_path = f'"{script_path}"'
-            
-            other_args = args_list[1:]
-            args_str = ' '.join(other_args)
-            
-            full_cmd = f'{script_path} {args_str}'.strip()
-            debug_print(f"🔄 启动命令: {sys.executable} {full_cmd}")
-            
-            result = ctypes.windll.shell32.ShellExecuteW(
-                None, "runas", sys.executable, full_cmd, None, 1
-            )
-            
-            if result <= 32:
-                debug_print(f"❌ 权限请求失败，返回值: {result}")
-                messagebox.showerror("权限错误", "无法获取管理员权限，程序将继续运行但功能可能受限。")
-                return True  # 继续运行但功能受限
-            
-            debug_print("✅ 权限请求成功，程序将重新启动")
-            return False
-    except Exception as e:
-        debug_print(f"❌ 权限请求异常: {e}")
-        messagebox.showerror("权限错误", f"无法获取管理员权限：{e}\n程序将继续运行但功能可能受限。")
-        return True
+    def query(self, start=None, end=None):
+        """返回锁定时间在 [start, end) 内的记录: (锁定时间, 解锁时间, 锁定来源, 解锁来源)"""
+        for path, first, last in self.segments():
+            if first is not None and ((end is not None and first >= end) or (start is not None and last < start)):
+                continue
+            try:
+                body = self._read_segment(path)
+            except OSError:
+                continue
+            count = len(body) // self.RECORD.size
+            low = self._search(body, count, start) if start is not None else 0
+            high = self._search(body, count, end) if end is not None else count
+            for locked_at, unlocked_at, lock_source, unlock_source in self.RECORD.iter_unpack(
+                    body[low * self.RECORD.size:high * self.RECORD.size]):
+                yield (locked_at, unlocked_at,
+                       AUDIT_SOURCES[lock_source] if lock_source < len(AUDIT_SOURCES) else 'unknown',
+                       AUDIT_SOURCES[unlock_source] if unlock_source < len(AUDIT_SOURCES) else 'unknown')
+
+def summarize_audit(log, days=90):
+    """汇总最近days天的锁屏会话：次数、总时长、时长分布、来源和按月统计"""
+    from collections import Counter
+    start_time = time.perf_counter()
+    since = time.time() - days * 86400
+    durations = []
+    lock_sources = Counter()
+    unlock_sources = Counter()
+    months = {}
+    month = None
+    month_end = float('-inf')
+    for locked_at, unlocked_at, lock_source, unlock_source in log.query(since):
+        duration = max(0.0, unlocked_at - locked_at)
+        durations.append(duration)
+        lock_sources[lock_source] += 1
+        unlock_sources[unlock_source] += 1
+        if locked_at >= month_end:
+            # 记录按时间排序，只在跨月时计算一次月份边界
+            local = time.localtime(locked_at)
+            month = f"{local.tm_year}-{local.tm_mon:02d}"
+            next_year, next_month = (local.tm_year + 1, 1) if local.tm_mon == 12 else (local.tm_year, local.tm_mon + 1)
+            month_end = time.mktime((next_year, next_month, 1, 0, 0, 0, 0, 0, -1))
+        sessions, seconds = months.get(month, (0, 0.0))
+        months[month] = (sessions + 1, seconds + duration)
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+    print(f"🗂️ 最近 {days} 天的锁屏记录 ({log.directory})")
+    if not durations:
+        print("  没有记录")
+        return
+    durations.sort()
+    print(f"  会话 {len(durations)} 次, 共锁定 {sum(durations) / 3600:.1f} 小时, "
+          f"中位数 {durations[len(durations) // 2] / 60:.1f} 分钟, 最长 {durations[-1] / 60:.1f} 分钟")
+    print(f"  锁定来源: {', '.join(f'{name} {count}' for name, count in lock_sources.most_common())}")
+    print(f"  解锁来源: {', '.join(f'{name} {count}' for name, count in unlock_sources.most_common())}")
+    for month, (sessions, seconds) in sorted(months.items()):
+        print(f"  {month}: {sessions} 次, {seconds / 3600:.1f} 小时")
+    print(f"  (查询耗时 {elapsed_ms:.1f} ms)")
+
+class StartupTimeline:
+    """
+    启动阶段计时：记录各阶段相对进程启动的开始和完成时间（毫秒）及所在线程。
+    required中的阶段全部完成后调用一次on_complete。
+    """
+
+    def __init__(self, required, on_complete):
+        self.stages = {}  # {阶段: (开始ms, 完成ms, 线程名)}
+        self.required = frozenset(required)
+        self.on_complete = on_complete
+        self._lock = threading.Lock()
+        self._reported = False
+
+    @staticmethod
+    def now_ms():
+        return (time.perf_counter() - PROCESS_START) * 1000
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = self.now_ms()
+        try:
+            yield
+        finally:
+            self.finish(name, start)
+
+    def finish(self, name, start=None):
+        end = self.now_ms()
+        with self._lock:
+            self.stages[name] = (end if start is None else start, end, threading.current_thread().name)
+            complete = not self._reported and self.required <= self.stages.keys()
+            if complete:
+                self._reported = True
+        if complete:
+            self.on_complete(self)
+
+    def report(self):
+        with self._lock:
+            stages = dict(self.stages)
+        return {
+            'hotkey_ready_ms': round(stages['hotkeys'][1], 1) if 'hotkeys' in stages else None,
+            'tray_ready_ms': round(stages['tray'][1], 1) if 'tray' in stages else None,
+            'window_ready_ms': round(stages['window'][1], 1) if 'window' in stages else None,
+            'stages': {
+                name: {'start_ms': round(start, 1), 'end_ms': round(end, 1), 'thread': thread}
+                for name, (start, end, thread) in sorted(stages.items(), key=lambda kv: kv[1][0])
+            },
+        }
+
+# 配置文件字段: (键名, 属性名, 默认值)
+SETTINGS_FIELDS = (
+    ('unlock_key', 'unlock_key', 'ctrl+alt+u'),
+    ('lock_key', 'lock_key', 'ctrl+alt+l'),
+    ('start_on_boot', 'start_on_boot', False),
+    ('mouse_block', 'mouse_block_mode', 'hook'),
+    ('passthrough_media', 'passthrough_media', True),
+    ('passthrough_keys', 'passthrough_keys', []),
+    ('fleet_controller', 'fleet_controller', ''),
+    ('fleet_token', 'fleet_token', ''),
+    ('lock_schedule', 'lock_schedule', []),
+    ('unlock_passphrases', 'unlock_passphrases', []),
+    ('overlay_style', 'overlay_style', 'black'),
+    ('input_filter', 'input_filter', 'inprocess'),
+    ('dimming', 'dimming', 'auto'),
+)
 
 class FakeLockScreen:
     def __init__(self):
@@ -119,22 +3094,143 @@ class FakeLockScreen:
         self.lock_key = "ctrl+alt+l"
         self.is_locked = False
         self.lock_window = None
+        self.lock_windows = []
+        self.display_topology = DisplayTopology()
+        self.display_listener = None
+        self.overlay_style = 'black'
+        self.screen_blur = ScreenBlur()
         self.main_window = None
+        self.main_frame = None
+        self.status_label = None
+        self.unlock_key_label = None
+        self.lock_key_label = None
+        self.status_text = "就绪"
         self.tray_icon = None
         self.capturing_key = False
         self.keyboard_hook = None
         self.original_brightness = None
         self.mouse_hidden = False
+        self.mouse_block_mode = 'hook'
+        self.passthrough_media = True
+        self.passthrough_keys = []
+        self.key_policy = None
+        self.fleet_controller = ''
+        self.fleet_token = ''
+        self.fleet_agent = None
+        self.fleet_agent_future = None
+        self.input_filter = 'inprocess'
+        self.input_filter_process = None
+        self.filter_watchdog = None
+        self.lock_schedule = []
+        self.unlock_passphrases = []
+        self.schedule_locked = False
+        self.locked_at = None
+        self.lock_source = None
         self.start_on_boot = False
         self.shortcut_name = "FakeLockScreen.lnk"
         
+        self.wmi_connection = None
+        self.brightness_methods = None
+        self.brightness_monitor = None
+        self.brightness_control_available = False
+        self.brightness_probe_file = os.path.join(self.user_config_dir, "brightness_probe.json")
+        self.dimming = 'auto'
+        self.dimmer = SoftwareDimmer()
+        self.lock_cycle_snapshot = None
+        
+        self.ui_channel = UICommandChannel()
+        
+        debug_print("🧵 启动后台事件循环...")
+        self.background = BackgroundLoop()
+        self.background.start()
+        self.metrics = Metrics(os.path.join(self.user_config_dir, "metrics.json"), self.background)
+        self.audit = AuditLog(os.path.join(self.user_config_dir, "audit"), self.background)
+        self.hook_watchdog = HookWatchdog(KeyboardHookBackend(), self.background, self.metrics)
+        
+        # 启动按依赖分阶段：快捷键只依赖设置，最先就绪；托盘和WMI在各自线程中并行；主窗口最后创建。
+        # 主窗口创建前触发的锁屏等命令暂存在命令通道中，窗口就绪后立即执行。
+        self.startup = StartupTimeline(('hotkeys', 'tray', 'window'), self.report_startup)
+        
+        debug_print("📄 加载设置...")
+        with self.startup.stage('settings'):
+            self.load_settings() # 恢复加载设置
+            self.mouse_blocker = MouseBlocker(self.mouse_block_mode)
+            # 与文件系统上的快捷方式状态同步
+            self.start_on_boot = self.is_startup_enabled()
+            debug_print(f"💡 开机自启状态: {self.start_on_boot}")
+        
+        debug_print("⌨️ 设置全局快捷键...")
+        with self.startup.stage('hotkeys'):
+            self.setup_global_hotkeys()
+        
         debug_print("🔆 初始化WMI连接...")
-        # 初始化WMI连接
+        # WMI连接在I/O工作线程中创建，之后所有亮度调用都在该线程执行
+        self.background.submit_io(self.init_brightness_control)
+        
+        debug_print("📱 创建系统托盘...")
+        self.create_tray_icon()
+        
+        debug_print("🖥️ 创建主窗口...")
+        with self.startup.stage('window'):
+            self.create_main_window()
+        
+        if self.input_filter == 'process':
+            self.start_input_filter()
+        
+        # 规则在后台事件循环中展开，不阻塞启动；启动时已处于锁屏窗口内会立即锁屏
+        self.scheduler = LockScheduler(self.background, self.schedule_lock, self.schedule_unlock)
+        if self.lock_schedule:
+            self.scheduler.update(self.lock_schedule)
+        
+        # 命令行 --agent 优先于配置文件，仅对本次运行生效
+        agent_arg = [arg for arg in sys.argv if arg.startswith('--agent=')]
+        controller_address = agent_arg[0].split('=', 1)[1] if agent_arg else self.fleet_controller
+        if controller_address:
+            self.start_fleet_agent(controller_address)
+        
+        # 外部工具修改配置文件后自动应用，无需重启
+        self.settings_watcher = SettingsWatcher(
+            self.settings_file, self.background, lambda: self.background.submit(self.reload_settings()))
+        self.settings_watcher.start()
+        
+        # 初始化产生的对象长期存活，移出分代回收以减少之后每次gc的扫描量
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+        
+        debug_print("✅ FakeLockScreen初始化完成")
+        if DEBUG_MODE:
+            log_footprint("初始化完成")
+
+    def init_brightness_control(self):
+        """初始化WMI亮度控制，在I/O工作线程中执行"""
+        with self.startup.stage('brightness'):
+            self._init_brightness_control()
+
+    def _init_brightness_control(self):
+        """
+        探测硬件亮度控制。结果和可用的后端按显示配置缓存在 brightness_probe.json 中：
+        同一显示配置下已知失败时直接跳过WMI探测（在台式机外接显示器上可能耗时数秒），
+        显示配置变化后重新探测。
+        """
+        identity = display_identity()
+        cached = self.load_brightness_probe()
+        if cached.get('display') == identity:
+            if not cached.get('backends'):
+                debug_print("ℹ️ 当前显示配置已知不支持硬件亮度控制，跳过探测")
+                self.brightness_control_available = False
+                return
+            if self.brightness_control_available:
+                return  # 显示配置未变，沿用已建立的WMI连接
+
+        start_time = time.perf_counter()
+        backends = []
         try:
             self.wmi_connection = wmi.WMI(namespace='wmi')
             self.brightness_methods = self.wmi_connection.WmiMonitorBrightnessMethods()[0]
             self.brightness_monitor = self.wmi_connection.WmiMonitorBrightness()[0]
             self.brightness_control_available = True
+            backends.append('wmi')
             debug_print("✅ WMI亮度控制初始化成功")
         except Exception as e:
             debug_print(f"⚠ WMI初始化失败: {e}")
@@ -142,24 +3238,95 @@ class FakeLockScreen:
             self.brightness_methods = None
             self.brightness_monitor = None
             self.brightness_control_available = False
-        
-        debug_print("📄 加载设置...")
-        self.load_settings() # 恢复加载设置
-        
-        # 与文件系统上的快捷方式状态同步
-        self.start_on_boot = self.is_startup_enabled()
-        debug_print(f"💡 开机自启状态: {self.start_on_boot}")
-        
-        debug_print("🖥️ 创建主窗口...")
-        self.create_main_window()
-        
-        debug_print("⌨️ 设置全局快捷键...")
-        self.setup_global_hotkeys()
-        
-        debug_print("📱 创建系统托盘...")
-        self.create_tray_icon()
-        
-        debug_print("✅ FakeLockScreen初始化完成")
+        self.save_brightness_probe({
+            'display': identity,
+            'backends': backends,
+            'probe_ms': round((time.perf_counter() - start_time) * 1000, 1),
+            'probed_at': time.time(),
+        })
+
+    def load_brightness_probe(self):
+        try:
+            with open(self.brightness_probe_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_brightness_probe(self, result):
+        try:
+            os.makedirs(self.user_config_dir, exist_ok=True)
+            temp_path = self.brightness_probe_file + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.brightness_probe_file)
+        except OSError as e:
+            debug_print(f"⚠ 保存亮度探测结果失败: {e}")
+
+    def schedule_lock(self):
+        """定时锁屏窗口开始；已手动锁屏时不接管"""
+        if self.is_locked:
+            return
+        self.schedule_locked = True
+        self.lock_screen('schedule')
+
+    def schedule_unlock(self):
+        """定时锁屏窗口结束，只解除由定时规则触发的锁屏"""
+        if self.schedule_locked:
+            self.unlock_screen('schedule')
+
+    def start_fleet_agent(self, address):
+        """以代理模式连接集中锁屏控制端，连接在后台事件循环中维持"""
+        try:
+            host, port = parse_host_port(address, default_host='127.0.0.1')
+        except ValueError:
+            debug_print(f"❌ 控制端地址无效: {address}")
+            return
+        token = load_fleet_token(self.settings_file)
+        if not token:
+            debug_print("❌ 代理模式需要设置 fleet_token（与控制端相同的共享令牌），未连接控制端")
+            return
+        debug_print(f"🛰️ 代理模式: 连接控制端 {host}:{port}")
+        self.fleet_agent = FleetAgent(host, port, self.handle_fleet_command, token)
+        self.fleet_agent_future = self.background.submit(self.fleet_agent.run())
+
+    async def handle_fleet_command(self, cmd):
+        """执行控制端下发的命令，在主线程完成锁定/解锁后返回当前锁定状态"""
+        if cmd == 'status':
+            return self.is_locked
+        if cmd == 'lock':
+            action = self._perform_lock_tasks
+        elif cmd == 'unlock':
+            action = self._perform_unlock_tasks
+        else:
+            raise ValueError(f"未知命令: {cmd}")
+        done = concurrent.futures.Future()
+
+        def run():
+            try:
+                action('fleet')
+            finally:
+                done.set_result(self.is_locked)
+        self.call_in_ui(run)
+        return await asyncio.wrap_future(done)
+
+    def report_startup(self, timeline):
+        """快捷键、托盘和主窗口都就绪后输出启动报告并写入指标"""
+        report = timeline.report()
+        report['tray_start'] = TRAY_START
+        rss = process_rss()
+        report['rss_mb'] = round(rss / (1024 * 1024), 2) if rss else None
+        self.metrics.set('startup', report)
+        debug_print(f"⏱️ 启动报告: 快捷键就绪 {report['hotkey_ready_ms']} ms, "
+                    f"托盘就绪 {report['tray_ready_ms']} ms, 主窗口就绪 {report['window_ready_ms']} ms")
+        for name, stage in report['stages'].items():
+            debug_print(f"   {name:<10} {stage['start_ms']:>8.1f} → {stage['end_ms']:>8.1f} ms  [{stage['thread']}]")
+        if STARTUP_REPORT:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+            self.call_in_ui(self.quit_application)
+
+    def call_in_ui(self, callback, *args):
+        """从任意线程把任务交给Tk主线程执行，这是后台线程访问Tk的唯一入口"""
+        self.ui_channel.post(callback, *args)
 
     def get_startup_folder(self):
         """获取Windows启动文件夹路径"""
@@ -176,7 +3343,7 @@ class FakeLockScreen:
         return os.path.exists(self.get_shortcut_path())
 
     def _manage_startup_shortcut(self, create=True):
-        """使用PowerShell创建或删除启动快捷方式"""
+        """使用PowerShell创建或删除启动快捷方式，在后台I/O线程中执行"""
         if os.name != 'nt':
             debug_print("ℹ️ 开机自启功能仅支持Windows。")
             return False
@@ -191,7 +3358,7 @@ class FakeLockScreen:
                     return True
                 except Exception as e:
                     debug_print(f"❌ 删除快捷方式失败: {e}")
-                    messagebox.showerror("错误", f"删除快捷方式失败: {e}")
+                    self.call_in_ui(messagebox.showerror, "错误", f"删除快捷方式失败: {e}")
                     return False
             return True # 不存在时，删除操作也视为成功
 
@@ -209,7 +3376,7 @@ class FakeLockScreen:
 $WshShell = New-Object -ComObject WScript.Shell
 $Shortcut = $WshShell.CreateShortcut('{shortcut_path}')
 $Shortcut.TargetPath = '{pythonw_exe}'
-$Shortcut.Arguments = '"{script_path}"'
+$Shortcut.Arguments = '"{script_path}" --tray'
 $Shortcut.WorkingDirectory = '{working_dir}'
 $Shortcut.WindowStyle = 1
 $Shortcut.IconLocation = '{pythonw_exe}, 0'
@@ -223,21 +3390,28 @@ $Shortcut.Save()
         except subprocess.CalledProcessError as e:
             error_message = f"创建快捷方式失败: {e.stderr}"
             debug_print(f"❌ {error_message}")
-            messagebox.showerror("错误", error_message)
+            self.call_in_ui(messagebox.showerror, "错误", error_message)
             return False
         except FileNotFoundError:
             debug_print(f"❌ 创建快捷方式失败: PowerShell未找到。")
-            messagebox.showerror("错误", "创建快捷方式失败: 未找到PowerShell, 请确保已安装。")
+            self.call_in_ui(messagebox.showerror, "错误", "创建快捷方式失败: 未找到PowerShell, 请确保已安装。")
             return False
 
     def toggle_startup(self):
-        """切换开机自启状态"""
+        """切换开机自启状态，快捷方式的创建/删除交给后台事件循环，可从任意线程调用"""
         new_status = not self.start_on_boot
-        success = self._manage_startup_shortcut(create=new_status)
+        self.background.submit(self._toggle_startup_async(new_status))
+
+    async def _toggle_startup_async(self, new_status):
+        success = await self.background.run_io(self._manage_startup_shortcut, new_status)
+        self.call_in_ui(self._finish_toggle_startup, new_status, success)
 
+    def _finish_toggle_startup(self, new_status, success):
+        """在Tk主线程中保存开机自启的切换结果"""
         if success:
             self.start_on_boot = new_status
             self.save_settings()
+            self.refresh_tray()
             status_msg = "启用" if self.start_on_boot else "禁用"
             debug_print(f"🔄 开机自启已{status_msg}")
         else:
@@ -256,9 +3430,8 @@ $Shortcut.Save()
             if os.path.exists(self.settings_file):
                 with open(self.settings_file, 'r', encoding='utf-8') as f:
                     settings = json.load(f)
-                    self.unlock_key = settings.get('unlock_key', 'ctrl+alt+u')
-                    self.lock_key = settings.get('lock_key', 'ctrl+alt+l')
-                    self.start_on_boot = settings.get('start_on_boot', False)
+                for key, attr, default in SETTINGS_FIELDS:
+                    setattr(self, attr, settings.get(key, default))
                 debug_print(f"✓ 已从 '{self.settings_file}' 加载设置。")
             else:
                 debug_print(f"ℹ️ 配置文件 '{self.settings_file}' 不存在，使用默认设置。")
@@ -273,11 +3446,7 @@ $Shortcut.Save()
                 os.makedirs(self.user_config_dir)
                 debug_print(f"✓ 已创建配置目录: {self.user_config_dir}")
 
-            settings = {
-                'unlock_key': self.unlock_key,
-                'lock_key': self.lock_key,
-                'start_on_boot': self.start_on_boot
-            }
+            settings = {key: getattr(self, attr) for key, attr, _ in SETTINGS_FIELDS}
             with open(self.settings_file, 'w', encoding='utf-8') as f:
                 json.dump(settings, f, ensure_ascii=False, indent=2)
             
@@ -292,9 +3461,67 @@ $Shortcut.Save()
             messagebox.showerror("保存失败", f"无法保存设置文件 '{self.settings_file}'。\n\n错误: {e}")
             return False
 
+    def read_settings_file(self):
+        """读取并解析配置文件，在I/O工作线程中执行；文件不存在或正在写入导致解析失败时返回None"""
+        try:
+            with open(self.settings_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            debug_print(f"⚠ 读取配置文件失败: {e}")
+            return None
+
+    async def reload_settings(self):
+        """配置文件变化后在I/O线程中解析，再交给主线程应用"""
+        settings = await self.background.run_io(self.read_settings_file)
+        if settings is not None:
+            self.call_in_ui(self.apply_settings, settings)
+
+    def apply_settings(self, settings):
+        """只应用发生变化的字段（在主线程中执行）"""
+        changed = set()
+        for key, attr, default in SETTINGS_FIELDS:
+            # 开机自启以快捷方式是否存在为准，不从文件同步
+            if key == 'start_on_boot':
+                continue
+            value = settings.get(key, default)
+            if value != getattr(self, attr):
+                setattr(self, attr, value)
+                changed.add(key)
+        if not changed:
+            return
+        debug_print(f"🔁 配置文件已更新: {', '.join(sorted(changed))}")
+        
+        if changed & {'unlock_key', 'lock_key'}:
+            self.update_key_labels()
+            # 锁屏期间沿用锁屏时编译的解锁组合键，解锁时会重新注册快捷键
+            if not self.is_locked:
+                self.setup_global_hotkeys()
+        if changed & {'passthrough_media', 'passthrough_keys'}:
+            self.reload_key_policy()
+        if 'lock_schedule' in changed:
+            self.scheduler.update(self.lock_schedule)
+        if changed & {'fleet_controller', 'fleet_token'} and not any(arg.startswith('--agent=') for arg in sys.argv):
+            if self.fleet_agent_future:
+                self.fleet_agent_future.cancel()
+                self.fleet_agent_future = None
+            if self.fleet_controller:
+                self.start_fleet_agent(self.fleet_controller)
+        if 'input_filter' in changed and not self.is_locked:
+            if self.input_filter == 'process':
+                self.start_input_filter()
+            else:
+                self.stop_input_filter()
+        if 'overlay_style' in changed and self.overlay_style != 'blur':
+            self.screen_blur.release()
+        # mouse_block、overlay_style、解锁口令和锁屏期间修改的input_filter在下次锁屏时生效
+
     def create_main_window(self):
         """创建主窗口"""
         self.main_window = tk.Tk()
+        if TRAY_START:
+            # 在首次绘制前隐藏根窗口，只留托盘图标
+            self.main_window.withdraw()
+        self.ui_channel.attach(self.main_window)
         self.main_window.title("假锁屏工具")
         self.main_window.geometry("550x400")
         self.main_window.resizable(False, False)
@@ -305,10 +3532,25 @@ $Shortcut.Save()
         x = (screen_width - 550) // 2
         y = (screen_height - 400) // 2
         self.main_window.geometry(f"550x400+{x}+{y}")
+        self.main_window.protocol("WM_DELETE_WINDOW", self.on_closing)
         
+        # 显示器拓扑在空闲时预先枚举，之后只在显示设置变更时刷新（等待半秒让设置稳定）
+        self.main_window.after_idle(self.display_topology.get, self.main_window)
+        try:
+            self.display_listener = install_display_change_listener(
+                self.main_window, lambda: self.main_window.after(500, self.refresh_displays))
+        except Exception as e:
+            debug_print(f"⚠ 无法监听显示设置变更: {e}")
+        
+        if not TRAY_START:
+            self.build_main_ui()
+
+    def build_main_ui(self):
+        """创建主窗口中的控件；隐藏到托盘时会销毁，再次显示时重建"""
         # 创建主框架
         main_frame = ttk.Frame(self.main_window, padding="20")
         main_frame.pack(fill=tk.BOTH, expand=True)
+        self.main_frame = main_frame
         
         # 标题
         title_label = ttk.Label(main_frame, text="假锁屏工具", font=("微软雅黑", 16, "bold"))
@@ -344,7 +3586,7 @@ $Shortcut.Save()
         button_frame = ttk.Frame(main_frame)
         button_frame.pack(fill=tk.X, pady=15)
         
-        ttk.Button(button_frame, text="锁定屏幕", command=self.lock_screen, width=12).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(button_frame, text="锁定屏幕", command=lambda: self.lock_screen('window'), width=12).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(button_frame, text="设置解锁键", command=self.set_unlock_key, width=12).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(button_frame, text="设置锁屏键", command=self.set_lock_key, width=12).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(button_frame, text="恢复默认", command=self.restore_default_keys, width=10).pack(side=tk.LEFT, padx=(0, 5))
@@ -354,40 +3596,135 @@ $Shortcut.Save()
         status_frame = ttk.Frame(main_frame)
         status_frame.pack(fill=tk.X, pady=(15, 0))
         
-        self.status_label = ttk.Label(status_frame, text="就绪", font=("微软雅黑", 9))
+        self.status_label = ttk.Label(status_frame, text=self.status_text, font=("微软雅黑", 9))
         self.status_label.pack(side=tk.LEFT)
         
         # 权限状态
-        admin_status = "管理员模式" if is_admin() else "普通模式"
-        admin_color = "green" if is_admin() else "orange"
+        admin = is_admin()
+        admin_status = "管理员模式" if admin else "普通模式"
+        admin_color = "green" if admin else "orange"
         admin_label = ttk.Label(status_frame, text=f"[{admin_status}]", font=("微软雅黑", 9), foreground=admin_color)
         admin_label.pack(side=tk.RIGHT)
-        
-        self.main_window.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+    def destroy_main_ui(self):
+        """销毁主窗口控件以减少驻留托盘时的内存占用，根窗口保留以运行主循环"""
+        if self.main_frame is None:
+            return
+        self.main_frame.destroy()
+        self.main_frame = None
+        self.status_label = None
+        self.unlock_key_label = None
+        self.lock_key_label = None
+        gc.collect()
+        debug_print("🧹 主窗口控件已释放")
+
+    def set_status(self, text):
+        """更新状态栏文字，主窗口控件未创建时只记录"""
+        self.status_text = text
+        if self.status_label:
+            self.status_label.config(text=text)
+
+    def update_key_labels(self):
+        """刷新主窗口中的快捷键显示"""
+        if self.unlock_key_label:
+            self.unlock_key_label.config(text=self.unlock_key)
+        if self.lock_key_label:
+            self.lock_key_label.config(text=self.lock_key)
 
     def create_lock_window(self):
-        """创建锁屏窗口"""
-        self.lock_window = tk.Toplevel()
-        self.lock_window.title("锁屏")
-        self.lock_window.attributes('-fullscreen', True)
-        self.lock_window.attributes('-topmost', True)
-        self.lock_window.configure(bg='black')
-        self.lock_window.overrideredirect(True)
-        self.lock_window.config(cursor="none")
-        
-        # 提示文字
-        hint_label = tk.Label(
-            self.lock_window,
-            text=f"按 {self.unlock_key.upper()} 解锁",
-            font=("微软雅黑", 16),
-            fg="gray",
-            bg="black",
-            cursor="none"
-        )
-        hint_label.place(relx=0.5, rely=0.5, anchor=tk.CENTER)
+        """为每个显示器创建一个锁屏遮罩，全部配置完成后在同一轮中映射，所有屏幕在同一帧内变黑"""
+        monitors = self.display_topology.get(self.main_window)
+        snapshot = None
+        if self.overlay_style == 'blur':
+            # 抓屏必须在遮罩映射之前完成；模糊和放大留到遮罩显示之后
+            try:
+                snapshot = self.screen_blur.capture(monitors)
+            except Exception as e:
+                debug_print(f"⚠ 抓取屏幕失败，使用黑色遮罩: {e}")
+        
+        overlays = []
+        for x, y, width, height, primary in monitors:
+            overlay = tk.Toplevel(self.main_window)
+            overlay.withdraw()
+            overlay.title("锁屏")
+            overlay.overrideredirect(True)
+            overlay.geometry(f"{width}x{height}+{x}+{y}")
+            overlay.attributes('-topmost', True)
+            overlay.configure(bg='black', cursor="none")
+            
+            if primary:
+                # 提示文字只显示在主显示器上
+                hint_label = tk.Label(
+                    overlay,
+                    text=f"按 {self.unlock_key.upper()} 解锁",
+                    font=("微软雅黑", 16),
+                    fg="gray",
+                    bg="black",
+                    cursor="none"
+                )
+                hint_label.place(relx=0.5, rely=0.5, anchor=tk.CENTER)
+            overlays.append(overlay)
+        
+        # 先完成所有遮罩的几何计算，再逐个映射，映射请求在同一次事件处理中提交
+        self.main_window.update_idletasks()
+        for overlay in overlays:
+            overlay.deiconify()
         
+        self.lock_windows = overlays
+        self.lock_window = overlays[0]
         self.lock_window.focus_force()
         self.lock_window.grab_set()
+        
+        if snapshot is not None:
+            # 先显示黑色遮罩保证锁屏延迟，随后在空闲时换上模糊背景
+            self.main_window.after_idle(self.show_blur_background, snapshot, monitors, overlays)
+            # 黑色遮罩本身已全黑，软件调暗只用于模糊背景
+            if self.dimming == 'software' or (self.dimming == 'auto' and not self.use_hardware_dimming()):
+                if self.dimmer.start(self.main_window, monitors):
+                    debug_print(f"🌑 软件调暗淡入 ({len(monitors)} 个显示器)")
+                else:
+                    debug_print("ℹ️ 窗口透明度不生效（X11需要合成管理器），未进行软件调暗")
+                self.lock_window.focus_force()
+
+    def use_hardware_dimming(self):
+        """auto 模式下有硬件亮度控制时用WMI调光，否则用软件调暗"""
+        return self.dimming == 'auto' and self.brightness_control_available
+
+    def show_blur_background(self, snapshot, monitors, overlays):
+        """把模糊后的桌面快照放到各遮罩底层"""
+        if self.lock_windows is not overlays:
+            return  # 已解锁或遮罩已重建
+        try:
+            start_time = time.perf_counter()
+            photos = self.screen_blur.render(snapshot, monitors, self.main_window)
+            for overlay, photo in zip(overlays, photos):
+                background = tk.Label(overlay, image=photo, bd=0, bg='black', cursor="none")
+                background.place(x=0, y=0, relwidth=1, relheight=1)
+                background.lower()
+            debug_print(f"🌫️ 模糊背景已显示 ({(time.perf_counter() - start_time) * 1000:.0f} ms)")
+        except Exception as e:
+            debug_print(f"⚠ 生成模糊背景失败: {e}")
+
+    def refresh_displays(self):
+        """显示设置变更后重新枚举显示器，锁屏期间同时重建遮罩"""
+        self.display_topology.invalidate()
+        self.display_topology.get(self.main_window)
+        # 换了显示器后硬件亮度控制可能变为可用或不可用
+        self.background.submit_io(self._init_brightness_control)
+        if self.is_locked and self.lock_windows:
+            self.destroy_lock_windows()
+            self.create_lock_window()
+
+    def destroy_lock_windows(self):
+        # 解锁时淡入可能尚未结束，先停止定时器
+        self.dimmer.cancel()
+        for overlay in self.lock_windows:
+            try:
+                overlay.destroy()
+            except tk.TclError:
+                pass
+        self.lock_windows = []
+        self.lock_window = None
 
     def setup_global_hotkeys(self):
         """设置全局快捷键"""
@@ -406,45 +3743,83 @@ $Shortcut.Save()
     def enable_keyboard(self):
         """启用键盘输入"""
         try:
+            if self.input_filter_process:
+                self.input_filter_process.unlock()
+                self.filter_watchdog.stop()
+            self.hook_watchdog.stop()
             keyboard.unhook_all()
             self.keyboard_hook = None
         except Exception as e:
             debug_print(f"启用键盘失败: {e}")
 
+    def reload_key_policy(self):
+        """重新编译按键放行策略，锁屏期间替换策略引用即可生效，无需重新安装钩子"""
+        self.key_policy = KeyPolicy.compile(self.passthrough_keys, include_media=self.passthrough_media)
+        if self.input_filter_process and self.is_locked:
+            self.input_filter_process.update_policy(self.key_policy)
+        debug_print(f"🔑 按键放行策略已编译: {len(self.key_policy.names)} 个按键, {self.key_policy.code_count} 个扫描码")
+
     def disable_keyboard(self):
         """禁用键盘输入"""
         try:
             keyboard.unhook_all()
             
-            unlock_keys = self.unlock_key.lower().split('+')
-            unlock_ctrl_needed = 'ctrl' in unlock_keys
-            unlock_alt_needed = 'alt' in unlock_keys
-            unlock_shift_needed = 'shift' in unlock_keys
-            unlock_main_key = [k for k in unlock_keys if k not in ['ctrl', 'alt', 'shift']]
-            unlock_main_key = unlock_main_key[0] if unlock_main_key else None
+            self.reload_key_policy()
+            chord = UnlockChord.compile(self.unlock_key)
             
-            def block_handler(event):
-                if not self.is_locked:
-                    return False
-                
-                if event.event_type == keyboard.KEY_DOWN and unlock_main_key and event.name == unlock_main_key:
-                    ctrl_pressed = keyboard.is_pressed('ctrl')
-                    alt_pressed = keyboard.is_pressed('alt')
-                    shift_pressed = keyboard.is_pressed('shift')
-                    
-                    if (unlock_ctrl_needed == ctrl_pressed and 
-                        unlock_alt_needed == alt_pressed and 
-                        unlock_shift_needed == shift_pressed):
-                        threading.Thread(target=self.unlock_screen, daemon=True).start()
-                        return True
-                
-                return True
+            def on_unlock(source):
+                # 交给后台事件循环转发，钩子回调本身不等待Tk
+                self.background.call_soon(self.unlock_screen, source)
+            
+            if self.input_filter == 'process':
+                if self.input_filter_process and self.input_filter_process.is_ready():
+                    # 钩子在过滤进程中执行，这里只写共享内存；探测和重新安装经管道由过滤进程完成
+                    self.input_filter_process.lock(chord, self.key_policy, self.unlock_passphrases)
+                    self.filter_watchdog.start(None)
+                    return
+                debug_print("⚠ 输入过滤进程未就绪，本次锁屏使用进程内钩子")
+                self.start_input_filter()
+            
+            passphrases = None
+            if self.unlock_passphrases:
+                try:
+                    passphrases = PassphraseMatcher(self.unlock_passphrases)
+                except (KeyError, ValueError, TypeError) as e:
+                    debug_print(f"⚠ 解锁口令配置无效: {e}")
             
-            self.keyboard_hook = keyboard.hook(block_handler, suppress=True)
+            block_handler = make_block_handler(self, chord, on_unlock, passphrases)
+            # 钩子由监视层安装：统计回调耗时，并在系统移除钩子后重新安装
+            self.keyboard_hook = self.hook_watchdog.start(block_handler)
             
         except Exception as e:
             debug_print(f"禁用键盘失败: {e}")
 
+    def start_input_filter(self):
+        """启动（或重启已退出的）输入过滤进程"""
+        if self.input_filter_process and self.input_filter_process.process.is_alive():
+            return
+        self.stop_input_filter()
+        if shared_memory is None:
+            debug_print("⚠ 独立输入过滤进程需要 Python 3.8+，使用进程内钩子")
+            return
+        try:
+            self.input_filter_process = InputFilterProcess(
+                lambda source: self.background.call_soon(self.unlock_screen, source))
+            self.filter_watchdog = HookWatchdog(self.input_filter_process, self.background, self.metrics)
+            self.input_filter_process.start()
+        except Exception as e:
+            debug_print(f"⚠ 启动输入过滤进程失败: {e}")
+            self.input_filter_process = None
+
+    def stop_input_filter(self):
+        if self.input_filter_process:
+            try:
+                self.filter_watchdog.stop()
+                self.input_filter_process.stop()
+            except Exception as e:
+                debug_print(f"⚠ 停止输入过滤进程失败: {e}")
+            self.input_filter_process = None
+
     def hide_mouse_cursor(self):
         """隐藏鼠标指针"""
         try:
@@ -490,6 +3865,13 @@ $Shortcut.Save()
             debug_print(f"⚠ 设置亮度失败: {e}")
         return False
 
+    def dim_for_lock(self):
+        """锁屏时保存当前亮度并调到最低，在I/O工作线程中执行"""
+        if self.save_current_brightness():
+            self.set_brightness(0)
+        else:
+            debug_print("⚠ 亮度保存失败，跳过亮度调节")
+
     def save_current_brightness(self):
         """保存当前亮度"""
         try:
@@ -524,17 +3906,17 @@ $Shortcut.Save()
             debug_print(f"⚠ 恢复亮度异常: {e}")
             return False
 
-    def lock_screen(self):
+    def lock_screen(self, source='hotkey'):
         """
-        触发器：锁定屏幕。
+        触发器：锁定屏幕。source为审计日志中记录的锁定来源。
         此方法是线程安全的，会将实际的锁定任务调度到主线程执行。
         """
         if self.is_locked:
             return
         # 将实际的锁定任务调度到Tkinter的主事件循环中
-        self.main_window.after(0, self._perform_lock_tasks)
+        self.call_in_ui(self._perform_lock_tasks, source)
 
-    def _perform_lock_tasks(self):
+    def _perform_lock_tasks(self, source='hotkey'):
         """
         执行所有锁定任务。必须在主线程上运行。
         """
@@ -543,19 +3925,23 @@ $Shortcut.Save()
             
         debug_print("🔒 开始锁定屏幕...")
         self.is_locked = True
-        self.status_label.config(text="屏幕已锁定")
+        self.locked_at = time.time()
+        self.lock_source = source
+        self.set_status("屏幕已锁定")
         
-        if self.brightness_control_available:
+        self.metrics.incr('lock_count')
+        self.enter_low_power_mode()
+        
+        if self.use_hardware_dimming():
             debug_print("🔅 调整屏幕亮度...")
-            if self.save_current_brightness():
-                self.set_brightness(0)
-            else:
-                debug_print("⚠ 亮度保存失败，跳过亮度调节")
+            self.background.submit_io(self.dim_for_lock)
         else:
-            debug_print("ℹ️ 亮度控制不可用")
+            debug_print(f"ℹ️ 不使用硬件调光 (dimming: {self.dimming}, 硬件亮度控制{'可用' if self.brightness_control_available else '不可用'})")
         
         debug_print("🖱️ 隐藏鼠标指针...")
         self.hide_mouse_cursor()
+        self.mouse_blocker.set_mode(self.mouse_block_mode)
+        self.mouse_blocker.install()
         
         if self.main_window:
             self.main_window.withdraw()
@@ -566,19 +3952,21 @@ $Shortcut.Save()
         debug_print("⌨️ 禁用键盘输入...")
         self.disable_keyboard()
         
+        # 锁屏窗口和钩子就绪后开始统计，只计入静止锁屏期间的唤醒
+        self.lock_cycle_snapshot = thread_snapshot()
         debug_print("✅ 锁屏完成")
 
-    def unlock_screen(self):
+    def unlock_screen(self, source='hotkey'):
         """
-        触发器：解锁屏幕。
+        触发器：解锁屏幕。source为审计日志中记录的解锁来源。
         此方法是线程安全的，会将实际的解锁任务调度到主线程执行。
         """
         if not self.is_locked:
             return
         # 将实际的解锁任务调度到Tkinter的主事件循环中
-        self.main_window.after(0, self._perform_unlock_tasks)
+        self.call_in_ui(self._perform_unlock_tasks, source)
 
-    def _perform_unlock_tasks(self):
+    def _perform_unlock_tasks(self, source='hotkey'):
         """
         执行所有解锁任务。必须在主线程上运行。
         """
@@ -587,12 +3975,15 @@ $Shortcut.Save()
             
         debug_print("🔓 开始解锁屏幕...")
         self.is_locked = False
+        self.audit.append(self.locked_at, time.time(), self.lock_source, source)
+        self.schedule_locked = False
         
         if self.brightness_control_available:
             debug_print("🔆 恢复屏幕亮度...")
-            self.restore_brightness()
+            self.background.submit_io(self.restore_brightness)
         
         debug_print("🖱️ 显示鼠标指针...")
+        self.mouse_blocker.uninstall()
         self.show_mouse_cursor()
         
         debug_print("⌨️ 启用键盘输入...")
@@ -609,28 +4000,119 @@ $Shortcut.Save()
         debug_print("🔄 重新注册快捷键...")
         self.setup_global_hotkeys()
         
-        if self.lock_window:
-            try:
-                self.lock_window.destroy()
-                self.lock_window = None
-                debug_print("🗑️ 锁屏窗口已销毁")
-            except:
-                pass
+        if self.lock_windows:
+            self.destroy_lock_windows()
+            debug_print("🗑️ 锁屏窗口已销毁")
         
         if self.main_window and self.main_window.state() != 'withdrawn':
             try:
                 self.main_window.deiconify()
                 self.main_window.lift()
-                self.status_label.config(text="屏幕已解锁")
+                self.set_status("屏幕已解锁")
                 self.main_window.config(cursor="arrow")
                 debug_print("🖥️ 主窗口已显示")
             except:
                 pass
         else:
-            self.status_label.config(text="屏幕已解锁")
+            self.set_status("屏幕已解锁")
+            # 托盘启动后从未显示过主窗口时没有控件需要释放
+            if self.main_frame is not None:
+                self.destroy_main_ui()
         
+        self.last_lock_report = self.report_lock_cycle()
+        self.leave_low_power_mode()
         debug_print("✅ 解锁完成")
 
+    def report_lock_cycle(self):
+        """统计一次锁屏周期内的线程数、唤醒次数、CPU占用和上下文切换次数"""
+        if not self.lock_cycle_snapshot:
+            return None
+        report = wakeup_report(self.lock_cycle_snapshot, thread_snapshot())
+        self.lock_cycle_snapshot = None
+        self.metrics.set('threads', report['threads'])
+        self.metrics.set('last_lock_cycle', report)
+        count, p50, p99, worst = self.ui_channel.summary()
+        self.metrics.set('ui_dispatch_ms', {'count': count, 'p50': round(p50, 3), 'p99': round(p99, 3), 'max': round(worst, 3)})
+        debug_print(f"📨 主线程命令延迟: p50 {p50:.2f} ms, p99 {p99:.2f} ms, 最大 {worst:.2f} ms ({count} 条)")
+        debug_print(f"🧵 锁屏周期统计: {report['seconds']} 秒, {report['threads']} 个线程, "
+                    f"CPU {report['cpu_ms_per_min']} ms/分钟")
+        if report['wakeups_per_s'] is not None:
+            debug_print(f"💤 唤醒 {report['wakeups_per_s']} 次/秒, 共 {report['ctx_switches']} 次上下文切换")
+            for name, rate in sorted(report['per_thread_wakeups_per_s'].items(), key=lambda kv: -kv[1]):
+                debug_print(f"   {name}: {rate} 次/秒")
+        else:
+            debug_print("💤 唤醒统计需要psutil（或Linux的/proc）")
+        return report
+
+    def enter_low_power_mode(self):
+        """锁屏期间的低唤醒模式：暂停周期性后台任务、指标写入和托盘刷新"""
+        self.metrics.pause()
+        self.background.call_soon(self.background.suspend_periodic)
+        if not tcl_is_threaded(self.main_window):
+            debug_print("⚠ 当前Tcl不是线程版本，Tk主循环会以20ms间隔轮询，锁屏期间无法完全静默")
+
+    def leave_low_power_mode(self):
+        """退出低唤醒模式，恢复暂停的任务并补做推迟的刷新"""
+        self.background.call_soon(self.background.resume_periodic)
+        self.metrics.resume()
+        self.refresh_tray()
+
+    def refresh_tray(self):
+        """刷新托盘菜单状态；锁屏期间推迟到解锁后"""
+        if self.is_locked or not self.tray_icon:
+            return
+        try:
+            self.tray_icon.update_menu()
+        except Exception as e:
+            debug_print(f"⚠ 刷新托盘菜单失败: {e}")
+
+    def measure_locked(self, seconds):
+        """锁屏指定秒数后解锁，报告锁屏期间的唤醒次数和CPU占用，然后退出"""
+        def finish():
+            self._perform_unlock_tasks('script')
+            report = self.last_lock_report or {}
+            print(f"💤 锁屏 {report.get('seconds')} 秒: 唤醒 {report.get('wakeups_per_s')} 次/秒, "
+                  f"CPU {report.get('cpu_ms_per_min')} ms/分钟, {report.get('threads')} 个线程")
+            for name, rate in sorted(report.get('per_thread_wakeups_per_s', {}).items(), key=lambda kv: -kv[1]):
+                print(f"   {name}: {rate} 次/秒")
+            self.quit_application()
+
+        self._perform_lock_tasks('script')
+        self.main_window.after(int(seconds * 1000), finish)
+
+    def run_profile_cycles(self, profiler, cycles, hold_ms=1000):
+        """分析模式：执行指定次数的锁屏/解锁，锁屏期间发送合成按键经过钩子，然后写出分析结果并退出"""
+        def lock(remaining):
+            if remaining == 0:
+                finish()
+                return
+            self._perform_lock_tasks('script')
+            self.main_window.after(hold_ms // 2, send_keys)
+            self.main_window.after(hold_ms, unlock, remaining)
+
+        def send_keys():
+            # 合成按键同样经过低级键盘钩子并被屏蔽，用于覆盖钩子线程
+            try:
+                for name in 'profile':
+                    keyboard.press_and_release(name)
+            except Exception as e:
+                debug_print(f"⚠ 发送合成按键失败: {e}")
+
+        def unlock(remaining):
+            self._perform_unlock_tasks('script')
+            self.main_window.after(hold_ms // 2, lock, remaining - 1)
+
+        def finish():
+            profiler.stop()
+            pstats_path, collapsed_path = profiler.write(os.path.join(self.user_config_dir, "profiles"))
+            print(f"📊 分析完成 ({profiler.mode}, {profiler.sample_count} 次采样, {cycles} 次锁屏周期)")
+            print(f"  {pstats_path}")
+            print(f"  {collapsed_path}")
+            self.quit_application()
+
+        debug_print(f"📊 开始脚本化锁屏周期: {cycles} 次")
+        lock(cycles)
+
     def set_unlock_key(self):
         """设置解锁快捷键"""
         if self.capturing_key:
@@ -663,7 +4145,7 @@ $Shortcut.Save()
         def save_key():
             if hasattr(self, 'new_unlock_key') and self.new_unlock_key:
                 self.unlock_key = self.new_unlock_key
-                self.unlock_key_label.config(text=self.unlock_key)
+                self.update_key_labels()
                 self.save_settings()
                 self.setup_global_hotkeys()
                 self.capturing_key = False
@@ -749,7 +4231,7 @@ $Shortcut.Save()
         def save_key():
             if hasattr(self, 'new_lock_key') and self.new_lock_key:
                 self.lock_key = self.new_lock_key
-                self.lock_key_label.config(text=self.lock_key)
+                self.update_key_labels()
                 self.save_settings()
                 self.setup_global_hotkeys()
                 self.capturing_key = False
@@ -815,8 +4297,7 @@ $Shortcut.Save()
             self.lock_key = default_lock_key
             
             # 更新UI显示
-            self.unlock_key_label.config(text=self.unlock_key)
-            self.lock_key_label.config(text=self.lock_key)
+            self.update_key_labels()
             
             # 保存并重新注册快捷键
             if self.save_settings():
@@ -830,6 +4311,8 @@ $Shortcut.Save()
     def create_tray_icon(self):
         """创建系统托盘图标"""
         def create_icon():
+            # 按需导入，只在创建托盘图标时加载ImageDraw
+            from PIL import Image, ImageDraw
             image = Image.new('RGB', (64, 64), color='black')
             draw = ImageDraw.Draw(image)
             draw.ellipse([16, 16, 48, 48], fill='white')
@@ -837,17 +4320,16 @@ $Shortcut.Save()
             return image
 
         def show_window(icon, item):
-            self.main_window.deiconify()
-            self.main_window.lift()
+            self.call_in_ui(self.show_main_window)
 
         def lock_from_tray(icon, item):
-            self.lock_screen()
+            self.lock_screen('tray')
 
         def toggle_startup_wrapper(icon, item):
             self.toggle_startup()
 
         def quit_app(icon, item):
-            self.quit_application()
+            self.call_in_ui(self.quit_application)
 
         menu = pystray.Menu(
             pystray.MenuItem("显示主窗口", show_window),
@@ -860,18 +4342,54 @@ $Shortcut.Save()
             pystray.MenuItem("退出", quit_app)
         )
 
-        self.tray_icon = pystray.Icon("FakeLockScreen", create_icon(), "假锁屏工具", menu)
+        def on_ready(icon):
+            icon.visible = True
+            self.startup.finish('tray', tray_start)
         
         def run_tray():
-            self.tray_icon.run()
+            # 图标在托盘线程中绘制，与主窗口创建并行
+            self.tray_icon = pystray.Icon("FakeLockScreen", create_icon(), "假锁屏工具", menu)
+            self.tray_icon.run(setup=on_ready)
             
+        tray_start = self.startup.now_ms()
         tray_thread = threading.Thread(target=run_tray, daemon=True)
         tray_thread.start()
 
+    def show_main_window(self):
+        """显示主窗口"""
+        if self.main_frame is None:
+            self.build_main_ui()
+        self.main_window.deiconify()
+        self.main_window.lift()
+
     def hide_to_tray(self):
         """隐藏到系统托盘"""
         self.main_window.withdraw()
-        self.status_label.config(text="已最小化到系统托盘")
+        self.set_status("已最小化到系统托盘")
+        self.destroy_main_ui()
+        if DEBUG_MODE:
+            log_footprint("托盘驻留")
+
+    def write_footprint_report(self, path):
+        """
+        写入托盘驻留状态的内存占用报告后退出，超出内存目标时退出码为2。
+        目标取自打包预算文件的max_idle_rss_mb；打包后的exe中没有该文件，由打包脚本对照预算检查。
+        """
+        gc.collect()
+        report = footprint_report()
+        try:
+            with open(BUILD_BUDGETS_FILE, 'r', encoding='utf-8') as f:
+                target = json.load(f).get('max_idle_rss_mb')
+        except (OSError, ValueError):
+            target = None
+        report['rss_target_mb'] = target
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            debug_print(f"❌ 写入内存报告失败: {e}")
+        over_budget = None not in (report['rss_mb'], target) and report['rss_mb'] > target
+        self.quit_application(exit_code=2 if over_budget else 0)
 
     def on_closing(self):
         """窗口关闭事件"""
@@ -880,13 +4398,22 @@ $Shortcut.Save()
         else:
             self.hide_to_tray()
 
-    def quit_application(self):
+    def quit_application(self, exit_code=0):
         """退出应用程序"""
         try:
             if self.is_locked:
-                self.unlock_screen()
+                self._perform_unlock_tasks('quit')
             
             keyboard.unhook_all()
+            self.stop_input_filter()
+            self.mouse_blocker.uninstall()
+            
+            # 执行完排队的亮度恢复等I/O后停止后台事件循环，再写入最终指标
+            self.scheduler.stop()
+            self.settings_watcher.stop()
+            self.background.stop()
+            self.metrics.flush()
+            self.audit.flush()
             
             if self.tray_icon:
                 self.tray_icon.stop()
@@ -896,10 +4423,16 @@ $Shortcut.Save()
         except:
             pass
         finally:
-            sys.exit()
+            sys.exit(exit_code)
 
     def run(self):
         """运行应用程序"""
+        if FOOTPRINT_REPORT:
+            self.main_window.after_idle(self.hide_to_tray)
+            self.main_window.after(2000, self.write_footprint_report, FOOTPRINT_REPORT)
+        elif SELFTEST_EXIT and not STARTUP_REPORT:
+            # 空闲回调在首个窗口绘制完成后执行
+            self.main_window.after_idle(self.quit_application)
         try:
             self.main_window.mainloop()
         except KeyboardInterrupt:
@@ -908,6 +4441,38 @@ $Shortcut.Save()
 if __name__ == "__main__":
     # 不再需要 'global startup_log'，因为它已经在顶层定义了
     
+    # 打包后的exe中启动输入过滤子进程需要，必须在其他代码之前调用
+    multiprocessing.freeze_support()
+    
+    # 诊断等命令行工具，不需要单例和管理员权限（基准测试见 bench.py）
+    if "--show-displays" in sys.argv:
+        root = tk.Tk()
+        root.withdraw()
+        for monitor in DisplayTopology().get(root):
+            print(f"🖥️ {monitor[2]}x{monitor[3]} @ ({monitor[0]}, {monitor[1]}){' 主显示器' if monitor[4] else ''}")
+        root.destroy()
+        sys.exit()
+    audit_arg = [arg for arg in sys.argv if arg.startswith('--audit-summary')]
+    if audit_arg:
+        days = audit_arg[0].partition('=')[2]
+        summarize_audit(AuditLog(os.path.join(os.path.expanduser("~"), ".fakelockscreen", "audit")), int(days) if days else 90)
+        sys.exit()
+    passphrase_arg = [arg for arg in sys.argv if arg.startswith('--add-passphrase')]
+    if passphrase_arg:
+        sys.exit(0 if prompt_add_passphrase(passphrase_arg[0].partition('=')[2] or "默认") else 1)
+    controller_arg = [arg for arg in sys.argv if arg.startswith('--fleet-controller=')]
+    if controller_arg:
+        host, port = parse_host_port(controller_arg[0].split('=', 1)[1])
+        token = load_fleet_token(os.path.join(os.path.expanduser("~"), ".fakelockscreen", "lock_settings.json"))
+        if not token:
+            print(f"❌ 请用环境变量 {FLEET_TOKEN_ENV} 或配置文件中的 fleet_token 设置共享令牌，"
+                  f"例如: {secrets.token_hex(16)}")
+            sys.exit(1)
+        asyncio.run(run_fleet_console(host, port, token))
+        sys.exit()
+
+    ensure_single_instance()
+
     debug_print("🔍 程序启动中...")
     
     # 检查是否有传递过来的日志文件
@@ -917,6 +4482,8 @@ if __name__ == "__main__":
     if "--debug" in sys.argv:
         DEBUG_MODE = True
         import time
+        # 调试模式下跟踪分配，内存报告中按模块汇总
+        tracemalloc.start()
         
         if log_file_arg:
             # 如果有日志文件参数，直接使用它
@@ -938,8 +4505,8 @@ if __name__ == "__main__":
     
     debug_print("🔐 检查管理员权限...")
     
-    # 检查并请求管理员权限
-    if not run_as_admin():
+    # 检查并请求管理员权限（自检模式下不弹出UAC）
+    if not SELFTEST_EXIT and not run_as_admin():
         debug_print("🔄 重新以管理员身份启动...")
         sys.exit()
     
@@ -948,10 +4515,24 @@ if __name__ == "__main__":
     else:
         debug_print("⚠ 以普通权限运行，某些功能可能受限")
     
+    profiler = None
+    profile_arg = [arg for arg in sys.argv if arg.startswith('--profile=')]
+    if profile_arg:
+        # 在初始化之前开始采样，覆盖启动过程
+        profiler = ProcessProfiler('wall' if profile_arg[0].split('=', 1)[1] == 'wall' else 'cpu')
+        profiler.start()
+    
     try:
         debug_print("🚀 初始化应用程序...")
         app = FakeLockScreen()
         debug_print("✅ 应用程序初始化完成")
+        measure_arg = [arg for arg in sys.argv if arg.startswith('--measure-locked=')]
+        if measure_arg:
+            app.main_window.after(1000, app.measure_locked, float(measure_arg[0].split('=', 1)[1]))
+        if profiler:
+            cycles_arg = [arg for arg in sys.argv if arg.startswith('--profile-cycles=')]
+            cycles = int(cycles_arg[0].split('=', 1)[1]) if cycles_arg else 5
+            app.main_window.after(1000, app.run_profile_cycles, profiler, cycles)
         debug_print("🎯 启动主循环...")
         app.run()
     except Exception as e:
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "xvfb: 需要X显示（Linux上在Xvfb中运行，例如 xvfb-run python -m pytest）")
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    """导入主程序模块；缺少运行依赖（keyboard、pystray、Pillow）时跳过"""
+    return pytest.importorskip("fake_lock_screen")
+
+
+@pytest.fixture
+def tk_root(app_module):
+    """需要X显示的测试使用的隐藏Tk根窗口，没有可用显示时跳过"""
+    tk = app_module.tk
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        pytest.skip(f"没有可用的显示: {e}")
+    root.withdraw()
+    yield root
+    root.destroy()
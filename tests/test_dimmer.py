@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+pytestmark = pytest.mark.xvfb
+
+MONITORS = [(0, 0, 320, 240, True), (320, 0, 320, 240, False), (-320, 0, 320, 240, False)]
+
+
+@pytest.fixture
+def dimmer(app_module, tk_root, monkeypatch):
+    # Xvfb没有合成管理器，透明度不会生效；这里只测试淡入的调度
+    monkeypatch.setattr(app_module, 'translucency_supported', lambda widget: True)
+    dimmer = app_module.SoftwareDimmer()
+    yield dimmer
+    dimmer.cancel()
+
+
+def run_for(root, ms):
+    root.after(ms, root.quit)
+    root.mainloop()
+
+
+def test_ramp_reaches_target_and_stops_timer(dimmer, tk_root):
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    assert dimmer.start(tk_root, MONITORS, duration_ms=300)
+    run_for(tk_root, 600)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    assert not dimmer.ramping
+    assert dimmer.alpha == pytest.approx(dimmer.target)
+    for window in dimmer.windows:
+        assert float(window.attributes('-alpha')) == pytest.approx(dimmer.target, abs=0.01)
+    # 单个定时器、固定帧间隔
+    frames, p50, p99, worst = dimmer.pacing()
+    assert frames <= 300 / dimmer.FRAME_MS + 3
+    assert dimmer.FRAME_MS * 0.5 <= p50 <= dimmer.FRAME_MS * 2
+    assert dimmer.updates <= dimmer.MAX_UPDATES_PER_SECOND
+    assert cpu < wall * 0.5
+
+    # 到达目标后不再有帧
+    frames = len(dimmer.frame_times)
+    run_for(tk_root, 200)
+    assert len(dimmer.frame_times) == frames
+
+
+def test_attribute_updates_are_capped(dimmer, tk_root):
+    dimmer.MAX_UPDATES_PER_SECOND = 12
+    assert dimmer.start(tk_root, MONITORS, duration_ms=500)
+    run_for(tk_root, 900)
+    # 3个窗口，每秒最多12次属性更新，即最多4帧生效
+    assert dimmer.updates <= dimmer.MAX_UPDATES_PER_SECOND
+    assert dimmer.skipped_frames > 0
+
+
+def test_cancel_mid_fade_removes_windows(dimmer, tk_root):
+    assert dimmer.start(tk_root, MONITORS, duration_ms=600)
+    run_for(tk_root, 200)
+    assert dimmer.ramping
+    assert 0 < dimmer.alpha < dimmer.target
+    windows = list(dimmer.windows)
+
+    dimmer.cancel()
+    frames = len(dimmer.frame_times)
+    run_for(tk_root, 200)
+
+    assert not dimmer.ramping
+    assert dimmer.windows == []
+    assert not any(window.winfo_exists() for window in windows)
+    assert len(dimmer.frame_times) == frames
+
+
+def test_no_windows_without_translucency(app_module, tk_root, monkeypatch):
+    monkeypatch.setattr(app_module, 'translucency_supported', lambda widget: False)
+    dimmer = app_module.SoftwareDimmer()
+    assert not dimmer.start(tk_root, MONITORS)
+    assert dimmer.windows == []
+    assert not dimmer.ramping
+
+
+def test_translucency_detection_on_x11(app_module, tk_root):
+    if tk_root.tk.call('tk', 'windowingsystem') != 'x11':
+        pytest.skip("只适用于X11")
+    assert isinstance(app_module.translucency_supported(tk_root), bool)
+    # 无法连接的显示按不支持处理
+    assert app_module._x11_compositor_running(':9999') is False
@@ -0,0 +1,109 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+# 三台显示器，主显示器（带 *）不在第一行
+XRANDR_OUTPUT = """Monitors: 3
+ 0: +DP-1 1920/527x1080/296+0+0  DP-1
+ 1: +*HDMI-1 1280/338x1024/270+1920+0  HDMI-1
+ 2: +DP-2 1024/300x768/200+3200+56  DP-2
+"""
+EXPECTED = [
+    (1920, 0, 1280, 1024, True),
+    (0, 0, 1920, 1080, False),
+    (3200, 56, 1024, 768, False),
+]
+
+
+class FakeScreen:
+    """只提供DisplayTopology用到的winfo方法"""
+
+    def __init__(self, width=6000, height=1200):
+        self.width = width
+        self.height = height
+
+    def winfo_screenwidth(self):
+        return self.width
+
+    def winfo_screenheight(self):
+        return self.height
+
+    def winfo_vrootwidth(self):
+        return self.width
+
+    def winfo_vrootheight(self):
+        return self.height
+
+
+@pytest.fixture
+def fake_xrandr(app_module, monkeypatch):
+    if os.name == 'nt':
+        pytest.skip("Windows使用EnumDisplayMonitors")
+    calls = []
+
+    def run(args, **kwargs):
+        calls.append(args)
+        return SimpleNamespace(stdout=XRANDR_OUTPUT, returncode=0)
+
+    monkeypatch.setenv('DISPLAY', os.environ.get('DISPLAY', ':99'))
+    monkeypatch.setattr(app_module.subprocess, 'run', run)
+    return calls
+
+
+def test_parse_xrandr_monitors(app_module):
+    monitors = app_module.parse_xrandr_monitors(XRANDR_OUTPUT)
+    assert sorted(monitors) == sorted(EXPECTED)
+
+
+def test_topology_primary_first_and_cached(app_module, fake_xrandr):
+    topology = app_module.DisplayTopology()
+    screen = FakeScreen()
+    assert topology.get(screen) == EXPECTED
+    assert topology.get(screen) == EXPECTED
+    assert len(fake_xrandr) == 1
+
+    # 签名变化（虚拟桌面范围改变）时重新枚举
+    screen.width = 4000
+    topology.get(screen)
+    assert len(fake_xrandr) == 2
+
+    topology.invalidate()
+    topology.get(screen)
+    assert topology.enumerations == 3
+
+
+def test_topology_falls_back_to_tk_screen(app_module, monkeypatch):
+    if os.name == 'nt':
+        pytest.skip("Windows使用EnumDisplayMonitors")
+    monkeypatch.delenv('DISPLAY', raising=False)
+    assert app_module.DisplayTopology().get(FakeScreen(800, 600)) == [(0, 0, 800, 600, True)]
+
+
+@pytest.mark.xvfb
+def test_one_overlay_per_monitor(app_module, tk_root, fake_xrandr, monkeypatch):
+    tk = app_module.tk
+    # 测试中不抢占输入
+    monkeypatch.setattr(tk.Toplevel, 'grab_set', lambda self: None, raising=False)
+    app = SimpleNamespace(
+        display_topology=app_module.DisplayTopology(),
+        main_window=tk_root,
+        overlay_style='black',
+        unlock_key='ctrl+alt+u',
+        lock_windows=[],
+        lock_window=None,
+    )
+    app_module.FakeLockScreen.create_lock_window(app)
+    tk_root.update()
+    try:
+        assert len(app.lock_windows) == len(EXPECTED)
+        assert app.lock_window is app.lock_windows[0]
+        for overlay, (x, y, width, height, primary) in zip(app.lock_windows, EXPECTED):
+            assert overlay.wm_geometry() == f"{width}x{height}+{x}+{y}"
+            assert overlay.overrideredirect()
+            hints = [child for child in overlay.winfo_children()
+                     if isinstance(child, tk.Label) and "解锁" in child.cget('text')]
+            assert len(hints) == (1 if primary else 0)
+    finally:
+        for overlay in app.lock_windows:
+            overlay.destroy()
@@ -0,0 +1,139 @@
+import asyncio
+import json
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 20))
+
+
+def make_agent(app_module, port, token, states):
+    async def handler(cmd):
+        states.append(cmd)
+        return cmd == 'lock'
+    return app_module.FleetAgent('127.0.0.1', port, handler, token, name='pc-1')
+
+
+def test_default_bind_is_loopback(app_module):
+    assert app_module.parse_host_port('47800') == ('127.0.0.1', 47800)
+    assert app_module.parse_host_port('0.0.0.0:47800') == ('0.0.0.0', 47800)
+
+
+def test_authenticated_agent_executes_commands(app_module):
+    async def scenario():
+        controller = app_module.FleetController('127.0.0.1', 0, 'secret-token')
+        await controller.start()
+        states = []
+        task = asyncio.ensure_future(make_agent(app_module, controller.port, 'secret-token', states).run())
+        assert await controller.wait_for_agents(1, timeout=5) == 1
+        result = await controller.broadcast('lock')
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await controller.close()
+        return result, states
+
+    result, states = run(scenario())
+    assert result['acked'] == 1 and result['locked'] == 1
+    assert states == ['lock']
+
+
+def test_agent_with_wrong_token_is_rejected(app_module):
+    async def scenario():
+        controller = app_module.FleetController('127.0.0.1', 0, 'secret-token')
+        await controller.start()
+        task = asyncio.ensure_future(make_agent(app_module, controller.port, 'wrong-token', []).run())
+        connected = await controller.wait_for_agents(1, timeout=1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await controller.close()
+        return connected, controller.rejected
+
+    connected, rejected = run(scenario())
+    assert connected == 0
+    assert rejected >= 1
+
+
+def test_agent_rejects_impostor_and_unsigned_commands(app_module):
+    async def scenario():
+        seen = {}
+
+        async def impostor(reader, writer):
+            # 不知道令牌的“控制端”：无法给出有效证明
+            await reader.readline()  # hello
+            writer.write(app_module.encode_message({'type': 'welcome', 'nonce': 'x', 'proof': 'bad'}))
+            await writer.drain()
+            seen['after_welcome'] = await reader.readline()
+            writer.close()
+
+        server = await asyncio.start_server(impostor, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        states = []
+        agent = make_agent(app_module, port, 'secret-token', states)
+        task = asyncio.ensure_future(agent.run())
+        for _ in range(100):
+            if 'after_welcome' in seen:
+                break
+            await asyncio.sleep(0.02)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        server.close()
+        await server.wait_closed()
+        return seen, states
+
+    seen, states = run(scenario())
+    assert seen['after_welcome'] == b''  # 代理没有发送auth就断开
+    assert states == []
+
+
+def test_unsigned_command_is_not_executed(app_module):
+    async def scenario():
+        token = 'secret-token'
+        replies = []
+
+        async def controller(reader, writer):
+            hello = json.loads(await reader.readline())
+            nonce = 'c' * 32
+            writer.write(app_module.encode_message({
+                'type': 'welcome', 'nonce': nonce,
+                'proof': app_module.fleet_mac(token.encode(), 'controller', hello['nonce'], nonce)}))
+            await writer.drain()
+            await reader.readline()  # auth
+            key = app_module.fleet_session_key(token, hello['nonce'], nonce)
+            writer.write(app_module.encode_message({'id': 1, 'cmd': 'unlock'}))
+            writer.write(app_module.encode_message({'id': 2, 'cmd': 'lock', 'mac': 'forged'}))
+            writer.write(app_module.encode_message({'id': 3, 'cmd': 'lock', 'mac': app_module.fleet_mac(key, 3, 'lock')}))
+            # 重放旧id
+            writer.write(app_module.encode_message({'id': 3, 'cmd': 'lock', 'mac': app_module.fleet_mac(key, 3, 'lock')}))
+            await writer.drain()
+            for _ in range(4):
+                replies.append(json.loads(await reader.readline()))
+            writer.close()
+
+        server = await asyncio.start_server(controller, '127.0.0.1', 0)
+        states = []
+        task = asyncio.ensure_future(make_agent(app_module, server.sockets[0].getsockname()[1], token, states).run())
+        for _ in range(200):
+            if len(replies) == 4:
+                break
+            await asyncio.sleep(0.02)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        server.close()
+        await server.wait_closed()
+        return replies, states
+
+    replies, states = run(scenario())
+    assert [reply['ok'] for reply in replies] == [False, False, True, False]
+    assert states == ['lock']
+
+
+def test_token_comes_from_environment_or_settings(app_module, tmp_path, monkeypatch):
+    settings_file = tmp_path / "lock_settings.json"
+    settings_file.write_text(json.dumps({'fleet_token': 'from-file'}), encoding='utf-8')
+    monkeypatch.delenv(app_module.FLEET_TOKEN_ENV, raising=False)
+    # 命令行中的令牌会出现在进程列表中，不再接受
+    monkeypatch.setattr(app_module.sys, 'argv', ['fake_lock_screen.py', '--fleet-token=from-argv'])
+    assert app_module.load_fleet_token(str(settings_file)) == 'from-file'
+    monkeypatch.setenv(app_module.FLEET_TOKEN_ENV, 'from-env')
+    assert app_module.load_fleet_token(str(settings_file)) == 'from-env'
+    monkeypatch.delenv(app_module.FLEET_TOKEN_ENV)
+    assert app_module.load_fleet_token(str(tmp_path / "missing.json")) == ''
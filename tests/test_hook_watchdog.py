@@ -0,0 +1,155 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+
+class FakeBackground:
+    """手动推进的后台事件循环：tick() 执行一次周期探测和其后的超时检查"""
+
+    def __init__(self):
+        self.periodic = {}
+        self.timers = []
+        self.loop = SimpleNamespace(call_later=lambda delay, callback: self.timers.append(callback))
+
+    def add_periodic(self, name, interval, callback, keep_when_locked=False):
+        assert keep_when_locked, "锁屏低唤醒模式下探测必须继续"
+        self.periodic[name] = callback
+
+    def remove_periodic(self, name):
+        self.periodic.pop(name, None)
+
+    def tick(self):
+        for callback in list(self.periodic.values()):
+            callback()
+        timers, self.timers = self.timers, []
+        for callback in timers:
+            callback()
+
+
+class FakeMetrics:
+    def __init__(self):
+        self.values = {}
+
+    def incr(self, name, amount=1):
+        self.values[name] = self.values.get(name, 0) + amount
+
+    def set(self, name, value):
+        self.values[name] = value
+
+
+def make_watchdog(app_module):
+    backend = app_module.FakeHookBackend()
+    background = FakeBackground()
+    metrics = FakeMetrics()
+    watchdog = app_module.HookWatchdog(backend, background, metrics, interval=0.05)
+    handled = []
+    watchdog.start(lambda event: handled.append(event.name) or False)
+    return watchdog, backend, background, metrics, handled
+
+
+def test_probes_arriving_keep_hook(app_module):
+    watchdog, backend, background, metrics, handled = make_watchdog(app_module)
+    for _ in range(5):
+        background.tick()
+    assert watchdog.probes == 5
+    assert watchdog.missed == 0
+    assert watchdog.reinstalls == 0
+    assert backend.installs == 1
+    assert 'hook_lost' not in metrics.values
+    # 探测按键由监视层屏蔽，不进入锁屏回调
+    assert handled == []
+
+
+def test_two_missed_probes_reinstall_and_alarm(app_module):
+    watchdog, backend, background, metrics, handled = make_watchdog(app_module)
+    background.tick()
+    backend.drop = True
+
+    background.tick()
+    assert watchdog.missed == 1
+    assert watchdog.reinstalls == 0
+
+    background.tick()
+    assert watchdog.missed == 2
+    assert watchdog.reinstalls == 1
+    assert backend.installs == 2
+    assert metrics.values['hook_lost'] == 1
+
+    # 重新安装后事件恢复到达
+    event = SimpleNamespace(event_type='down', scan_code=30, name='a')
+    assert backend.deliver(event) is False
+    assert handled == ['a']
+    background.tick()
+    assert watchdog.missed == 2
+
+
+def test_handler_latency_and_stop(app_module):
+    watchdog, backend, background, metrics, handled = make_watchdog(app_module)
+    watchdog.SLOW_MS = 1
+
+    def slow_handler(event):
+        time.sleep(0.005)
+        return False
+
+    watchdog.stop()
+    watchdog.start(slow_handler)
+    backend.deliver(SimpleNamespace(event_type='down', scan_code=30, name='a'))
+    count, p50, p99, worst = watchdog.summary()
+    assert count == 1 and worst >= 5
+    assert watchdog.slow_events == 1
+
+    watchdog.stop()
+    assert background.periodic == {}
+    assert backend.handler is None
+    assert 'hook_handler_p99_ms' in metrics.values
+
+
+def test_detection_with_background_loop(app_module, tmp_path):
+    background = app_module.BackgroundLoop()
+    background.start()
+    try:
+        metrics = app_module.Metrics(str(tmp_path / "metrics.json"), background)
+        backend = app_module.FakeHookBackend()
+        watchdog = app_module.HookWatchdog(backend, background, metrics, interval=0.02)
+        watchdog.start(lambda event: False)
+        backend.drop = True
+        deadline = time.monotonic() + 5
+        while watchdog.reinstalls == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert watchdog.reinstalls >= 1
+        assert metrics.values['hook_lost'] >= 1
+        watchdog.stop()
+    finally:
+        background.stop()
+
+
+def test_filter_process_reports_probes(app_module):
+    """独立过滤进程模式：子进程钩子收到的探测经管道回报，送入本进程的监视层回调"""
+    if app_module.shared_memory is None:
+        pytest.skip("需要 multiprocessing.shared_memory")
+    context = app_module.multiprocessing.get_context('spawn')
+    source_conn, event_conn = context.Pipe()
+    filter_process = app_module.InputFilterProcess(lambda source: None, event_conn)
+    filter_process.start()
+    try:
+        assert filter_process.ready.wait(30)
+        watchdog = app_module.HookWatchdog(filter_process, FakeBackground(), FakeMetrics())
+        watchdog.start(None)
+        filter_process.lock(app_module.UnlockChord.compile("ctrl+alt+u"),
+                           app_module.KeyPolicy.compile((), include_media=True))
+        watchdog._probe_sent_at = time.perf_counter()
+        source_conn.send((-1, 'down', watchdog.PROBE_KEY))
+        # 探测按键在过滤进程中被屏蔽
+        assert source_conn.recv() is False
+        deadline = time.monotonic() + 5
+        while not watchdog._probe_seen and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert watchdog._probe_seen
+        assert len(watchdog.probe_rtt) == 1
+
+        watchdog.stop()
+        assert filter_process._probe_handler is None
+    finally:
+        filter_process.stop()
+        source_conn.close()
@@ -0,0 +1,59 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_filter_hook_installed_only_while_locked(app_module, monkeypatch):
+    """过滤进程入口只在锁屏期间安装键盘钩子，解锁后卸载（在线程中运行入口，用测试后端代替系统钩子）"""
+    if app_module.shared_memory is None:
+        pytest.skip("需要 multiprocessing.shared_memory")
+    backends = []
+
+    def make_backend():
+        backends.append(app_module.FakeHookBackend())
+        return backends[-1]
+
+    monkeypatch.setattr(app_module, 'KeyboardHookBackend', make_backend)
+    shared = app_module.SharedLockState.create()
+    conn, child_conn = multiprocessing.Pipe()
+    runner = threading.Thread(target=app_module.run_input_filter, args=(shared.name, child_conn), daemon=True)
+    runner.start()
+    try:
+        assert conn.recv()[0] == 'ready'
+        [backend] = backends
+        assert backend.installs == 0
+
+        shared.publish(app_module.UnlockChord.compile("ctrl+alt+u"), app_module.KeyPolicy.compile((), include_media=True))
+        shared.set_locked(True)
+        conn.send(('hook', True))
+        assert wait_for(lambda: backend.handler is not None)
+        assert backend.installs == 1
+        # 锁屏期间普通按键被屏蔽，探测按键回报给主进程
+        assert backend.deliver(app_module.KeyEvent('down', 30, 'a')) is False
+        assert backend.deliver(app_module.KeyEvent('down', -1, app_module.HookWatchdog.PROBE_KEY)) is False
+        assert conn.recv() == ('probe',)
+
+        conn.send(('reinstall',))
+        assert wait_for(lambda: backend.installs == 2)
+
+        shared.set_locked(False)
+        conn.send(('hook', False))
+        assert wait_for(lambda: backend.handler is None)
+        # 未锁屏时重新安装请求被忽略
+        conn.send(('reinstall',))
+        conn.send(('stop',))
+        runner.join(5)
+        assert not runner.is_alive()
+        assert backend.installs == 2
+    finally:
+        conn.close()
+        shared.close(unlink=True)
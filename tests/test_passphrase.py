@@ -0,0 +1,118 @@
+import json
+import threading
+
+import pytest
+
+
+# 测试用的低成本scrypt参数，存储格式与默认参数相同
+FAST_KDF = {'n': 1 << 10, 'r': 8, 'p': 1}
+
+
+def type_keys(matcher, text, on_match):
+    for char in text:
+        matcher.feed('space' if char == ' ' else char, on_match)
+
+
+def test_entries_use_independent_salts(app_module):
+    first = app_module.hash_passphrase("correct horse", **FAST_KDF)
+    second = app_module.hash_passphrase("correct horse", **FAST_KDF)
+    assert first['kdf'] == 'scrypt'
+    assert first['salt'] != second['salt']
+    assert first['hash'] != second['hash']
+    assert app_module.verify_passphrase(first, "correct horse")
+    assert not app_module.verify_passphrase(first, "correct horsf")
+
+
+def test_enter_submits_input_and_unlocks(app_module):
+    matcher = app_module.PassphraseMatcher([app_module.hash_passphrase("Correct Horse", **FAST_KDF)])
+    matched = threading.Event()
+    # 退格修改不影响匹配，比较时不区分大小写
+    type_keys(matcher, "correct horsx", matched.set)
+    matcher.feed('backspace', matched.set)
+    type_keys(matcher, "e", matched.set)
+    assert not matched.is_set()
+    matcher.feed('enter', matched.set)
+    matcher.join(5)
+    assert matched.is_set()
+
+
+def test_wrong_passphrase_does_not_unlock(app_module):
+    matcher = app_module.PassphraseMatcher([app_module.hash_passphrase("correct horse", **FAST_KDF)])
+    matched = threading.Event()
+    type_keys(matcher, "correct house", matched.set)
+    matcher.feed('enter', matched.set)
+    matcher.join(5)
+    assert not matched.is_set()
+    # 回车后缓冲区清空，不会与之后的输入拼接
+    assert len(matcher.buffer) == 0
+
+
+def test_only_same_length_entries_are_verified(app_module, monkeypatch):
+    entries = [app_module.hash_passphrase(text, **FAST_KDF)
+               for text in ("correct horse", "battery staple", "tr0ub4dor&3x")]
+    matcher = app_module.PassphraseMatcher(entries)
+    verified = []
+    real_verify = app_module.verify_passphrase
+    monkeypatch.setattr(app_module, 'verify_passphrase',
+                        lambda entry, candidate: verified.append(entry) or real_verify(entry, candidate))
+    matched = threading.Event()
+    type_keys(matcher, "battery staple", matched.set)
+    matcher.feed('enter', matched.set)
+    matcher.join(5)
+    assert matched.is_set()
+    assert verified == [entries[1]]
+
+    # 没有该长度的口令时不做任何scrypt计算
+    type_keys(matcher, "abcdefghijk", matched.set)
+    matcher.feed('enter', matched.set)
+    matcher.join(5)
+    assert verified == [entries[1]]
+
+
+def test_prefix_before_passphrase_needs_enter(app_module):
+    matcher = app_module.PassphraseMatcher([app_module.hash_passphrase("correct horse", **FAST_KDF)])
+    matched = threading.Event()
+    # 回车校验的是整段输入，前面的误输入需要先按回车清除
+    type_keys(matcher, "xxcorrect horse", matched.set)
+    matcher.feed('enter', matched.set)
+    matcher.join(5)
+    assert not matched.is_set()
+    type_keys(matcher, "correct horse", matched.set)
+    matcher.feed('enter', matched.set)
+    matcher.join(5)
+    assert matched.is_set()
+
+
+def test_overlong_input_is_not_truncated(app_module):
+    matcher = app_module.PassphraseMatcher([app_module.hash_passphrase("correct horse", **FAST_KDF)])
+    matched = threading.Event()
+    type_keys(matcher, "correct horsexx", matched.set)
+    matcher.feed('backspace', matched.set)
+    matcher.feed('enter', matched.set)
+    matcher.join(5)
+    assert not matched.is_set()
+
+    type_keys(matcher, "correct horsexx", matched.set)
+    matcher.feed('backspace', matched.set)
+    matcher.feed('backspace', matched.set)
+    matcher.feed('enter', matched.set)
+    matcher.join(5)
+    assert matched.is_set()
+
+
+def test_add_passphrase_stores_salted_hash_and_enforces_cap(app_module, tmp_path):
+    settings_file = tmp_path / "lock_settings.json"
+    app_module.add_passphrase(str(settings_file), "admin", "correct horse")
+    settings = json.loads(settings_file.read_text(encoding='utf-8'))
+    [entry] = settings['unlock_passphrases']
+    assert entry['name'] == "admin"
+    assert entry['length'] == len("correct horse")
+    assert "correct horse" not in json.dumps(settings)
+    assert app_module.verify_passphrase(entry, "correct horse")
+
+    limit = app_module.PassphraseMatcher.MAX_ENTRIES
+    settings['unlock_passphrases'] = [entry] * limit
+    settings_file.write_text(json.dumps(settings), encoding='utf-8')
+    with pytest.raises(ValueError):
+        app_module.add_passphrase(str(settings_file), "extra", "battery staple")
+    assert len(app_module.PassphraseMatcher([entry] * (limit + 2)).by_length[len("correct horse")]) == limit
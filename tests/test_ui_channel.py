@@ -0,0 +1,68 @@
+class FakeWidget:
+    """记录event_generate调用的Tk窗口替身，第一次唤醒失败"""
+
+    def __init__(self):
+        self.generated = 0
+        self.timers = []
+        self.fail_next = True
+
+    def bind(self, sequence, func):
+        self.handler = func
+
+    def after(self, ms, func):
+        self.timers.append(func)
+
+    def event_generate(self, sequence, when=None):
+        self.generated += 1
+        if self.fail_next:
+            self.fail_next = False
+            raise RuntimeError("event queue full")
+
+
+def test_failed_wakeup_does_not_stall_channel(app_module):
+    channel = app_module.UICommandChannel()
+    widget = FakeWidget()
+    channel.attach(widget)
+    executed = []
+
+    channel.post(executed.append, 1)
+    channel.post(executed.append, 2)
+    channel.post(executed.append, 3)
+
+    # 第一次唤醒失败后，之后的提交会再次唤醒
+    assert widget.generated == 2
+    widget.handler()
+    assert executed == [1, 2, 3]
+
+
+def test_no_periodic_poll_while_wakeups_succeed(app_module):
+    channel = app_module.UICommandChannel()
+    widget = FakeWidget()
+    widget.fail_next = False
+    channel.attach(widget)
+    executed = []
+
+    channel.post(executed.append, 1)
+    widget.handler()
+    assert executed == [1]
+    # 唤醒正常时不安排任何Tk定时器，锁屏低唤醒模式下没有周期性唤醒
+    assert widget.timers == []
+
+
+def test_failed_wakeup_arms_one_poll(app_module):
+    channel = app_module.UICommandChannel()
+    widget = FakeWidget()
+    channel.attach(widget)
+    executed = []
+
+    # 唤醒失败，命令滞留在队列中，安排一次兜底轮询
+    channel.post(executed.append, 1)
+    assert executed == [] and len(widget.timers) == 1
+    # 之后的唤醒成功但事件尚未处理，不再安排新的轮询
+    channel.post(executed.append, 2)
+    assert widget.generated == 2 and len(widget.timers) == 1
+
+    poll = widget.timers.pop(0)
+    poll()
+    assert executed == [1, 2]
+    assert widget.timers == []  # 轮询只执行一次，不重新安排